@@ -1,28 +1,70 @@
 # locations <WeinheimerStr_55> -->  000_B_Perform_one_call.py (CallAPI_saveJSON - openweathermap API)  -->  <WeinheimerStr_55>.json
-#                                   000_B_Perform_one_call.py (CallLocalAPI_saveJSON - temperatur API) -->  <WeinheimerStr_55>_urlResponse.json
+#
+# The local sensor (<WeinheimerStr_55>_urlResponse.json) is fetched by the stage 001_B_Call_local_API.py, so that an
+# offline sensor does not stop the scripts reading <WeinheimerStr_55>.json.
+#
+# Batch mode: "python3 000_B_Perform_one_call.py --all" (or _controller.py --batch-fetch) fetches all locations of
+# locations.json whose running_period is not "no_run" at the same time, instead of one process per location.
+# The requests share one keep-alive connection pool, at most FETCH_CONCURRENCY are in flight and the One Call
+# requests are spaced to stay within CALLS_PER_MINUTE. Each <LOCATION>.json is written as soon as its response arrives.
+# The batch also fetches the local sensors with 001_B (local_apis=True), except for the _controller --batch-fetch,
+# which runs 001_B as a stage of every location. A failing sensor does not fail the One Call of its location.
+#
+# The One Call responses go through the fetch cache of _fetch_cache.py: nearby locations share one API call, and a
+# failing API falls back to the last good payload for up to FETCH_CACHE_MAX_STALE_SECONDS.
+#
+# Only the blocks of the One Call response read by the scripts that run for the location this time are requested, the
+# others are left out with "exclude=", see "one_call_blocks" in _stage_graph.py: alerts at the moment, and daily for a
+# location with "archive_forecasts": "no" (only 007_B reads it). The _controller gives the list of its run, see
+# run(..., exclude); started on its own ("python3 000_B_Perform_one_call.py LOCATION [--exclude=alerts,daily]"),
+# 000_B uses the stages of the location.
+# The bytes saved are logged for every response, against the full response: once a day (FULL_RESPONSE_SECONDS) the
+# response is requested without exclude= and the size of each block kept in <LOCATION>_one_call_sizes.json.
+# The responses are written compact and atomically, optionally compressed, see _raw_storage.py.
+#
+# OPENWEATHERMAP_ONE_CALL_URL replaces the One Call URL, e.g. with the stand-in server of _mock_owm_server.py.
 
-import json
 import os
 import sys
+import threading
+import time
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from _endpoint_health import EndpointHealth
+from _raw_storage import write_raw
+from _fetch_cache import DEFAULT_MAX_STALE_SECONDS, DEFAULT_TTL_SECONDS, FetchCache, cache_key
+from _stage_graph import ONE_CALL_BLOCKS, STAGES, import_stage, one_call_exclude, stages_for_location
+from _trace import add_metrics, collect_metrics
+from _weather_documents import load_document
+import _json_codec as json_codec
 
 API30_KEY = os.environ["OPENWEATHERMAP_ONE_CALL_API30_KEY"]
 
-LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
-# Load the location name from command-line arguments
-# LOCATION_NAME = "WeinheimerStr_55"
-# LOCATION_NAME = "EttlingerStr_8"
-# LOCATION_NAME = "LitzelhardStr_21"
+# Fetches the local sensors in batch mode, see fetch_all
+LOCAL_API_SCRIPT = "001_B_Call_local_API.py"
 
+ONE_CALL_URL = os.environ.get("OPENWEATHERMAP_ONE_CALL_URL", "https://api.openweathermap.org/data/3.0/onecall")
+REQUEST_TIMEOUT_SECONDS = 10
+
+# Batch mode limits, see fetch_all
+FETCH_CONCURRENCY = 8
+CALLS_PER_MINUTE = 60
+
+# Fetch cache limits, see _fetch_cache.py
+FETCH_CACHE_TTL_SECONDS = DEFAULT_TTL_SECONDS
+FETCH_CACHE_MAX_STALE_SECONDS = DEFAULT_MAX_STALE_SECONDS
+
+# Period of the full One Call responses that measure the size of the blocks left out
+FULL_RESPONSE_SECONDS = 86400
 
 def load_locations_data(locations_data_fileanme, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     if not location_config:
-        logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{locations_data_fileanme}".')
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_fileanme}".')
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
     return location_config
@@ -38,19 +80,101 @@ def extract_parameter_value(location_config, parameter_name, logger, location_na
     return value
 
 
-def CallAPI_saveJSON(location_config, json_filename, logger, location_name_for_logging_only):
+def request_one_call(url, session, rate_limiter, received):
+    # received gets the size of the response, which is not there when the fetch cache answers
+    if rate_limiter is not None:
+        rate_limiter.wait()
+    response = session.get(url, timeout=REQUEST_TIMEOUT_SECONDS)
+    response.raise_for_status()  # This will raise an HTTPError if the HTTP request returned an unsuccessful status code
+    received["bytes"] = len(response.content)
+    # Latency and size of the response for the execution trace of the _controller
+    add_metrics(http_latency_s=response.elapsed.total_seconds(), http_bytes=len(response.content))
+    return json_codec.loads(response.content)
+
+
+def block_sizes_file_path(json_filename):
+    # <WeinheimerStr_55>_one_call_sizes.json next to <WeinheimerStr_55>.json
+    return f"{os.path.splitext(json_filename)[0]}_one_call_sizes.json"
+
+
+def load_block_sizes(file_path):
+    # {"measured_at": epoch seconds, "blocks": {block: bytes}} of the last full response, None if there is none
+    try:
+        with open(file_path, 'rb') as file:
+            return json_codec.loads(file.read())
+    except (OSError, ValueError):
+        return None
+
+
+def save_block_sizes(file_path, payload):
+    # Size of each block as part of the compact JSON response, 0 for a block the response does not have (alerts)
+    blocks = {
+        block: len(json_codec.dumps(payload[block])) + len(f',"{block}":') if block in payload else 0
+        for block in ONE_CALL_BLOCKS
+    }
+    temp_file_path = f"{file_path}.tmp"
+    with open(temp_file_path, 'wb') as file:
+        file.write(json_codec.dumps({"measured_at": time.time(), "blocks": blocks}))
+    os.replace(temp_file_path, file_path)
+
+
+def log_saving(received_bytes, exclude, block_sizes, full_response, logger):
+    # Logs the bytes received and those saved by exclude=, adds both to the trace record
+    if full_response:
+        logger.info(f"One Call: {received_bytes / 1024:.1f} kB received, full response to measure the blocks "
+                    f"{','.join(exclude)} (every {FULL_RESPONSE_SECONDS // 3600}h)")
+        add_metrics(one_call_exclude="", one_call_full_bytes=received_bytes, one_call_saved_bytes=0)
+        return
+    add_metrics(one_call_exclude=",".join(exclude))
+    if not exclude:
+        logger.info(f"One Call: {received_bytes / 1024:.1f} kB received, full response")
+        add_metrics(one_call_full_bytes=received_bytes, one_call_saved_bytes=0)
+        return
+    if block_sizes is None:
+        logger.info(f"One Call: {received_bytes / 1024:.1f} kB received, exclude={','.join(exclude)}, "
+                    f"saving not known yet")
+        return
+    saved_bytes = sum(block_sizes["blocks"].get(block, 0) for block in exclude)
+    full_bytes = received_bytes + saved_bytes
+    logger.info(f"One Call: {received_bytes / 1024:.1f} kB received, exclude={','.join(exclude)} saved "
+                f"{saved_bytes / 1024:.1f} kB ({100.0 * saved_bytes / full_bytes:.0f}%) of the full "
+                f"{full_bytes / 1024:.1f} kB")
+    add_metrics(one_call_full_bytes=full_bytes, one_call_saved_bytes=saved_bytes)
+
+
+def CallAPI_saveJSON(location_config, json_filename, logger, location_name_for_logging_only, session=requests,
+                     fetch_cache=None, rate_limiter=None, exclude=None):
+    # exclude: the blocks to leave out, by default those no stage of the location reads
     # Read the parameter values 
     lat = extract_parameter_value(location_config, 'lat', logger, location_name_for_logging_only)
     lon = extract_parameter_value(location_config, 'lon', logger, location_name_for_logging_only)
     units = extract_parameter_value(location_config, 'units', logger, location_name_for_logging_only)
     lang = extract_parameter_value(location_config, 'lang', logger, location_name_for_logging_only)
-    
+    if exclude is None:
+        exclude = one_call_exclude(stages_for_location(STAGES, location_config))
+
+    # A full response now and then, to know what exclude= saves
+    sizes_file_path = block_sizes_file_path(json_filename)
+    block_sizes = load_block_sizes(sizes_file_path)
+    full_response = bool(exclude) and (block_sizes is None or
+                                       time.time() - block_sizes.get("measured_at", 0) > FULL_RESPONSE_SECONDS)
+
     # Perform API call
-    url = f"https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&units={units}&lang={lang}&appid={API30_KEY}"
+    url = f"{ONE_CALL_URL}?lat={lat}&lon={lon}&units={units}&lang={lang}&appid={API30_KEY}"
+    if exclude and not full_response:
+        url += f"&exclude={','.join(exclude)}"
+    received = {}
     try:
         logger.info(f"Fetching weather data from Internet")
-        response = requests.get(url, timeout=10)
-        response.raise_for_status()  # This will raise an HTTPError if the HTTP request returned an unsuccessful status code
+        if fetch_cache is None:
+            payload = request_one_call(url, session, rate_limiter, received)
+        else:
+            # The full response has all the blocks asked for, it is kept under the same key
+            payload, cache_status = fetch_cache.get_or_fetch(
+                cache_key(lat, lon, units, lang, exclude), lambda: request_one_call(url, session, rate_limiter, received)
+            )
+            add_metrics(fetch_cache=cache_status)
+            logger.info(f"Fetch cache: {cache_status}")
     except requests.exceptions.HTTPError as e:
         logger.error(f"HTTP error occurred: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
@@ -74,56 +198,105 @@ def CallAPI_saveJSON(location_config, json_filename, logger, location_name_for_l
 
     # Save the response content to a file
     try:
-        with open(json_filename, 'w') as file:
-            json.dump(response.json(), file, indent=4)
-            logger.info(f"Weather data saved successfully to {json_filename}")
-    except IOError as e:
+        write_raw(json_filename, payload)
+        logger.info(f"Weather data saved successfully to {json_filename}")
+    except (IOError, ValueError) as e:
         logger.error(f"Error writing data to file: {json_filename}: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
 
+    if "bytes" in received:
+        if full_response:
+            try:
+                save_block_sizes(sizes_file_path, payload)
+            except OSError as e:
+                logger.warning(f"Could not write {sizes_file_path}: {e}")
+        log_saving(received["bytes"], exclude, block_sizes, full_response, logger)
 
-def CallLocalAPI_saveJSON(json_filename, logger, location_name):
-    # Read the URL from the environment variable
-    env_var_name = f"{location_name}_url"
-    local_api_url = os.environ.get(env_var_name)
 
-    if not local_api_url:
-        logger.error(f"URL environment variable '{env_var_name}' not found.")
-        sys.exit(1)
-        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+class RateLimiter:
+    # Spaces the One Call requests of all fetch threads evenly, calls_per_minute <= 0 means no limit
+    def __init__(self, calls_per_minute):
+        self.interval = 60.0 / calls_per_minute if calls_per_minute > 0 else 0.0
+        self.next_call = 0.0
+        self._lock = threading.Lock()
 
-    # Perform the local API call
-    try:
-        logger.info(f"Fetching additional data from {local_api_url}")
-        response = requests.get(local_api_url, timeout=10)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        logger.error(f"Error fetching data from local API: {e}")
-        sys.exit(1)
-        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            call_time = max(now, self.next_call)
+            self.next_call = call_time + self.interval
+        if call_time > now:
+            time.sleep(call_time - now)
 
-    # Save the response content to a file
-    try:
-        with open(json_filename, 'w') as file:
-            json.dump(response.json(), file, indent=4)
-            logger.info(f"Additional data saved successfully to {json_filename}")
-    except IOError as e:
-        logger.error(f"Error writing additional data to file: {json_filename}: {e}")
-        sys.exit(1)
-        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
 
+def fetch_location(location_name, location_config, weather_data_path, logger, session, fetch_cache, endpoint_health,
+                   rate_limiter, local_api_module, exclude=None):
+    # One location of the batch mode, returns (True if its One Call response was written, metrics for the _trace.py record).
+    # The local sensor is fetched with local_api_module (001_B) if given, its failure is logged and recorded in the
+    # metrics ("local_api_ok") only.
+    with collect_metrics() as metrics:
+        try:
+            json_file_path = os.path.join(weather_data_path, f"{location_name}.json")
+            CallAPI_saveJSON(location_config, json_file_path, logger, location_name, session, fetch_cache, rate_limiter,
+                             exclude)
+            ok = True
+        except SystemExit:
+            # The error has already been logged
+            ok = False
+        except Exception as e:
+            logger.error(f"An unexpected error occurred fetching {location_name}: {e}")
+            ok = False
+        if local_api_module is not None and location_config.get('local_api', 'no') == 'yes':
+            json_file_path_local = os.path.join(weather_data_path, f"{location_name}_urlResponse.json")
+            try:
+                metrics["local_api_ok"] = local_api_module.CallLocalAPI_saveJSON(
+                    json_file_path_local, logger, location_name, session, endpoint_health)
+            except SystemExit:
+                metrics["local_api_ok"] = False
+            except Exception as e:
+                logger.error(f"An unexpected error occurred fetching the local API of {location_name}: {e}")
+                metrics["local_api_ok"] = False
+    return ok, metrics
 
 
-def main():
+def fetch_all(locations_config, logger, max_concurrency=FETCH_CONCURRENCY, calls_per_minute=CALLS_PER_MINUTE,
+              cache_ttl_seconds=FETCH_CACHE_TTL_SECONDS, cache_max_stale_seconds=FETCH_CACHE_MAX_STALE_SECONDS,
+              weather_data_path=None, local_apis=True, exclude_by_location=None):
+    # Fetch all locations of {location: config} concurrently, with their local sensors unless local_apis is False.
+    # exclude_by_location: {location: blocks to leave out}, by default those no stage of the location reads.
+    # Returns {location: (True if fetched, metrics)} and the fetch cache, whose counts cover this batch.
+    # weather_data_path replaces weather_data, for the files, the fetch cache and the endpoint health (_load_test.py).
+    if weather_data_path is None:
+        weather_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_data')
+    rate_limiter = RateLimiter(calls_per_minute)
+    fetch_cache = FetchCache(logger, cache_ttl_seconds, cache_max_stale_seconds, os.path.join(weather_data_path, 'fetch_cache'))
+    endpoint_health = EndpointHealth(logger, os.path.join(weather_data_path, 'endpoint_health.json'))
+    local_api_module = import_stage(LOCAL_API_SCRIPT) if local_apis else None
+    fetched = {}
+    with requests.Session() as session:
+        # One kept-alive connection per fetch thread and host
+        adapter = HTTPAdapter(pool_maxsize=max_concurrency)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {
+                executor.submit(
+                    fetch_location, location, config, weather_data_path, logger, session, fetch_cache, endpoint_health,
+                    rate_limiter, local_api_module, (exclude_by_location or {}).get(location)
+                ): location
+                for location, config in locations_config.items()
+            }
+            for future in as_completed(futures):
+                fetched[futures[future]] = future.result()
+    endpoint_health.save()
+    return {location: fetched[location] for location in locations_config}, fetch_cache
 
-    #region COMMON CODE START -------------------------------------------------------------------
-    # Get the full path of the current script
+
+def run(location_name, logger, exclude=None):
+    # Stage entry point, used by the _controller in-process mode and by main() below.
+    # exclude: the blocks of the One Call response no script of this run reads, see CallAPI_saveJSON
     script_path = os.path.dirname(os.path.abspath(__file__))
-    # Extract the script's name from the full path
-    script_name = os.path.splitext(os.path.basename(__file__))[0]
-    # Use the common log file for all scripts
-    log_filename = 'logging.txt'
 
     # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
     location_configuration_data_file = 'locations.json'
@@ -132,6 +305,42 @@ def main():
     weather_data_directoryName = 'weather_data'
     weather_data_path = os.path.join(script_path, weather_data_directoryName)
 
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+
+    # Construct the file name for storage of weather data, for example WeinheimerStr_55.json
+    json_file_name = f"{location_name}.json"
+    json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
+
+    # Fetch the data from the API and store it to the "WeinheimerStr_55.json"
+    # location_name is given for a logging purposes only.
+    fetch_cache = FetchCache(logger, FETCH_CACHE_TTL_SECONDS, FETCH_CACHE_MAX_STALE_SECONDS)
+    CallAPI_saveJSON(location_config, json_file_path, logger, location_name, fetch_cache=fetch_cache, exclude=exclude)
+
+    logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+
+
+def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # LOCATION_NAME = "--all" fetches all enabled locations at once, see fetch_all
+    # "--exclude=alerts,daily" (after LOCATION_NAME, from the _controller subprocess mode) gives the blocks to leave out
+    exclude = None
+    for argument in sys.argv[2:]:
+        if argument.startswith("--exclude="):
+            exclude = [block for block in argument[len("--exclude="):].split(",") if block]
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME = "EttlingerStr_8"
+    # LOCATION_NAME = "LitzelhardStr_21"
+
+    #region COMMON CODE START -------------------------------------------------------------------
+    # Get the full path of the current script
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    # Extract the script's name from the full path
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    # Use the common log file for all scripts
+    log_filename = 'logging.txt'
+
     # Directory for the log files
     log_files_directoryName  = 'log_files'
     log_files_path = os.path.join(script_path, log_files_directoryName)
@@ -159,25 +368,19 @@ def main():
     #endregion COMMON CODE END ------------------------------------------------------------------------
 
     try:
-        # Read the locations data chect that the LOCATION exists
-        location_config = load_locations_data(location_configuration_data_file, LOCATION_NAME, logger)
-
-        # Construct the file name for storage of weather data, for example WeinheimerStr_55.json
-        json_file_name = f"{LOCATION_NAME}.json"
-        json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
-
-        # Fetch the data from the API and store it to the "WeinheimerStr_55.json"
-        # LOCATION_NAME is given for a logging purposes only.
-        CallAPI_saveJSON(location_config, json_file_path, logger, LOCATION_NAME)
-
-        # Check if local_api is set to 'yes' and call the local API
-        local_api = location_config.get('local_api', 'no')  # default to 'no' if not found
-        if local_api == 'yes':
-            json_file_name_local = f"{LOCATION_NAME}_urlResponse.json"
-            json_file_path_local = os.path.join(script_path, weather_data_path, json_file_name_local)
-            CallLocalAPI_saveJSON(json_file_path_local, logger, LOCATION_NAME)
-
-        logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+        if LOCATION_NAME == "--all":
+            with open(os.path.join(script_path, 'locations.json'), 'rb') as file:
+                locations_config = json_codec.loads(file.read())
+            enabled = {location: config for location, config in locations_config.items()
+                       if config.get("running_period", "") != "no_run"}
+            fetched, fetch_cache = fetch_all(enabled, logger)
+            logger.info(fetch_cache.summary())
+            failed = [location for location, (ok, _) in fetched.items() if not ok]
+            if failed:
+                logger.error(f"Fetching failed for: {', '.join(failed)}")
+                sys.exit(1)
+            return
+        run(LOCATION_NAME, logger, exclude)
     
     except Exception as e:
         # Catch any exception that was not already caught and logged
@@ -1,13 +1,38 @@
 # locations <WeinheimerStr_55> -->  000_B_Perform_one_call.py (CallAPI_saveJSON - openweathermap API)  -->  <WeinheimerStr_55>.json
 #                                   000_B_Perform_one_call.py (CallLocalAPI_saveJSON - temperatur API) -->  <WeinheimerStr_55>_urlResponse.json
+#
+# CallLocalAPI_saveJSON queries all local sensors of a location ("local_api" in C_locations.json) at the same time.
+# Each sensor gets ENDPOINT_TIMEOUT_SECONDS, all together LOCAL_API_DEADLINE_SECONDS, so an offline sensor no longer
+# delays the others. <WeinheimerStr_55>_localValues.json holds the response of every sensor that answered, under its
+# key, and the outcome of every sensor under "_status":
+#   "_status": {"temp_stromsensor": {"status": "ok", "seconds": 0.21},
+#               "temp_batteriesensor": {"status": "timeout", "seconds": 3.0, "error": "..."}}
+# status is one of "ok", "timeout", "error", "deadline" (no answer before LOCAL_API_DEADLINE_SECONDS) or
+# "circuit_open" (not queried, the sensor failed repeatedly, see _endpoint_health.py).
+# LOCAL_API_DEADLINE_SECONDS limits how long the results are waited for, not the exit of the process: a request still
+# in flight is not interrupted, the interpreter waits for its thread at exit, until it ends with its own timeout
+# (ENDPOINT_TIMEOUT_SECONDS to connect, and as much for each read).
+# Both responses are written compact and atomically, optionally compressed, see _raw_storage.py.
 
-import json
 import os
 import sys
+import time
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait
+from requests.adapters import HTTPAdapter
+from _endpoint_health import EndpointHealth
+from _raw_storage import write_raw
+from _weather_documents import load_document
+import _json_codec as json_codec
 
 API30_KEY = os.environ["OPENWEATHERMAP_ONE_CALL_API30_KEY"]
+# Replaced e.g. with the stand-in server of _mock_owm_server.py
+ONE_CALL_URL = os.environ.get("OPENWEATHERMAP_ONE_CALL_URL", "https://api.openweathermap.org/data/3.0/onecall")
+
+# Local sensors: time allowed to each sensor (connect and read) and to all sensors of a location together
+ENDPOINT_TIMEOUT_SECONDS = 3
+LOCAL_API_DEADLINE_SECONDS = 5
 
 # LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
 # Load the location name from command-line arguments
@@ -18,8 +43,7 @@ LOCATION_NAME = "EttlingerStr_8"
 
 def load_locations_data(locations_data_fileanme, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     if not location_config:
         logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{locations_data_fileanme}".')
@@ -50,7 +74,7 @@ def CallAPI_saveJSON(location_config, json_filename, logger, location_name_for_l
     lang = extract_parameter_value(location_config, 'lang', logger, location_name_for_logging_only)
     
     # Perform API call
-    url = f"https://api.openweathermap.org/data/3.0/onecall?lat={lat}&lon={lon}&units={units}&lang={lang}&appid={API30_KEY}"
+    url = f"{ONE_CALL_URL}?lat={lat}&lon={lon}&units={units}&lang={lang}&appid={API30_KEY}"
     try:
         logger.info(f"Fetching weather data from Internet")
         response = requests.get(url, timeout=10)
@@ -78,10 +102,9 @@ def CallAPI_saveJSON(location_config, json_filename, logger, location_name_for_l
 
     # Save the response content to a file
     try:
-        with open(json_filename, 'w') as file:
-            json.dump(response.json(), file, indent=4)
-            logger.info(f"Weather data saved successfully to {json_filename}")
-    except IOError as e:
+        write_raw(json_filename, json_codec.loads(response.content))
+        logger.info(f"Weather data saved successfully to {json_filename}")
+    except (IOError, ValueError) as e:
         logger.error(f"Error writing data to file: {json_filename}: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
@@ -90,31 +113,72 @@ def CallAPI_saveJSON(location_config, json_filename, logger, location_name_for_l
 
 
 
+def fetch_local_value(session, key, url, logger):
+    # Returns (response data or None, status entry for "_status")
+    start = time.perf_counter()
+    try:
+        logger.info(f"Fetching additional data from {url}")
+        response = session.get(url, timeout=ENDPOINT_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        data, status = json_codec.loads(response.content), {"status": "ok"}
+    except requests.exceptions.Timeout as e:
+        data, status = None, {"status": "timeout", "error": str(e)}
+    except (requests.exceptions.RequestException, ValueError) as e:
+        data, status = None, {"status": "error", "error": str(e)}
+    status["seconds"] = round(time.perf_counter() - start, 3)
+    return data, status
+
+
 def CallLocalAPI_saveJSON(json_filename, logger, location_config):
     # Extract the local_api URLs using the adapted function
     local_api_urls = extract_parameter_value(location_config, 'local_api', logger, "Local API URLs")
 
     all_responses = {}
-
-    # Iterate over each API endpoint in the local_api configuration
-    for key, url in local_api_urls.items():
-        try:
-            logger.info(f"Fetching additional data from {url}")
-            response = requests.get(url, timeout=10)
-            response.raise_for_status()
-            # Save the response content to the all_responses dict
-            all_responses[key] = response.json()
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error fetching data from {key} local API: {e}")
-            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            continue  # Continue with other URLs even if one fails
+    statuses = {}
+
+    # Sensors known to be offline are not queried, except for a probe now and then
+    endpoint_health = EndpointHealth(logger)
+    skipped_keys = [key for key in local_api_urls if not endpoint_health.allow(f"{LOCATION_NAME}/{key}")]
+    for key in skipped_keys:
+        statuses[key] = {"status": "circuit_open", "seconds": 0.0}
+        logger.warning(f"Skipping the {key} local API, it failed repeatedly (circuit breaker open)")
+    local_api_urls = {key: url for key, url in local_api_urls.items() if key not in skipped_keys}
+
+    # Query all API endpoints in the local_api configuration at the same time
+    with requests.Session() as session:
+        adapter = HTTPAdapter(pool_maxsize=max(1, len(local_api_urls)))
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        executor = ThreadPoolExecutor(max_workers=max(1, len(local_api_urls)))
+        futures = {executor.submit(fetch_local_value, session, key, url, logger): key for key, url in local_api_urls.items()}
+        done, not_done = wait(futures, timeout=LOCAL_API_DEADLINE_SECONDS)
+        # Do not wait here for the sensors that missed the deadline, their requests end with their own timeout.
+        # Closing the session closes the idle connections, those still in use are closed when their request ends.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    for future, key in futures.items():
+        if future in done:
+            data, statuses[key] = future.result()
+            if data is not None:
+                all_responses[key] = data
+                endpoint_health.success(f"{LOCATION_NAME}/{key}", statuses[key]["seconds"])
+                continue
+            error = statuses[key]["error"]
+        else:
+            statuses[key] = {"status": "deadline", "seconds": LOCAL_API_DEADLINE_SECONDS}
+            error = f"no answer within {LOCAL_API_DEADLINE_SECONDS}s"
+        endpoint_health.failure(f"{LOCATION_NAME}/{key}", error)
+        # Continue with other URLs even if one fails
+        logger.error(f"Error fetching data from {key} local API: {error}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+    endpoint_health.save()
+    all_responses["_status"] = {key: statuses[key] for key in statuses}
 
     # Save all responses to a file
     try:
-        with open(json_filename, 'w') as file:
-            json.dump(all_responses, file, indent=4)
-            logger.info(f"All additional data saved successfully to {json_filename}")
-    except IOError as e:
+        write_raw(json_filename, all_responses)
+        logger.info(f"All additional data saved successfully to {json_filename}")
+    except (IOError, ValueError) as e:
         logger.error(f"Error writing additional data to file: {json_filename}: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
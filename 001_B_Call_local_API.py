@@ -0,0 +1,161 @@
+# locations <WeinheimerStr_55> -->  001_B_Call_local_API.py (CallLocalAPI_saveJSON - temperatur API) -->  <WeinheimerStr_55>_urlResponse.json
+#
+# The local sensor of a location with "local_api": "yes", at the URL of the environment variable <LOCATION>_url.
+# It used to be fetched by 000_B right after the One Call response, now a sensor that is offline no longer delays
+# the forecasts, see _stage_graph.py. A sensor that does not answer is logged and recorded in _endpoint_health.py,
+# after repeated failures it is skipped for a while. Neither is a failure of the stage: the previous
+# <LOCATION>_urlResponse.json stays as it is, and 010_B and 045_B run on it as before.
+# Only a response that can not be written fails the stage.
+# The response is written compact and atomically, optionally compressed, see _raw_storage.py.
+
+import os
+import sys
+import time
+import requests
+import logging
+from _endpoint_health import EndpointHealth
+from _raw_storage import write_raw
+from _weather_documents import load_document
+import _json_codec as json_codec
+
+REQUEST_TIMEOUT_SECONDS = 10
+
+def load_locations_data(locations_data_fileanme, location_name, logger):
+    config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
+    config = load_document(config_path)
+    location_config = config.get(location_name)
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_fileanme}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+    return location_config
+
+
+def CallLocalAPI_saveJSON(json_filename, logger, location_name, session=requests, endpoint_health=None):
+    # True if a new response was written, False if the sensor was skipped or did not answer
+    # Read the URL from the environment variable
+    env_var_name = f"{location_name}_url"
+    local_api_url = os.environ.get(env_var_name)
+
+    if not local_api_url:
+        logger.error(f"URL environment variable '{env_var_name}' not found.")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    # Do not wait for the timeout of a device known to be offline.
+    # A shared endpoint_health (batch mode of 000_B) is saved by the caller once all locations are done.
+    save_health = endpoint_health is None
+    if endpoint_health is None:
+        endpoint_health = EndpointHealth(logger)
+    # Skipping is not an error: the previous <LOCATION>_urlResponse.json stays as it is, and the breaker
+    # probes the device again after its open time.
+    if not endpoint_health.allow(env_var_name):
+        logger.warning(f"Skipping the local API '{env_var_name}', it failed repeatedly (circuit breaker open)")
+        return False
+
+    # Perform the local API call
+    try:
+        logger.info(f"Fetching additional data from {local_api_url}")
+        start = time.perf_counter()
+        response = session.get(local_api_url, timeout=REQUEST_TIMEOUT_SECONDS)
+        response.raise_for_status()
+        endpoint_health.success(env_var_name, time.perf_counter() - start)
+        if save_health:
+            endpoint_health.save()
+    except requests.exceptions.RequestException as e:
+        # Not a failure of the stage either, as the skip above: 010_B and 045_B still run
+        endpoint_health.failure(env_var_name, e)
+        if save_health:
+            endpoint_health.save()
+        logger.error(f"Error fetching data from local API: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        return False
+
+    # Save the response content to a file
+    try:
+        write_raw(json_filename, json_codec.loads(response.content))
+        logger.info(f"Additional data saved successfully to {json_filename}")
+        return True
+    except (IOError, ValueError) as e:
+        logger.error(f"Error writing additional data to file: {json_filename}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+
+    # Check if local_api is set to 'yes' and call the local API
+    local_api = location_config.get('local_api', 'no')  # default to 'no' if not found
+    if local_api == 'yes':
+        json_file_name_local = f"{location_name}_urlResponse.json"
+        json_file_path_local = os.path.join(weather_data_path, json_file_name_local)
+        CallLocalAPI_saveJSON(json_file_path_local, logger, location_name)
+    else:
+        logger.info(f"No local API for {location_name}")
+
+    logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+
+
+def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME = "EttlingerStr_8"
+
+    #region COMMON CODE START -------------------------------------------------------------------
+    # Get the full path of the current script
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    # Extract the script's name from the full path
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    # Use the common log file for all scripts
+    log_filename = 'logging.txt'
+
+    # Directory for the log files
+    log_files_directoryName  = 'log_files'
+    log_files_path = os.path.join(script_path, log_files_directoryName)
+    absolute_log_filename = os.path.join(log_files_path, log_filename)  # Include the file name in the path
+    if not os.path.exists(log_files_path):
+        os.makedirs(log_files_path)
+
+    # Create a logger object
+    logger = logging.getLogger()
+    logger.setLevel(logging.FATAL)  # Set the logger's level
+    # Create a handler for writing to a file
+    file_handler = logging.FileHandler(absolute_log_filename)
+    file_handler.setLevel(logging.FATAL)  # Set the file handler's level
+    file_handler.setFormatter(logging.Formatter(f'%(asctime)s {script_name} %(levelname)s: %(message)s'))
+
+    # Create a handler for writing to the console
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.FATAL)  # Set the stream handler's level
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+    # Add both handlers to the logger
+    logger.addHandler(file_handler)
+    logger.addHandler(stream_handler)
+    # Signal start
+    logger.info("Program started")
+    #endregion COMMON CODE END ------------------------------------------------------------------------
+
+    try:
+        run(LOCATION_NAME, logger)
+
+    except Exception as e:
+        # Catch any exception that was not already caught and logged
+        logger.error(f"An unexpected error occurred in Section 001 Call local API: {e}")
+        sys.exit(1)
+        return
+
+if __name__ == "__main__":
+    main()
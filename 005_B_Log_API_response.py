@@ -1,23 +1,25 @@
-# <WeinheimerStr_55>.json   --->   005_B_Log_API_responses.py   --->   append to the <WeinheimerStr_55>_all_responses.csv
+# <WeinheimerStr_55>.json   --->   005_B_Log_API_responses.py   --->   append to the <WeinheimerStr_55>_history.sqlite
 # Only if the parameter "store_all_responses": "yes" for the LOCATION_NAME
+# The rows of an existing <WeinheimerStr_55>_all_responses.csv are moved into the empty database first, see
+# _history_store.py. With "history_storage": "csv" the row is appended to the _all_responses.csv as before.
+# A response whose current.dt is already recorded is not recorded again: the database keeps one row per dt, the CSV
+# gets only rows newer than its last one.
 
-import json
 import os
 import sys
 import csv
 import logging
+import sqlite3
 from datetime import datetime
+from _forecast_columns import current_columns
+from _history_store import HEADER, HistoryStore, csv_file_path, history_file_path, last_csv_dt
+from _weather_documents import load_document
 
-LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
-# Load the location name from command-line arguments
-# LOCATION_NAME = "WeinheimerStr_55"
-# LOCATION_NAME ="EttlingerStr_8"
-# LOCATION_NAME = "MorrisCourt_4imp"
+CURRENT_CSV_FIELDS = ['dt', 'temp', 'feels_like', 'pressure', 'humidity', 'uvi', 'clouds', 'wind_speed', 'wind_deg', 'wind_gust']
 
 def load_locations_data(locations_data_filename, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_filename)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     logger.info(f"Location data loaded for {location_name}")
     if not location_config:
@@ -39,6 +41,11 @@ def extract_parameter_value(location_config, parameter_name, logger, location_na
 
 def append_to_csv(file_path, data, header, logger):
     file_exists = os.path.isfile(file_path)
+    dt = data[header.index('dt')]
+    last_dt = last_csv_dt(file_path)
+    if last_dt is not None and dt <= last_dt:
+        logger.info(f"dt {dt} is not newer than the last row ({last_dt}) of: {file_path}, not appended")
+        return
     try:
         with open(file_path, 'a', newline='') as file:
             writer = csv.writer(file)
@@ -53,27 +60,47 @@ def append_to_csv(file_path, data, header, logger):
         sys.exit(1)
 
 
+def append_to_history(file_path, legacy_csv_file_path, data, logger):
+    try:
+        with HistoryStore(file_path) as store:
+            # An empty history (no last dt, read from the index) takes over the CSV written before
+            last_dt = store.last_dt()
+            if last_dt is None and os.path.isfile(legacy_csv_file_path):
+                count = store.migrate_csv(legacy_csv_file_path)
+                logger.info(f"{count} rows of {legacy_csv_file_path} migrated into: {file_path}")
+                last_dt = store.last_dt()
+            store.upsert_rows([data])
+        if last_dt is not None and data[HEADER.index('dt')] <= last_dt:
+            logger.info(f"history row for dt {data[HEADER.index('dt')]} (last {last_dt}) upserted into: {file_path}")
+        else:
+            logger.info(f"history row written into: {file_path}")
+    except (sqlite3.Error, OSError, ValueError) as e:
+        logger.error(f"Error writing data to the history: {file_path}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+
 def format_csv_data(data, logger):
     try:
         # Define the header
-        header = ['timezone', 'timezone_offset', 'dt', 'temperature', 'feels_like', 'pressure', 'humidity', 'uvi', 'clouds', 'wind_speed', 'wind_deg', 'wind_gust']
+        header = list(HEADER)
         
         # Extract the timezone and timezone_offset directly from the data
         timezone = data['timezone']
         timezone_offset = data['timezone_offset']
 
-        # Now, define current_data using the 'current' key from the data
-        current_data = data['current']
-        dt = current_data['dt']  # This is the UNIX timestamp for the current data point
-        temp = current_data['temp']
-        feels_like = current_data['feels_like']
-        pressure = current_data['pressure']
-        humidity = current_data['humidity']
-        uvi = current_data['uvi']
-        clouds = current_data['clouds']
-        wind_speed = current_data.get('wind_speed')
-        wind_deg = current_data.get('wind_deg')
-        wind_gust = current_data.get('wind_gust')
+        # The 'current' block as a one entry columnar model, see _forecast_columns.py
+        current = current_columns(data, CURRENT_CSV_FIELDS)
+        dt = current.row_value('dt', 0)  # This is the UNIX timestamp for the current data point
+        temp = current.row_value('temp', 0)
+        feels_like = current.row_value('feels_like', 0)
+        pressure = current.row_value('pressure', 0)
+        humidity = current.row_value('humidity', 0)
+        uvi = current.row_value('uvi', 0)
+        clouds = current.row_value('clouds', 0)
+        wind_speed = current.row_value('wind_speed', 0)
+        wind_deg = current.row_value('wind_deg', 0)
+        wind_gust = current.row_value('wind_gust', 0)  # None if there was no wind_gust, as for wind_speed and wind_deg
         
         # Prepare the data row
         csv_data = [timezone, timezone_offset, dt, temp, feels_like, pressure, humidity, uvi, clouds, wind_speed, wind_deg, wind_gust]
@@ -90,7 +117,50 @@ def format_csv_data(data, logger):
 
 
 
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    # Read the parameter values
+    # location_name is given for a logging purposes only.
+    store_all_responses = extract_parameter_value(location_config, 'store_all_responses', logger, location_name)
+
+    if store_all_responses == 'yes':
+        json_file_name = f"{location_name}.json"
+        json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
+        response_csv_file = csv_file_path(weather_data_path, location_name)
+        
+        data = load_document(json_file_path)
+        
+        header, csv_data = format_csv_data(data, logger)
+        if location_config.get('history_storage', 'sqlite') == 'csv':
+            append_to_csv(response_csv_file, csv_data, header, logger)
+        else:
+            append_to_history(history_file_path(weather_data_path, location_name), response_csv_file, csv_data, logger)
+
+
 def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
+    # LOCATION_NAME = "MorrisCourt_4imp"
 
     #region COMMON CODE START -------------------------------------------------------------------
     # Get the full path of the current script
@@ -100,13 +170,6 @@ def main():
     # Use the common log file for all scripts
     log_filename = 'logging.txt'
 
-    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
-    location_configuration_data_file = 'locations.json'
-
-    # Directory for the weather data files
-    weather_data_directoryName = 'weather_data'
-    weather_data_path = os.path.join(script_path, weather_data_directoryName)
-
     # Directory for the log files
     log_files_directoryName  = 'log_files'
     log_files_path = os.path.join(script_path, log_files_directoryName)
@@ -134,32 +197,7 @@ def main():
     #endregion COMMON CODE END ------------------------------------------------------------------------
 
     try:
-        # Read the locations data chect that the LOCATION exists
-        location_config = load_locations_data(location_configuration_data_file, LOCATION_NAME, logger)
-        
-        # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
-        if not location_config:
-            logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{location_configuration_data_file}".')
-            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            sys.exit(1)
-
-        # Read the parameter values
-        # LOCATION_NAME is given for a logging purposes only.
-        store_all_responses = extract_parameter_value(location_config, 'store_all_responses', logger, LOCATION_NAME)
-
-        if store_all_responses == 'yes':
-            json_file_name = f"{LOCATION_NAME}.json"
-            json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
-            response_csv_file = os.path.join(script_path, weather_data_path, f"{LOCATION_NAME}_all_responses.csv")
-            
-            with open(json_file_path, 'r') as file:
-                data = json.load(file)
-            
-            header, csv_data = format_csv_data(data, logger)
-            append_to_csv(response_csv_file, csv_data, header, logger)
-
-
-
+        run(LOCATION_NAME, logger)
 
     except Exception as e:
         logger.error(f"An unexpected error occurred: {e}")
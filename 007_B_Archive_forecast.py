@@ -0,0 +1,149 @@
+# <WeinheimerStr_55>.json   --->   007_B_Archive_forecast.py   --->   add a snapshot to <WeinheimerStr_55>_forecast_archive.sqlite
+# Keeps the minutely, hourly and daily blocks of every fetched response, see _forecast_archive.py
+# Unless the parameter "archive_forecasts": "no" for the LOCATION_NAME
+
+import os
+import sys
+import sqlite3
+import zlib
+import logging
+from _forecast_archive import ARCHIVE_BLOCKS, ForecastArchive, Snapshot, archive_file_path
+from _forecast_columns import block_columns
+from _weather_documents import load_document
+
+def load_locations_data(locations_data_filename, location_name, logger):
+    config_path = os.path.join(os.path.dirname(__file__), locations_data_filename)
+    config = load_document(config_path)
+    location_config = config.get(location_name)
+    logger.info(f"Location data loaded for {location_name}")
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_filename}".')
+        sys.exit(1)
+    return location_config
+
+
+def extract_parameter_value(location_config, parameter_name, logger, location_name_for_logging_only):
+    try:
+        value = location_config[parameter_name]  # Retrieve the parameter from the location config
+        logger.info(f"Parameter extracted: {parameter_name}")
+    except KeyError:
+        logger.error(f"'{parameter_name}' key not found in the configuration for {location_name_for_logging_only}.")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+    return value
+
+
+def read_snapshot(json_file_path, time_zone, logger):
+    # The fetch time is the time 000_B wrote the response
+    try:
+        data = load_document(json_file_path)
+        blocks = {block: block_columns(block, data[block]) for block in ARCHIVE_BLOCKS if data.get(block)}
+        current = data.get('current')
+        issued_at = int(current['dt']) if current and 'dt' in current else None
+        logger.info(f"Blocks read: {', '.join(blocks) or 'none'}")
+        return Snapshot(int(os.stat(json_file_path).st_mtime), issued_at, time_zone, blocks)
+    except Exception as e:
+        logger.error(f"Error reading the forecast blocks of {json_file_path}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+
+def archive_snapshot(file_path, snapshot, logger):
+    try:
+        with ForecastArchive(file_path) as archive:
+            result = archive.append(snapshot)
+        if result == "stored":
+            logger.info(f"Forecast fetched at {snapshot.fetched_at} archived into: {file_path}")
+        elif result == "unchanged":
+            logger.info(f"Forecast fetched at {snapshot.fetched_at} is the same as the last one, not archived again")
+        else:
+            logger.info(f"Forecast fetched at {snapshot.fetched_at} is not newer than the last one archived, skipped")
+    except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+        logger.error(f"Error writing the forecast archive: {file_path}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    if location_config.get('archive_forecasts', 'yes') != 'yes':
+        logger.info(f"Forecasts of {location_name} are not archived")
+        return
+
+    # Read the parameter values
+    # location_name is given for a logging purposes only.
+    time_zone = extract_parameter_value(location_config, 'time_zone', logger, location_name)
+
+    json_file_path = os.path.join(weather_data_path, f"{location_name}.json")
+    snapshot = read_snapshot(json_file_path, time_zone, logger)
+    archive_snapshot(archive_file_path(weather_data_path, location_name), snapshot, logger)
+
+
+def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
+    # LOCATION_NAME = "MorrisCourt_4imp"
+
+    #region COMMON CODE START -------------------------------------------------------------------
+    # Get the full path of the current script
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    # Extract the script's name from the full path
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    # Use the common log file for all scripts
+    log_filename = 'logging.txt'
+
+    # Directory for the log files
+    log_files_directoryName  = 'log_files'
+    log_files_path = os.path.join(script_path, log_files_directoryName)
+    absolute_log_filename = os.path.join(log_files_path, log_filename)  # Include the file name in the path
+    if not os.path.exists(log_files_path):
+        os.makedirs(log_files_path)
+
+    # Create a logger object
+    logger = logging.getLogger()
+    logger.setLevel(logging.FATAL)  # Set the logger's level
+    # Create a handler for writing to a file
+    file_handler = logging.FileHandler(absolute_log_filename)
+    file_handler.setLevel(logging.FATAL)  # Set the file handler's level
+    file_handler.setFormatter(logging.Formatter(f'%(asctime)s {script_name} %(levelname)s: %(message)s'))
+    
+    # Create a handler for writing to the console
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.FATAL)  # Set the stream handler's level
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+    # Add both handlers to the logger
+    logger.addHandler(file_handler)
+    logger.addHandler(stream_handler)
+    # Signal start
+    logger.info("Program started")
+    #endregion COMMON CODE END ------------------------------------------------------------------------
+
+    try:
+        run(LOCATION_NAME, logger)
+
+    except Exception as e:
+        logger.error(f"An unexpected error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
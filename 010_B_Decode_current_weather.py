@@ -8,37 +8,27 @@ import logging
 import sys
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-from datetime import datetime 
-from zoneinfo import ZoneInfo # A nice time zones overview https://www.timeanddate.com/time/map/
-
-LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
-# Load the location name from command-line arguments
-# LOCATION_NAME = "WeinheimerStr_55"
-# LOCATION_NAME ="EttlingerStr_8"
-
+from _time_format import format_timestamp, format_timestamps  # A nice time zones overview https://www.timeanddate.com/time/map/
+from _weather_documents import load_document
 
 def load_locations_data(locations_data_fileanme, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     if not location_config:
-        logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{locations_data_fileanme}".')
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_fileanme}".')
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
     return location_config
 
 
 def format_date_and_time(unix_time, time_zone):
-    tz = ZoneInfo(time_zone)
-    local_time = datetime.fromtimestamp(unix_time, tz)
-    return local_time.strftime('%d.%m.%Y %H:%M')
+    return format_timestamp(unix_time, time_zone, '%d.%m.%Y %H:%M')
 
 
 def format_sun_times(sunrise_time, sunset_time, time_zone):
-    tz = ZoneInfo(time_zone)
-    sunrise_local_time = datetime.fromtimestamp(sunrise_time, tz).strftime('%H:%M')
-    sunset_local_time = datetime.fromtimestamp(sunset_time, tz).strftime('%H:%M')
+    # Both at once, see _time_format.py
+    sunrise_local_time, sunset_local_time = format_timestamps([sunrise_time, sunset_time], time_zone, '%H:%M')
     return sunrise_local_time, sunset_local_time
 
 
@@ -56,11 +46,11 @@ def append_units(key, value, unit_type):
 
 def read_and_format_current_weather(json_file_path, time_zone, unit_type, logger, local_api_data=""):
     try:        
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            logger.info(f"Reading weather data from {json_file_path}")
-            data = json.load(file)
+        logger.info(f"Reading weather data from {json_file_path}")
+        data = load_document(json_file_path)
 
-        current_data = data.get('current', {})
+        # A copy, the document is shared with the other stages and read-only
+        current_data = dict(data.get('current', {}))
         if not current_data:
             logger.error(f"No current weather data found in {json_file_path}")
             logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
@@ -166,8 +156,7 @@ def extract_parameter_value(location_config, parameter_name, logger, location_na
 
 def process_local_api_data(json_file_path_local, logger):
     try:
-        with open(json_file_path_local, 'r', encoding='utf-8') as file:
-            local_data = json.load(file)        
+        local_data = load_document(json_file_path_local)
         # Extract the temperature data
         local_temperature = local_data.get("temperatureInC", "Data not available")
         formatted_local_data = f"Locally measured Temperature: {local_temperature}°C\n"
@@ -184,15 +173,9 @@ def process_local_api_data(json_file_path_local, logger):
     return ""
 
 
-def main():
-    
-    #region COMMON CODE START -------------------------------------------------------------------
-    # Get the full path of the current script
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
     script_path = os.path.dirname(os.path.abspath(__file__))
-    # Extract the script's name from the full path
-    script_name = os.path.splitext(os.path.basename(__file__))[0]
-    # Use the common log file for all scripts
-    log_filename = 'logging.txt'
 
     # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
     location_configuration_data_file = 'locations.json'
@@ -201,6 +184,61 @@ def main():
     weather_data_directoryName = 'weather_data'
     weather_data_path = os.path.join(script_path, weather_data_directoryName)
 
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    json_file_name = f"{location_name}.json"
+    output_file_name = f"{location_name}_current_weather.txt"
+    json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
+    output_file_path = os.path.join(script_path, weather_data_path, output_file_name)
+    
+    # Read the parameter values
+    # location_name is given for a logging purposes only.
+    unit_type = extract_parameter_value(location_config, 'units', logger, location_name)
+    time_zone = extract_parameter_value(location_config, 'time_zone', logger, location_name)
+    local_api = extract_parameter_value(location_config, 'local_api', logger, location_name)
+
+    # If there are some local data, like in WeinheimerStr_55_urlResponse.json (temperature an Dario and Goran location)
+    # read, process and return them
+    local_api_data = ""
+    if local_api == "yes":
+        json_file_name_local = f"{location_name}_urlResponse.json"
+        json_file_path_local = os.path.join(script_path, weather_data_directoryName, json_file_name_local)
+        local_api_data = process_local_api_data(json_file_path_local, logger)
+
+    # Read json data, such as "WeinheimerStr_51,json", and return them formated
+    # New: Add the local_api_data, as defined above
+    formatted_data = read_and_format_current_weather(json_file_path, time_zone, unit_type, logger, local_api_data)
+    # Save the formated data to a file 
+    write_to_file(location_name, output_file_path, formatted_data, logger)
+
+    image_file_path = f"{output_file_path.replace('.txt', '.jpeg')}"
+    create_image_from_text_with_matplotlib(output_file_path, image_file_path, logger, fontsize=24)  # Specify desired font size here
+    logger.info(f"Image file created: {image_file_path}")
+
+    logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+
+
+def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
+
+    #region COMMON CODE START -------------------------------------------------------------------
+    # Get the full path of the current script
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    # Extract the script's name from the full path
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    # Use the common log file for all scripts
+    log_filename = 'logging.txt'
+
     # Directory for the log files
     log_files_directoryName  = 'log_files'
     log_files_path = os.path.join(script_path, log_files_directoryName)
@@ -227,48 +265,8 @@ def main():
     logger.info("Program started")
     #endregion COMMON CODE END ------------------------------------------------------------------------
 
-    try: 
-        # Read the locations data chect that the LOCATION exists
-        location_config = load_locations_data(location_configuration_data_file, LOCATION_NAME, logger)
-        
-        # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
-        if not location_config:
-            logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{location_configuration_data_file}".')
-            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            sys.exit(1)
-        
-        # If location exists in the configuration file process it
-        else:
-            json_file_name = f"{LOCATION_NAME}.json"
-            output_file_name = f"{LOCATION_NAME}_current_weather.txt"
-            json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
-            output_file_path = os.path.join(script_path, weather_data_path, output_file_name)
-            
-            # Read the parameter values
-            # LOCATION_NAME is given for a logging purposes only.
-            unit_type = extract_parameter_value(location_config, 'units', logger, LOCATION_NAME)
-            time_zone = extract_parameter_value(location_config, 'time_zone', logger, LOCATION_NAME)
-            local_api = extract_parameter_value(location_config, 'local_api', logger, LOCATION_NAME)
-
-            # If there are some local data, like in WeinheimerStr_55_urlResponse.json (temperature an Dario and Goran location)
-            # read, process and return them
-            local_api_data = ""
-            if local_api == "yes":
-                json_file_name_local = f"{LOCATION_NAME}_urlResponse.json"
-                json_file_path_local = os.path.join(script_path, weather_data_directoryName, json_file_name_local)
-                local_api_data = process_local_api_data(json_file_path_local, logger)
-
-            # Read json data, such as "WeinheimerStr_51,json", and return them formated
-            # New: Add the local_api_data, as defined above
-            formatted_data = read_and_format_current_weather(json_file_path, time_zone, unit_type, logger, local_api_data)
-            # Save the formated data to a file 
-            write_to_file(LOCATION_NAME, output_file_path, formatted_data, logger)
-
-            image_file_path = f"{output_file_path.replace('.txt', '.jpeg')}"
-            create_image_from_text_with_matplotlib(output_file_path, image_file_path, logger, fontsize=24)  # Specify desired font size here
-            logger.info(f"Image file created: {image_file_path}")
-
-            logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+    try:
+        run(LOCATION_NAME, logger)
 
     except Exception as e:
         # Catch any exception that was not already caught and logged
@@ -1,19 +1,15 @@
-# <WeinheimerStr_55>_minutely_forecast.txt  --->   025_B_Plot_precipitation.py   --->   # <WeinheimerStr_55>_minutely_precipitation.jpeg
+# <WeinheimerStr_55>_minutely_forecast.npz  --->   025_B_Plot_precipitation.py   --->   # <WeinheimerStr_55>_minutely_precipitation.jpeg
+# The .txt of 020_B is read instead if there is no .npz, e.g. when it was written by an older 020_B
 
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
 import pandas as pd
 import sys
 import datetime
-import json
 import os
 import logging
-
-LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
-# Load the location name from command-line arguments
-# LOCATION_NAME = "WeinheimerStr_55"
-# LOCATION_NAME ="EttlingerStr_8"
-
+from _forecast_columns import load_columns
+from _weather_documents import load_document
 
 def parse_date_time_precipitation(row):
     return datetime.datetime.strptime(row['Date and Time'], "%d.%m.%Y %H:%M")
@@ -33,6 +29,20 @@ def read_and_process_precipitation_data(file_path, logger):
         return None
 
 
+def read_precipitation_columns(file_path, logger):
+    # The same frame as read_and_process_precipitation_data, from the typed columns of 020_B
+    try:
+        minutely = load_columns(file_path)
+        data = pd.DataFrame({'Date_Time': minutely.local_times(), 'Precipitation (mm)': minutely['precipitation']})
+        logger.info("Precipitation data read")
+        return data
+    except Exception as e:
+        logging.error(f"Error reading or processing file {file_path}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+        return None
+
+
 def plot_precipitation_data(data, location, jpeg_file_path, logger):
     plt.figure(figsize=(12, 8))
     plt.plot(data['Date_Time'], data['Precipitation (mm)'], label='Precipitation (mm)')
@@ -59,15 +69,17 @@ def plot_precipitation_data(data, location, jpeg_file_path, logger):
     plt.savefig(jpeg_file_path, format='jpeg', bbox_inches='tight')
     logger.info(f"Precipitation diagram saved in {jpeg_file_path}")
 
+    # Close the plot to free up memory, figures would otherwise pile up in the _controller in-process mode
+    plt.close()
+
 
 
 def load_locations_data(locations_data_fileanme, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     if not location_config:
-        logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{locations_data_fileanme}".')
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_fileanme}".')
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
     return location_config
@@ -83,7 +95,53 @@ def extract_parameter_value(location_config, parameter_name, logger, location_na
     return value
 
 
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    # Read the parameter values
+    # location_name is given for a logging purposes only.
+    # unit_type = extract_parameter_value(location_config, 'units', logger, location_name)
+    # Not necessary, no units in the hours and minutes
+    
+    input_file_name = f"{location_name}_minutely_forecast.txt"
+    jpeg_file_name = f"{location_name}_minutely_precipitation.jpeg"
+    
+    hourly_file_path = os.path.join(weather_data_path, input_file_name)
+    jpeg_file_path = os.path.join(weather_data_path, jpeg_file_name)
+
+    columns_file_path = os.path.join(weather_data_path, f"{location_name}_minutely_forecast.npz")
+    if os.path.exists(columns_file_path):
+        data = read_precipitation_columns(columns_file_path, logger)
+    else:
+        data = read_and_process_precipitation_data(hourly_file_path, logger)
+    plot_precipitation_data(data, location_name, jpeg_file_path, logger)
+    # plt.show() # Do not show the diagram, for running via _controller script
+
+    logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+
+
 def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
 
     #region COMMON CODE START -------------------------------------------------------------------
     # Get the full path of the current script
@@ -93,13 +151,6 @@ def main():
     # Use the common log file for all scripts
     log_filename = 'logging.txt'
 
-    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
-    location_configuration_data_file = 'locations.json'
-
-    # Directory for the weather data files
-    weather_data_directoryName = 'weather_data'
-    weather_data_path = os.path.join(script_path, weather_data_directoryName)
-
     # Directory for the log files
     log_files_directoryName  = 'log_files'
     log_files_path = os.path.join(script_path, log_files_directoryName)
@@ -127,35 +178,8 @@ def main():
     #endregion COMMON CODE END ------------------------------------------------------------------------
 
     try:
-        # Read the locations data chect that the LOCATION exists
-        location_config = load_locations_data(location_configuration_data_file, LOCATION_NAME, logger)
-        
-        # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
-        if not location_config:
-            logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{location_configuration_data_file}".')
-            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            sys.exit(1)
-        
-        # If location exists in the configuration file process it
-        else:
-            # Read the parameter values
-            # LOCATION_NAME is given for a logging purposes only.
-            # unit_type = extract_parameter_value(location_config, 'units', logger, LOCATION_NAME)
-            # Not necessary, no units in the hours and minutes
-            
-            weather_data_path = os.path.join(script_path, weather_data_directoryName)
-            input_file_name = f"{LOCATION_NAME}_minutely_forecast.txt"
-            jpeg_file_name = f"{LOCATION_NAME}_minutely_precipitation.jpeg"
-            
-            hourly_file_path = os.path.join(weather_data_path, input_file_name)
-            jpeg_file_path = os.path.join(weather_data_path, jpeg_file_name)
-
-            data = read_and_process_precipitation_data(hourly_file_path, logger)
-            plot_precipitation_data(data, LOCATION_NAME, jpeg_file_path, logger)
-            # plt.show() # Do not show the diagram, for running via _controller script
-
-            logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
-    
+        run(LOCATION_NAME, logger)
+
     except Exception as e:
         # Catch any exception that was not already caught and logged
         logger.error(f"An unexpected error occurred: {e}")
@@ -1,26 +1,21 @@
 # <WeinheimerStr_55>.json   --->   030_B_Decode_hourly_forecast.py   --->   <WeinheimerStr_55>_hourly_forecast.txt
+#                                                                        <WeinheimerStr_55>_hourly_forecast.npz
 
 import json
 import os
 import logging
 import sys
-from datetime import datetime
-from zoneinfo import ZoneInfo # A nice time zones overview https://www.timeanddate.com/time/map/
+from _forecast_columns import HOURLY_TEXT_FIELDS, block_columns, save_columns
+from _time_format import format_timestamps  # A nice time zones overview https://www.timeanddate.com/time/map/
+from _weather_documents import load_document
 
-LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
-# Load the location name from command-line arguments
-# LOCATION_NAME = "WeinheimerStr_55"
-# LOCATION_NAME ="EttlingerStr_8"
+def format_unix_dates(unix_times, time_zone):
+    # All timestamps at once, see _time_format.py
+    return format_timestamps(unix_times, time_zone, '%d.%m.%Y')
 
 
-def format_unix_date(unix_time, time_zone):
-    tz = ZoneInfo(time_zone)
-    return datetime.fromtimestamp(unix_time, tz).strftime('%d.%m.%Y')
-
-
-def format_unix_time(unix_time, time_zone):
-    tz = ZoneInfo(time_zone)
-    return datetime.fromtimestamp(unix_time, tz).strftime('%H:%M')
+def format_unix_times(unix_times, time_zone):
+    return format_timestamps(unix_times, time_zone, '%H:%M')
 
 
 def append_units(key, value, unit_type):
@@ -36,11 +31,11 @@ def append_units(key, value, unit_type):
     return f"{value}{units.get(key, '')}"
 
 
-def read_and_format_hourly_weather(json_file_path, time_zone, unit_type, logger):
+def read_and_format_hourly_weather(json_file_path, time_zone, unit_type, logger, with_text=True):
+    # Returns the columns of the hourly block and, with_text, the formatted text
     try:
         logger.info(f"Reading hourly weather data from {json_file_path}")
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+        data = load_document(json_file_path)
 
         hourly_data = data.get('hourly', [])
         if not hourly_data:
@@ -51,24 +46,32 @@ def read_and_format_hourly_weather(json_file_path, time_zone, unit_type, logger)
         # Header line
         formatted_lines = ["Date,Time,Temperature,Feels Like,Humidity %,Dew Point,Clouds %,Pop %,UV Index,Wind Speed,Wind Gust (m/s),Wind From"]
 
-        for hour in hourly_data[:48]:
-            date = format_unix_date(hour['dt'], time_zone)
-            time = format_unix_time(hour['dt'], time_zone)
-            temp = append_units('temp', hour['temp'], unit_type)
-            feels_like = append_units('feels_like', hour['feels_like'], unit_type)
-            humidity = append_units('humidity', hour['humidity'], unit_type)
-            dew_point = append_units('dew_point', hour['dew_point'], unit_type)
-            clouds = append_units('clouds', hour['clouds'], unit_type)
-            pop = append_units('pop', int(hour['pop'] * 100), unit_type)
-            uvi = hour['uvi']
-            wind_speed = f"{hour['wind_speed']}m/s"
-            wind_gust = f"{hour.get('wind_gust', 0)}m/s"
-            wind_deg = f"{hour['wind_deg']}°"
+        # One array per field instead of one dict per hour, see _forecast_columns.py
+        hourly = block_columns('hourly', hourly_data[:48], HOURLY_TEXT_FIELDS)
+        if not with_text:
+            return hourly, None
+        dates = format_unix_dates(hourly['dt'], time_zone)
+        times = format_unix_times(hourly['dt'], time_zone)
+        pop = (hourly['pop'] * 100).astype(int).tolist()
+        rows = zip(dates, times, hourly.text('temp'), hourly.text('feels_like'), hourly.text('humidity'), hourly.text('dew_point'),
+                   hourly.text('clouds'), pop, hourly.text('uvi'), hourly.text('wind_speed'), hourly.text('wind_gust'),
+                   hourly.text('wind_deg'))
+
+        for date, time, temp, feels_like, humidity, dew_point, clouds, pop, uvi, wind_speed, wind_gust, wind_deg in rows:
+            temp = append_units('temp', temp, unit_type)
+            feels_like = append_units('feels_like', feels_like, unit_type)
+            humidity = append_units('humidity', humidity, unit_type)
+            dew_point = append_units('dew_point', dew_point, unit_type)
+            clouds = append_units('clouds', clouds, unit_type)
+            pop = append_units('pop', pop, unit_type)
+            wind_speed = f"{wind_speed}m/s"
+            wind_gust = f"{wind_gust}m/s"  # 0 where the hour has no wind_gust
+            wind_deg = f"{wind_deg}°"
             line = f"{date},{time},{temp},{feels_like},{humidity},{dew_point},{clouds},{pop},{uvi},{wind_speed},{wind_gust},{wind_deg}"
             formatted_lines.append(line)
 
         logger.info("Successfully processed and formatted hourly weather data.")
-        return "\n".join(formatted_lines)
+        return hourly, "\n".join(formatted_lines)
     except json.JSONDecodeError as e:
         logger.error(f"Error decoding JSON from file {json_file_path}: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
@@ -81,7 +84,17 @@ def read_and_format_hourly_weather(json_file_path, time_zone, unit_type, logger)
         logger.exception(f"Unexpected error occurred while processing hourly weather data: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
-    return None
+    return None, None
+
+
+def write_hourly_columns_to_file(columns_file_path, hourly, time_zone, logger):
+    try:
+        save_columns(columns_file_path, hourly, time_zone)
+        logger.info(f"Hourly weather columns successfully written to {columns_file_path}")
+    except OSError as e:
+        logger.error(f"IO error occurred while writing to file {columns_file_path}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
 
 
 def write_hourly_forecast_to_file(output_file_path, formatted_data, logger):
@@ -119,17 +132,69 @@ def extract_parameter_value(location_config, parameter_name, logger, location_na
 
 def load_locations_data(locations_data_fileanme, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     if not location_config:
-        logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{locations_data_fileanme}".')
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_fileanme}".')
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
     return location_config
 
 
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    json_file_name = f"{location_name}.json"
+    output_file_name = f"{location_name}_hourly_forecast.txt"
+    json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
+    output_file_path = os.path.join(script_path, weather_data_path, output_file_name)
+    columns_file_path = os.path.join(script_path, weather_data_path, f"{location_name}_hourly_forecast.npz")
+    
+    # Read the parameter values
+    # location_name is given for a logging purposes only.
+    unit_type = extract_parameter_value(location_config, 'units', logger, location_name)
+    time_zone = extract_parameter_value(location_config, 'time_zone', logger, location_name)
+    
+    # The .txt is for reading only, the plotters read the .npz
+    with_text = location_config.get('text_forecasts', 'yes') == 'yes'
+
+    # Read WeinheimerStr_55.json and format it into a long string 
+    hourly, formatted_data = read_and_format_hourly_weather(json_file_path, time_zone, unit_type, logger, with_text)
+
+    # Write the columns into WeinheimerStr_55_hourly_forecast.npz, see _forecast_columns.py
+    write_hourly_columns_to_file(columns_file_path, hourly, time_zone, logger)
+
+    # Write this long string into WeinheimerStr_55_hourly_forecast.txt
+    if with_text:
+        write_hourly_forecast_to_file(output_file_path, formatted_data, logger)
+    elif os.path.exists(output_file_path):
+        os.remove(output_file_path)  # An outdated one would be mistaken for the current forecast
+
+    logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+
+
 def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
 
     #region COMMON CODE START -------------------------------------------------------------------
     # Get the full path of the current script
@@ -139,13 +204,6 @@ def main():
     # Use the common log file for all scripts
     log_filename = 'logging.txt'
 
-    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
-    location_configuration_data_file = 'locations.json'
-
-    # Directory for the weather data files
-    weather_data_directoryName = 'weather_data'
-    weather_data_path = os.path.join(script_path, weather_data_directoryName)
-
     # Directory for the log files
     log_files_directoryName  = 'log_files'
     log_files_path = os.path.join(script_path, log_files_directoryName)
@@ -173,34 +231,7 @@ def main():
     #endregion COMMON CODE END ------------------------------------------------------------------------
 
     try:
-        # Read the locations data chect that the LOCATION exists
-        location_config = load_locations_data(location_configuration_data_file, LOCATION_NAME, logger)
-        
-        # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
-        if not location_config:
-            logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{location_configuration_data_file}".')
-            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            sys.exit(1)
-        
-        # If location exists in the configuration file process it
-        else:
-            json_file_name = f"{LOCATION_NAME}.json"
-            output_file_name = f"{LOCATION_NAME}_hourly_forecast.txt"
-            json_file_path = os.path.join(script_path, weather_data_path, json_file_name)
-            output_file_path = os.path.join(script_path, weather_data_path, output_file_name)
-            
-            # Read the parameter values
-            # LOCATION_NAME is given for a logging purposes only.
-            unit_type = extract_parameter_value(location_config, 'units', logger, LOCATION_NAME)
-            time_zone = extract_parameter_value(location_config, 'time_zone', logger, LOCATION_NAME)
-            
-            # Read WeinheimerStr_55.json and format it into a long string 
-            formatted_data = read_and_format_hourly_weather(json_file_path, time_zone, unit_type, logger)
-            
-            # Write this long string into WeinheimerStr_55_hourly_forecast.txt
-            write_hourly_forecast_to_file(output_file_path, formatted_data, logger)
-
-            logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+        run(LOCATION_NAME, logger)
 
     except Exception as e:
         # Catch any exception that was not already caught and logged
@@ -210,4 +241,3 @@ def main():
 
 if __name__ == "__main__":
     main()
-
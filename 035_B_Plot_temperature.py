@@ -1,48 +1,32 @@
-# <WeinheimerStr_55>_hourly_forecast.txt   --->   035_B_Plot_temperature.py   --->   <WeinheimerStr_55>_hourly_temperature.jpeg
+# <WeinheimerStr_55>_hourly_forecast.npz   --->   035_B_Plot_temperature.py   --->   <WeinheimerStr_55>_hourly_temperature.jpeg
+# The .txt of 030_B is read instead if there is no .npz (see _hourly_frame.py, shared with the other plotters)
 
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-import pandas as pd
 import sys
-import datetime
-import json
 import os
 import logging
+from _hourly_frame import load_hourly_frame
+from _weather_documents import load_document
 
-LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
-# Load the location name from command-line arguments
-# LOCATION_NAME = "WeinheimerStr_55"
-# LOCATION_NAME ="EttlingerStr_8"
-
-
-def parse_date_time(row):
-    return datetime.datetime.strptime(f"{row['Date']} {row['Time']}", "%d.%m.%Y %H:%M")
-
-
-def read_and_process_data(file_path, unit_type, logger):
+def read_and_process_data(weather_data_path, location_name, unit_type, logger):
+    # The shared frame of _hourly_frame.py, parsed once for all plotters
     try:
         unit_symbol = '°C' if unit_type == 'metric' else '°F'
-        wind_speed_unit = 'm/s'  # Assuming wind speed is in meters per second
-        data = pd.read_csv(file_path, delimiter=',')
-        data['Date_Time'] = data.apply(parse_date_time, axis=1)
-
-        # Process temperature and other data as before
-        data[f'Temperature {unit_symbol}'] = data['Temperature'].str.rstrip(unit_symbol).astype(float)
-        data[f'Feels Like {unit_symbol}'] = data['Feels Like'].str.rstrip(unit_symbol).astype(float)
-        data[f'Dew Point {unit_symbol}'] = data['Dew Point'].str.rstrip(unit_symbol).astype(float)
-
-        # Process wind speed data
-        data['Wind Speed (m/s)'] = data['Wind Speed'].str.rstrip(wind_speed_unit).astype(float)
-        
+        data = load_hourly_frame(weather_data_path, location_name)
+        data = data[['Date_Time', 'Temperature', 'Feels Like', 'Dew Point', 'Wind Speed (m/s)']].rename(columns={
+            'Temperature': f'Temperature {unit_symbol}',
+            'Feels Like': f'Feels Like {unit_symbol}',
+            'Dew Point': f'Dew Point {unit_symbol}',
+        })
         logger.info("Data read and converted")
-
         return data
     except Exception as e:
-        logging.error(f"Error reading or processing file {file_path}: {e}")
+        logging.error(f"Error reading or processing the hourly forecast of {location_name} in {weather_data_path}: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
         return None
-    
+
 
 def plot_data(data, location, jpeg_file_path, unit_type, logger):
     unit_symbol = '°C' if unit_type == 'metric' else '°F'
@@ -82,16 +66,18 @@ def plot_data(data, location, jpeg_file_path, unit_type, logger):
     plt.savefig(jpeg_file_path, format='jpeg', bbox_inches='tight')
     logger.info(f"Combined Temperature and Wind Speed diagram saved in {jpeg_file_path}")
 
+    # Close the plot to free up memory, figures would otherwise pile up in the _controller in-process mode
+    plt.close(fig)
+
 
 
 
 def load_locations_data(locations_data_fileanme, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     if not location_config:
-        logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{locations_data_fileanme}".')
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_fileanme}".')
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
     return location_config
@@ -107,7 +93,45 @@ def extract_parameter_value(location_config, parameter_name, logger, location_na
     return value
 
 
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    # Read the parameter values
+    # location_name is given for a logging purposes only.
+    unit_type = extract_parameter_value(location_config, 'units', logger, location_name)
+    
+    jpeg_file_name = f"{location_name}_hourly_temperature.jpeg"
+    jpeg_file_path = os.path.join(weather_data_path, jpeg_file_name)
+
+    data = read_and_process_data(weather_data_path, location_name, unit_type, logger)
+    plot_data(data, location_name, jpeg_file_path, unit_type, logger)
+    # plt.show() # Do not show the diagram, for running via _controller script
+
+    logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
+
+
 def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
 
     #region COMMON CODE START -------------------------------------------------------------------
     # Get the full path of the current script
@@ -117,13 +141,6 @@ def main():
     # Use the common log file for all scripts
     log_filename = 'logging.txt'
 
-    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
-    location_configuration_data_file = 'locations.json'
-
-    # Directory for the weather data files
-    weather_data_directoryName = 'weather_data'
-    weather_data_path = os.path.join(script_path, weather_data_directoryName)
-
     # Directory for the log files
     log_files_directoryName  = 'log_files'
     log_files_path = os.path.join(script_path, log_files_directoryName)
@@ -151,34 +168,8 @@ def main():
     #endregion COMMON CODE END ------------------------------------------------------------------------
 
     try:
-        # Read the locations data chect that the LOCATION exists
-        location_config = load_locations_data(location_configuration_data_file, LOCATION_NAME, logger)
-        
-        # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
-        if not location_config:
-            logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{location_configuration_data_file}".')
-            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            sys.exit(1)
-        
-        # If location exists in the configuration file process it
-        else:
-            # Read the parameter values
-            # LOCATION_NAME is given for a logging purposes only.
-            unit_type = extract_parameter_value(location_config, 'units', logger, LOCATION_NAME)
-            
-            weather_data_path = os.path.join(script_path, weather_data_directoryName)
-            input_file_name = f"{LOCATION_NAME}_hourly_forecast.txt"
-            jpeg_file_name = f"{LOCATION_NAME}_hourly_temperature.jpeg"
-            
-            hourly_file_path = os.path.join(weather_data_path, input_file_name)
-            jpeg_file_path = os.path.join(weather_data_path, jpeg_file_name)
-
-            data = read_and_process_data(hourly_file_path, unit_type, logger)
-            plot_data(data, LOCATION_NAME, jpeg_file_path, unit_type, logger)
-            # plt.show() # Do not show the diagram, for running via _controller script
-
-            logger.info("OK, FINISHED NORMALLY -------------------------------------------------------------------------------")
-    
+        run(LOCATION_NAME, logger)
+
     except Exception as e:
         # Catch any exception that was not already caught and logged
         logger.error(f"An unexpected error occurred: {e}")
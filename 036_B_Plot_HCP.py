@@ -1,33 +1,23 @@
-# <WeinheimerStr_55>_hourly_forecast.txt   --->   035_B_Plot_temperature.py   --->   <WeinheimerStr_55>_hourly_HPC.jpeg
+# <WeinheimerStr_55>_hourly_forecast.npz   --->   036_B_Plot_HCP.py   --->   <WeinheimerStr_55>_hourly_HPC.jpeg
+# The .txt of 030_B is read instead if there is no .npz (see _hourly_frame.py, shared with the other plotters)
 
 import matplotlib.pyplot as plt
 import matplotlib.dates as mdates
-import pandas as pd
-import datetime
 import sys
 import os
 import logging
-import json
+from _hourly_frame import load_hourly_frame
+from _weather_documents import load_document
 
-LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
-# Load the location name from command-line arguments
-# LOCATION_NAME = "WeinheimerStr_55"
-# LOCATION_NAME ="EttlingerStr_8"
-
-def parse_date_time(row):
-    return datetime.datetime.strptime(f"{row['Date']} {row['Time']}", "%d.%m.%Y %H:%M")
-
-def read_and_process_data(file_path, logger):
+def read_and_process_data(weather_data_path, location_name, logger):
+    # The shared frame of _hourly_frame.py, parsed once for all plotters
     try:
-        data = pd.read_csv(file_path, delimiter=',')
-        data['Date_Time'] = data.apply(parse_date_time, axis=1)
-        data['Humidity %'] = data['Humidity %'].str.replace('%', '').astype(float)
-        data['Clouds %'] = data['Clouds %'].str.replace('%', '').astype(float)
-        data['Pop %'] = data['Pop %'].str.replace('%', '').astype(float)
+        data = load_hourly_frame(weather_data_path, location_name)
+        data = data[['Date_Time', 'Humidity %', 'Clouds %', 'Pop %']]
         logger.info("HPS Data read")
         return data
     except Exception as e:
-        logging.error(f"Error reading or processing file {file_path}: {e}")
+        logging.error(f"Error reading or processing the hourly forecast of {location_name} in {weather_data_path}: {e}")
         return None
 
 def plot_data(data, location, jpeg_file_path, logger):
@@ -55,20 +45,55 @@ def plot_data(data, location, jpeg_file_path, logger):
     plt.savefig(jpeg_file_path, format='jpeg', bbox_inches='tight')
     logger.info(f"HPC diagram saved in {jpeg_file_path}")
 
+    # Close the plot to free up memory, figures would otherwise pile up in the _controller in-process mode
+    plt.close()
+
 
 def load_locations_data(locations_data_fileanme, location_name, logger):
     config_path = os.path.join(os.path.dirname(__file__), locations_data_fileanme)
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     location_config = config.get(location_name)
     if not location_config:
-        logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{locations_data_fileanme}".')
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_fileanme}".')
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         sys.exit(1)
     return location_config
 
 
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    jpeg_file_name = f"{location_name}_hourly_HPC.jpeg"
+    jpeg_file_path = os.path.join(weather_data_path, jpeg_file_name)
+
+    data = read_and_process_data(weather_data_path, location_name, logger)
+
+    plot_data(data, location_name, jpeg_file_path, logger)
+    # plt.show() # Do not show the diagram, for running via _controller script
+
+
 def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
 
     #region COMMON CODE START -------------------------------------------------------------------
     # Get the full path of the current script
@@ -78,13 +103,6 @@ def main():
     # Use the common log file for all scripts
     log_filename = 'logging.txt'
 
-    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
-    location_configuration_data_file = 'locations.json'
-
-    # Directory for the weather data files
-    weather_data_directoryName = 'weather_data'
-    weather_data_path = os.path.join(script_path, weather_data_directoryName)
-
     # Directory for the log files
     log_files_directoryName  = 'log_files'
     log_files_path = os.path.join(script_path, log_files_directoryName)
@@ -112,37 +130,13 @@ def main():
     #endregion COMMON CODE END ------------------------------------------------------------------------
 
     try:
-        # Read the locations data chect that the LOCATION exists
-        location_config = load_locations_data(location_configuration_data_file, LOCATION_NAME, logger)
-        
-        # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
-        if not location_config:
-            logger.error(f'Configuration data for the location "{LOCATION_NAME}" not found in the file "{location_configuration_data_file}".')
-            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-            sys.exit(1)
-        
-        # If location exists in the configuration file process it
-        else:
-            weather_data_path = os.path.join(script_path, weather_data_directoryName)
-            input_file_name = f"{LOCATION_NAME}_hourly_forecast.txt"
-            jpeg_file_name = f"{LOCATION_NAME}_hourly_HPC.jpeg"
-            
-            hourly_file_path = os.path.join(weather_data_path, input_file_name)
-            jpeg_file_path = os.path.join(weather_data_path, jpeg_file_name)
-
-            data = read_and_process_data(hourly_file_path, logger)
-    
-            plot_data(data, LOCATION_NAME, jpeg_file_path, logger)
-            # plt.show() # Do not show the diagram, for running via _controller script
+        run(LOCATION_NAME, logger)
 
-    
     except Exception as e:
         # Catch any exception that was not already caught and logged
         logger.error(f"An unexpected error occurred: {e}")
         sys.exit(1)
         return
 
-
-
 if __name__ == "__main__":
     main()
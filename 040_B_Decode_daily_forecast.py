@@ -1,9 +1,10 @@
 # 040_B_Decode_daily_forecast.py
-import json
 import os
 import sys
 import logging
+from collections.abc import Mapping
 from datetime import datetime
+from _weather_documents import load_document
 
 LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
 # Load the location name from command-line arguments
@@ -13,8 +14,7 @@ LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use
 
 def load_config():
     config_path = os.path.join(os.path.dirname(__file__), 'config.json')
-    with open(config_path, 'r') as file:
-        config = json.load(file)
+    config = load_document(config_path)
     return config
 
 def setup_logging(log_filepath):
@@ -33,8 +33,7 @@ def append_units(key, value):
 
 def read_and_format_daily_weather(json_file_path):
     try:
-        with open(json_file_path, 'r', encoding='utf-8') as file:
-            data = json.load(file)
+        data = load_document(json_file_path)
         
         daily_data = data.get('daily', [])
         formatted_data = "Daily Weather Forecast:\n"
@@ -42,7 +41,7 @@ def read_and_format_daily_weather(json_file_path):
             date = format_unix_date(day['dt'])
             formatted_data += f"\nDate: {date}\n"
             for key, value in day.items():
-                if isinstance(value, dict):
+                if isinstance(value, Mapping):  # The shared documents are read-only mappings, not dicts
                     for sub_key, sub_value in value.items():
                         formatted_value = append_units(sub_key, sub_value)
                         formatted_data += f"{sub_key.replace('_', ' ').title()}: {formatted_value}\n"
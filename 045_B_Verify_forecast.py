@@ -0,0 +1,151 @@
+# <WeinheimerStr_55>_forecast_archive.sqlite   --->                                --->   <WeinheimerStr_55>_verification.sqlite
+# <WeinheimerStr_55>_history.sqlite            --->   045_B_Verify_forecast.py
+# <WeinheimerStr_55>_urlResponse.json          --->
+# Scores the archived hourly temperature forecasts (007_B) against the observed temperatures: current.temp recorded
+# by 005_B and, with "local_api": "yes", the local sensor. Only what is new since the last run is joined, see
+# _forecast_verification.py. The scores: python3 _forecast_verification.py report
+
+import os
+import sys
+import sqlite3
+import zlib
+import logging
+from _forecast_verification import VerificationStore, update_location, verification_file_path
+from _weather_documents import load_document
+
+def load_locations_data(locations_data_filename, location_name, logger):
+    config_path = os.path.join(os.path.dirname(__file__), locations_data_filename)
+    config = load_document(config_path)
+    location_config = config.get(location_name)
+    logger.info(f"Location data loaded for {location_name}")
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{locations_data_filename}".')
+        sys.exit(1)
+    return location_config
+
+
+def extract_parameter_value(location_config, parameter_name, logger, location_name_for_logging_only):
+    try:
+        value = location_config[parameter_name]  # Retrieve the parameter from the location config
+        logger.info(f"Parameter extracted: {parameter_name}")
+    except KeyError:
+        logger.error(f"'{parameter_name}' key not found in the configuration for {location_name_for_logging_only}.")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+    return value
+
+
+def record_local_observation(weather_data_path, location_name, unit_type, logger):
+    # The temperature of the local sensor, at the time 001_B wrote <LOCATION>_urlResponse.json
+    json_file_path = os.path.join(weather_data_path, f"{location_name}_urlResponse.json")
+    try:
+        local_data = load_document(json_file_path)
+        temperature = local_data.get("temperatureInC")
+        if not isinstance(temperature, (int, float)):
+            logger.info(f"No temperatureInC in {json_file_path}, no local observation recorded")
+            return
+        if unit_type == 'imperial':
+            temperature = temperature * 9 / 5 + 32
+        with VerificationStore(verification_file_path(weather_data_path, location_name)) as store:
+            store.record_observation("local_sensor", int(os.stat(json_file_path).st_mtime), float(temperature))
+        logger.info(f"Local observation recorded: {temperature}")
+    except FileNotFoundError:
+        logger.info(f"No {json_file_path}, no local observation recorded")
+    except (sqlite3.Error, OSError, ValueError) as e:
+        logger.error(f"Error recording the local observation of {json_file_path}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+
+def verify_forecasts(weather_data_path, location_name, logger):
+    try:
+        added = update_location(weather_data_path, location_name)
+        if not added:
+            logger.info(f"No forecast archive of {location_name}, nothing to verify")
+        for source, pairs in added.items():
+            logger.info(f"Forecasts verified against {source}: {pairs} new pairs")
+    except (sqlite3.Error, OSError, ValueError, zlib.error) as e:
+        logger.error(f"Error verifying the forecasts of {location_name}: {e}")
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+
+def run(location_name, logger):
+    # Stage entry point, used by the _controller in-process mode and by main() below
+    script_path = os.path.dirname(os.path.abspath(__file__))
+
+    # Here are the coordinates, language, units etc for locations such as "WeinheimerStr_51"
+    location_configuration_data_file = 'locations.json'
+
+    # Directory for the weather data files
+    weather_data_directoryName = 'weather_data'
+    weather_data_path = os.path.join(script_path, weather_data_directoryName)
+
+    # Read the locations data chect that the LOCATION exists
+    location_config = load_locations_data(location_configuration_data_file, location_name, logger)
+    
+    # If location, such as "WeinheimerStr_51"does not exist in the configuration file, log and exit.
+    if not location_config:
+        logger.error(f'Configuration data for the location "{location_name}" not found in the file "{location_configuration_data_file}".')
+        logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        sys.exit(1)
+
+    # Read the parameter values
+    # location_name is given for a logging purposes only.
+    unit_type = extract_parameter_value(location_config, 'units', logger, location_name)
+
+    if location_config.get('local_api', 'no') == 'yes':
+        record_local_observation(weather_data_path, location_name, unit_type, logger)
+    verify_forecasts(weather_data_path, location_name, logger)
+
+
+def main():
+    LOCATION_NAME = sys.argv[1]  # The first argument is the script name, so we use the second one.
+    # Load the location name from command-line arguments
+    # LOCATION_NAME = "WeinheimerStr_55"
+    # LOCATION_NAME ="EttlingerStr_8"
+    # LOCATION_NAME = "MorrisCourt_4imp"
+
+    #region COMMON CODE START -------------------------------------------------------------------
+    # Get the full path of the current script
+    script_path = os.path.dirname(os.path.abspath(__file__))
+    # Extract the script's name from the full path
+    script_name = os.path.splitext(os.path.basename(__file__))[0]
+    # Use the common log file for all scripts
+    log_filename = 'logging.txt'
+
+    # Directory for the log files
+    log_files_directoryName  = 'log_files'
+    log_files_path = os.path.join(script_path, log_files_directoryName)
+    absolute_log_filename = os.path.join(log_files_path, log_filename)  # Include the file name in the path
+    if not os.path.exists(log_files_path):
+        os.makedirs(log_files_path)
+
+    # Create a logger object
+    logger = logging.getLogger()
+    logger.setLevel(logging.FATAL)  # Set the logger's level
+    # Create a handler for writing to a file
+    file_handler = logging.FileHandler(absolute_log_filename)
+    file_handler.setLevel(logging.FATAL)  # Set the file handler's level
+    file_handler.setFormatter(logging.Formatter(f'%(asctime)s {script_name} %(levelname)s: %(message)s'))
+    
+    # Create a handler for writing to the console
+    stream_handler = logging.StreamHandler()
+    stream_handler.setLevel(logging.FATAL)  # Set the stream handler's level
+    stream_handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s: %(message)s'))
+    # Add both handlers to the logger
+    logger.addHandler(file_handler)
+    logger.addHandler(stream_handler)
+    # Signal start
+    logger.info("Program started")
+    #endregion COMMON CODE END ------------------------------------------------------------------------
+
+    try:
+        run(LOCATION_NAME, logger)
+
+    except Exception as e:
+        logger.error(f"An unexpected error occurred: {e}")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
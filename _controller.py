@@ -3,24 +3,90 @@
 # Shall be combined with the locations.json and the task schedule for _controller.py within the Synology Task Scheduler
 # 
 # Functiion "should_run_script_for_location"
-# This _conntroller will start all scripts (see ** below) listed in the structure scripts = [ ... ], one after the other.
+# This _conntroller will start all scripts (see ** below) listed in the stage graph STAGES = { ... } in _stage_graph.py.
+# A script starts once the scripts writing its input files have finished, see _stage_graph.py.
+# With --stage-workers N (N > 1) up to N independent scripts of one location run at the same time,
+# e.g. 020_B -> 025_B alongside 030_B -> 035_B/036_B. By default they run one after the other.
 # This _conntroller will start all scripts for the LOCATIONS listed in the locations.json, according to the parameter "running_period"
-#   If "running_period": "each_start", this script will start scripts = [ ... ] at each start of this script.
-#   If "running_period": "full_hour_only", this script will start the scripts = [ ... ] 
+#   If "running_period": "each_start", this script will start the scripts of the stage graph (STAGES) at each start of this script.
+#   If "running_period": "full_hour_only", this script will start the scripts of the stage graph (STAGES)
 #       only if the time_now is within the first 30 seconds past full hour.
 #
 # ** Function "should_run_script_at_all"
 # All scripts will be started, except those explicitelly listed in the function "should_run_script_at_all".
+#
+# Execution modes, selected with --mode
+#   "inprocess" (default): every script is imported once and its run(location_name, logger) is called
+#       inside this interpreter. This _controller must then itself be started from the weather venv.
+#       A script that can not be imported falls back to the subprocess mode.
+#   "subprocess": every script is started as "python3 script.py LOCATION" in its own shell, as before.
+# In both modes the time taken by each script and each location is logged at the end of the run.
+#
+# Locations run one after the other, unless --workers N (N > 1) is given. Then up to N locations run
+# side by side in a thread pool (--pool thread, default) or a process pool (--pool process).
+# The scripts of one location always respect the stage graph, and an error in one location does not
+# stop the others.
+#
+# Scripts whose input files did not change since their last successful run are skipped, see _manifest.py.
+# --force runs them anyway. The number of skipped (unchanged) and run scripts is logged at the end of the run.
+#
+# Daemon mode (--daemon): instead of being started by the Synology Task Scheduler, the _controller stays resident,
+# keeps the scripts imported and runs each location on its own slots, see _scheduler.py.
+# Each run is checked against its slot time, so a late wakeup no longer drops the full-hour run and 005_B.
+#
+# Render workers (--render-workers N, in-process mode): the plotting scripts run in N pre-warmed worker processes
+# with matplotlib and pandas already imported, instead of one at a time in this interpreter, see _render_pool.py.
+#
+# Batch fetch (--batch-fetch): 000_B fetches all locations of the run at the same time over one connection pool
+# (--fetch-concurrency, --calls-per-minute) before the locations are processed, instead of one location after the other.
+# Nearby locations share one One Call request through the fetch cache of _fetch_cache.py (--cache-ttl, --cache-max-stale),
+# the API calls saved are logged at the end of the run.
+#
+# Every run appends an execution trace (wall, CPU, peak memory, bytes written per script and location) to
+# log_files/trace.jsonl. "python3 _trace.py summary" shows the slowest scripts and locations of the last runs.
 
 
-import json
+import argparse
+import threading
 import os
 import sys
 import subprocess
 import platform  
 import logging
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import nullcontext
 from datetime import datetime
 
+from _manifest import StageManifest
+from _render_pool import RenderPool
+from _scheduler import LocationScheduler, run_daemon
+from _stage_graph import STAGES, import_stage, one_call_exclude, run_stage_graph, stage_levels, stages_for_location
+from _trace import Tracer
+import _json_codec as json_codec
+
+# The scripts log at FATAL only when started on their own, keep it that way when they run in-process
+STAGE_LOG_LEVEL = logging.FATAL
+
+# Scripts already imported by the in-process mode, None if the import failed
+_stage_modules = {}
+
+# pyplot keeps one global "current figure", so these scripts must not run in two threads at the same time
+PYPLOT_SCRIPTS = {
+    "010_B_Decode_current_weather.py",
+    "025_B_Plot_precipitation.py",
+    "035_B_Plot_temperature.py",
+    "036_B_Plot_HCP.py",
+}
+_pyplot_lock = threading.Lock()
+
+# Fetches the weather data, done for all locations at once with --batch-fetch
+FETCH_SCRIPT = "000_B_Perform_one_call.py"
+
+# Pre-warmed processes for the PYPLOT_SCRIPTS, None unless --render-workers is given
+_render_pool = None
+
 def setup_logging():
     script_path = os.path.dirname(os.path.abspath(__file__))
     log_filename = 'logging.txt'
@@ -46,30 +112,92 @@ def setup_logging():
     return logger
 
 
-def run_script_unix(script_name, location, logger):
+def init_worker_logging():
+    # Process pool workers started with "spawn" (Windows) do not inherit the handlers of the _controller
+    if not logging.getLogger().handlers:
+        setup_logging()
+
+
+def option_arguments(options):
+    # {"exclude": ["alerts", "daily"]} -> " --exclude=alerts,daily", for the command line of a script
+    return "".join(f" --{name}={','.join(value)}" for name, value in (options or {}).items())
+
+
+def run_script_unix(script_name, location, logger, options=None):
     try:
         script_path = os.path.join(os.path.dirname(__file__), script_name)
         venv_path = '/volume1/GHR_weather_env'
-        command = f'source {venv_path}/bin/activate && python3 {script_path} {location}'
+        command = f'source {venv_path}/bin/activate && python3 {script_path} {location}{option_arguments(options)}'
         subprocess.run(command, shell=True, check=True)
         logger.info(f"Successfully ran {script_name} for {location} on Unix")
+        return True
     except subprocess.CalledProcessError as e:
         logger.error(f"Error running {script_name} for {location} on Unix: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         # sys.exit(1)
+        return False
 
 
-def run_script_windows(script_name, location, logger):
+def run_script_windows(script_name, location, logger, options=None):
     try:
         script_path = os.path.join(os.path.dirname(__file__), script_name)
         venv_path = 'C:\\Users\\Goran\\OneDrive\\Programing\\Python\\pythonvenv\\GPT4'
-        command = f'{venv_path}\\Scripts\\activate && python {script_path} {location}'
+        command = f'{venv_path}\\Scripts\\activate && python {script_path} {location}{option_arguments(options)}'
         subprocess.run(command, shell=True, executable='C:\\Windows\\System32\\cmd.exe', check=True)
         logger.info(f"Successfully ran {script_name} for {location} on Windows")
+        return True
     except subprocess.CalledProcessError as e:
         logger.error(f"Error running {script_name} for {location} on Windows: {e}")
         logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
         # sys.exit(1)
+        return False
+
+
+def run_script_subprocess(script_name, location, logger, options=None):
+    # options: {name: list of values} given to the script as --name=value,value (only 000_B takes one, "exclude")
+    # Determine the operating system
+    if platform.system() == "Windows":
+        return run_script_windows(script_name, location, logger, options)
+    return run_script_unix(script_name, location, logger, options)
+
+
+def load_stage_module(script_name, logger):
+    # Import a script such as "030_B_Decode_hourly_forecast.py" once per _controller process
+    if script_name not in _stage_modules:
+        try:
+            _stage_modules[script_name] = import_stage(script_name)
+        except Exception as e:
+            logger.warning(f"Could not import {script_name}, it will run as a subprocess: {e}")
+            _stage_modules[script_name] = None
+    return _stage_modules[script_name]
+
+
+def run_script_inprocess(script_name, location, logger, options=None):
+    # options: keyword arguments of run(), see run_script_subprocess
+    if _render_pool is not None and script_name in PYPLOT_SCRIPTS:
+        return _render_pool.run(script_name, location, logger)
+
+    module = load_stage_module(script_name, logger)
+    if module is None:
+        return run_script_subprocess(script_name, location, logger, options)
+
+    stage_logger = logging.getLogger(os.path.splitext(script_name)[0])
+    stage_logger.setLevel(STAGE_LOG_LEVEL)
+    try:
+        with _pyplot_lock if script_name in PYPLOT_SCRIPTS else nullcontext():
+            module.run(location, stage_logger, **(options or {}))
+        logger.info(f"Successfully ran {script_name} for {location} in-process")
+        return True
+    except SystemExit as e:
+        # The scripts report their errors with sys.exit(1)
+        if not e.code:
+            logger.info(f"Successfully ran {script_name} for {location} in-process")
+            return True
+        logger.error(f"Error running {script_name} for {location} in-process: exit code {e.code}")
+    except Exception as e:
+        logger.error(f"Error running {script_name} for {location} in-process: {e}")
+    logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+    return False
 
 
 def should_run_script_for_location(running_period, time_now):
@@ -91,11 +219,26 @@ def should_run_script_at_all(script_name, time_now):
     return True  # This will allow other scripts to run irrespective of the time condition
 
 
+def location_run_stages(stages, location, location_config, time_now, logger=None):
+    # The scripts run for a location this time: not disabled by its options (see _stage_graph.py), allowed at time_now
+    enabled = stages_for_location(stages, location_config)
+    location_stages = {}
+    for script, stage in stages.items():
+        if script not in enabled:
+            if logger:
+                logger.info(f"Skipping {script} for {location} as its options in locations.json disable it.")
+        elif should_run_script_at_all(script, time_now):
+            location_stages[script] = stage
+        elif logger:
+            logger.info(f"Skipping {script} as 'should_run_script_at_all returns 'no'.")
+    return location_stages
+
+
 def load_locations(logger):
     try:
         config_path = os.path.join(os.path.dirname(__file__), 'locations.json')
-        with open(config_path, 'r') as file:
-            config = json.load(file)
+        with open(config_path, 'rb') as file:
+            config = json_codec.loads(file.read())
         return config
     except Exception as e:
         logger.error(f"Error loading locations: {e}")
@@ -103,47 +246,284 @@ def load_locations(logger):
         sys.exit(1)
 
 
-def main():
+def run_location(location, location_config, stages, args, tracer, prefetched, time_now, logger):
+    # Run all scripts of the stage graph for one location.
+    # prefetched is {location: (ok, metrics)} of the --batch-fetch, FETCH_SCRIPT is not run again for these locations.
+    # Returns the seconds taken by the location, (script, seconds, ok) for each script, and the scripts
+    # skipped because their inputs did not change (hits) and those that had to run (misses).
+    # ok is None for a script skipped because a script it depends on failed.
+    run_script = run_script_inprocess if args.mode == "inprocess" else run_script_subprocess
+    weather_data_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_data')
+    manifest = StageManifest(location, location_config, weather_data_path, logger)
+    location_start = time.perf_counter()
+    location_stages = location_run_stages(stages, location, location_config, time_now, logger)
+    # 000_B requests only the blocks of the One Call response read by the scripts of this location and run
+    fetch_options = {"exclude": one_call_exclude(location_stages)}
+
+    def run_stage(script):
+        stage = location_stages[script]
+        output_file_paths = [manifest.file_path(output_file) for output_file in stage["outputs"]]
+        with tracer.stage(location, script, output_file_paths) as record:
+            if not args.force and manifest.is_up_to_date(script, stage):
+                logger.info(f"Skipping {script} for {location} as its inputs did not change.")
+                record.update(ok=True, unchanged=True)
+                return True
+            if script == FETCH_SCRIPT and location in prefetched:
+                ok, metrics = prefetched[location]
+                record.update(metrics, batch_fetch=True)
+            elif script == FETCH_SCRIPT:
+                ok = run_script(script, location, logger, fetch_options)
+            else:
+                ok = run_script(script, location, logger)
+            manifest.record(script, stage, ok)
+            record["ok"] = ok
+            return ok
+
+    stage_timings = run_stage_graph(location_stages, run_stage, args.stage_workers, logger)
+    manifest.save()
+    return time.perf_counter() - location_start, stage_timings, manifest.hits, manifest.misses
+
+
+def run_location_in_worker(location, location_config, stages, args, tracer, prefetched, time_now, logger):
+    # run_location in a process pool worker. Its copy of the tracer buffers the trace records, they are returned with
+    # the result and written by the _controller, see _trace.py.
+    tracer.buffer_records()
+    return run_location(location, location_config, stages, args, tracer, prefetched, time_now, logger), tracer.take_records()
+
+
+def run_locations(locations_config, stages, args, tracer, prefetched, time_now, logger):
+    # Returns {location: run_location(...)}, or None for a location whose worker failed
+    if args.workers <= 1:
+        return {
+            location: run_location(location, config, stages, args, tracer, prefetched, time_now, logger)
+            for location, config in locations_config.items()
+        }
+
+    if args.pool == "process":
+        executor = ProcessPoolExecutor(max_workers=args.workers, initializer=init_worker_logging)
+    else:
+        executor = ThreadPoolExecutor(max_workers=args.workers)
+
+    location_timings = {}
+    run_function = run_location_in_worker if args.pool == "process" else run_location
+    with executor:
+        futures = {
+            executor.submit(run_function, location, config, stages, args, tracer, prefetched, time_now, logger): location
+            for location, config in locations_config.items()
+        }
+        for future in as_completed(futures):
+            location = futures[future]
+            try:
+                if args.pool == "process":
+                    location_timings[location], records = future.result()
+                    tracer.add_records(records)
+                else:
+                    location_timings[location] = future.result()
+            except Exception as e:
+                logger.error(f"Error processing {location} in the {args.pool} pool: {e}")
+                logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+                location_timings[location] = None
+
+    # Report in the order of locations.json, not in the order the workers finished
+    return {location: location_timings[location] for location in locations_config}
+
+
+def log_timing_summary(args, location_timings, run_seconds, logger):
+    logger.info(f"Timing summary, mode {args.mode}:")
+    failed_locations = []
+    manifest_hits = manifest_misses = 0
+    for location, result in location_timings.items():
+        if result is None:
+            failed_locations.append(location)
+            logger.info(f"  {location}: FAILED")
+            continue
+        location_seconds, stage_timings, hits, misses = result
+        manifest_hits += len(hits)
+        manifest_misses += len(misses)
+        if not all(ok for _, _, ok in stage_timings):
+            failed_locations.append(location)
+        stages = ", ".join(
+            f"{script[:5]} {format_stage_result(seconds, ok, script in hits)}" for script, seconds, ok in stage_timings
+        )
+        logger.info(f"  {location}: {location_seconds:.2f}s [{stages}]")
+    logger.info(f"  All locations: {run_seconds:.2f}s, {len(location_timings)} run, {len(failed_locations)} with errors")
+    if failed_locations:
+        logger.info(f"  Locations with errors: {', '.join(failed_locations)}")
+    if args.force:
+        logger.info("  Change detection: off (--force)")
+    else:
+        logger.info(f"  Change detection: {manifest_hits} scripts skipped as unchanged, {manifest_misses} run")
+    return failed_locations
+
+
+def format_stage_result(seconds, ok, unchanged):
+    if ok is None:
+        return "SKIPPED"
+    if unchanged:
+        return "UNCHANGED"
+    return f"{seconds:.2f}s" + ("" if ok else " FAILED")
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(description="Run the weather scripts for the locations in locations.json")
+    parser.add_argument("--mode", choices=["inprocess", "subprocess"], default="inprocess",
+                        help="run the scripts inside this interpreter (default) or each in its own python3 process")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="number of locations processed at the same time (default 1, one after the other)")
+    parser.add_argument("--pool", choices=["thread", "process"], default="thread",
+                        help="kind of worker pool used when --workers is greater than 1")
+    parser.add_argument("--stage-workers", type=int, default=1,
+                        help="number of independent scripts of one location run at the same time (default 1)")
+    parser.add_argument("--force", action="store_true",
+                        help="run all scripts even if their input files did not change since their last run")
+    parser.add_argument("--render-workers", type=int, default=0,
+                        help="in-process mode: run the plotting scripts in this many pre-warmed processes (default 0, off)")
+    parser.add_argument("--render-max-jobs", type=int, default=50,
+                        help="replace a render worker after this many jobs to bound its memory (default 50)")
+    parser.add_argument("--batch-fetch", action="store_true",
+                        help="fetch the weather data of all locations at the same time before running the other scripts")
+    parser.add_argument("--fetch-concurrency", type=int, default=8,
+                        help="batch fetch: number of requests in flight at the same time (default 8)")
+    parser.add_argument("--calls-per-minute", type=int, default=60,
+                        help="batch fetch: at most this many One Call requests per minute, 0 for no limit (default 60)")
+    parser.add_argument("--cache-ttl", type=int, default=300,
+                        help="batch fetch: reuse a One Call response for nearby locations for this many seconds (default 300)")
+    parser.add_argument("--cache-max-stale", type=int, default=3600,
+                        help="batch fetch: use a response up to this many seconds old when the API fails (default 3600)")
+    parser.add_argument("--daemon", action="store_true",
+                        help="stay resident and run the locations on their own schedule instead of once")
+    parser.add_argument("--interval", type=int, default=10,
+                        help="daemon mode: period in minutes of the 'each_start' locations (default 10)")
+    parser.add_argument("--catch-up", type=int, default=30,
+                        help="daemon mode: run missed slots at most this many minutes late (default 30)")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    global _render_pool
+    args = parse_arguments(argv)
     logger = setup_logging()
-    logger.info("Starting _controller script")
+    logger.info(f"Starting _controller script, mode {args.mode}, {args.workers} worker(s) in a {args.pool} pool")
 
     locations_config = load_locations(logger)
 
-    scripts = [
-        "000_B_Perform_one_call.py",
-        "005_B_Log_API_response.py",
-        "010_B_Decode_current_weather.py",
-        "020_B_Decode_minutely_forecast.py",
-        "025_B_Plot_precipitation.py",
-        "030_B_Decode_hourly_forecast.py",
-        "035_B_Plot_temperature.py",
-        "036_B_Plot_HCP.py"
-        # Add the names of the other four scripts here
-    ]
+    # Add further scripts, with the files they read and write, to STAGES in _stage_graph.py
+    stages = STAGES
+    logger.info(f"{len(stages)} scripts in {len(stage_levels(stages))} levels, {args.stage_workers} at a time per location")
 
     # Capture the start time at the beginning of the script execution
     time_now = datetime.now()
 
-    # Determine the operating system
-    os_system = platform.system()
-    run_script = run_script_windows if os_system == "Windows" else run_script_unix
+    if args.mode == "inprocess":
+        # No display on the NAS, the plotting scripts only save JPEGs
+        os.environ.setdefault("MPLBACKEND", "Agg")
+        start = time.perf_counter()
+        for script in stages:
+            load_stage_module(script, logger)
+        logger.info(f"Loaded {len(stages)} scripts in {time.perf_counter() - start:.2f}s")
+
+        if args.render_workers > 0:
+            if args.pool == "process" and args.workers > 1:
+                logger.warning("--render-workers is ignored with --pool process, every location has its own process")
+            else:
+                _render_pool = RenderPool(args.render_workers, args.render_max_jobs, logger)
+                _render_pool.warm()
+
+    try:
+        run_locations_or_daemon(locations_config, stages, args, time_now, logger)
+    finally:
+        if _render_pool is not None:
+            _render_pool.shutdown()
+
 
+def run_locations_or_daemon(locations_config, stages, args, time_now, logger):
+    if args.daemon:
+        run_as_daemon(locations_config, stages, args, logger)
+        return
 
+    locations_to_run = {}
     for location, config in locations_config.items():
         if should_run_script_for_location(config.get("running_period", ""), time_now):
-            for script in scripts:
-                if should_run_script_at_all(script, time_now):
-                    run_script(script, location, logger)
-                else:
-                    logger.info(f"Skipping {script} as 'should_run_script_at_all returns 'no'.")
+            locations_to_run[location] = config
         else:
             logger.info(f"Skipping {location} as 'should_run_script_for_location' returns 'no'.")
 
+    run_once(locations_to_run, stages, args, time_now, logger)
     logger.info("Finished processing all scripts =====================================================================================")
 
 
-if __name__ == "__main__":
-    main()
+def run_once(locations_to_run, stages, args, time_now, logger):
+    tracer = Tracer(f"{datetime.now():%Y%m%dT%H%M%S}-{os.getpid()}", args.mode)
+    start = time.perf_counter()
+    prefetched = batch_fetch(locations_to_run, stages, args, time_now, logger) if args.batch_fetch else {}
+    location_timings = run_locations(locations_to_run, stages, args, tracer, prefetched, time_now, logger)
+    run_seconds = time.perf_counter() - start
+    failed_locations = log_timing_summary(args, location_timings, run_seconds, logger)
+    tracer.run_finished(run_seconds, list(locations_to_run), failed_locations)
+    log_fetch_summary(tracer, logger)
+
 
+def log_fetch_summary(tracer, logger):
+    # Counted from the trace records, so not available for the subprocess mode
+    fetch_cache_counts = tracer.fetch_cache_counts
+    requests = sum(fetch_cache_counts.values())
+    if requests:
+        saved = requests - fetch_cache_counts.get("miss", 0)
+        logger.info(
+            f"  Fetch cache: {fetch_cache_counts.get('miss', 0)} API calls, {saved} saved "
+            f"({fetch_cache_counts.get('stale', 0)} stale), hit ratio {100.0 * saved / requests:.0f}%"
+        )
+    if tracer.http_calls:
+        saving = ""
+        if tracer.one_call_full_bytes:
+            share = 100.0 * tracer.one_call_saved_bytes / tracer.one_call_full_bytes
+            saving = f", {tracer.one_call_saved_bytes / 1024:.1f} kB ({share:.0f}%) saved by exclude= against full responses"
+        logger.info(f"  One Call: {tracer.http_bytes / 1024:.1f} kB received in {tracer.http_calls} response(s){saving}")
 
 
+def batch_fetch(locations_to_run, stages, args, time_now, logger):
+    # Returns {location: (ok, metrics)}, empty if the fetch script is not part of this run or could not be imported
+    if FETCH_SCRIPT not in stages or not locations_to_run:
+        return {}
+    module = load_stage_module(FETCH_SCRIPT, logger)
+    if module is None:
+        return {}
+    stage_logger = logging.getLogger(os.path.splitext(FETCH_SCRIPT)[0])
+    stage_logger.setLevel(STAGE_LOG_LEVEL)
+    start = time.perf_counter()
+    prefetched, fetch_cache = module.fetch_all(
+        locations_to_run, stage_logger, args.fetch_concurrency, args.calls_per_minute, args.cache_ttl, args.cache_max_stale,
+        local_apis=False,  # 001_B runs as a stage of every location
+        exclude_by_location={
+            location: one_call_exclude(location_run_stages(stages, location, config, time_now))
+            for location, config in locations_to_run.items()
+        },
+    )
+    failed = [location for location, (ok, _) in prefetched.items() if not ok]
+    logger.info(f"Batch fetch of {len(prefetched)} location(s) in {time.perf_counter() - start:.2f}s, {len(failed)} failed")
+    logger.info(f"  {fetch_cache.summary()}")
+    if failed:
+        logger.error(f"Batch fetch failed for: {', '.join(failed)}")
+    return prefetched
+
+
+def run_as_daemon(locations_config, stages, args, logger):
+    scheduler = LocationScheduler(locations_config, args.interval, args.catch_up, logger)
+    stop_event = threading.Event()
+    # The Synology Task Scheduler and "kill" stop the daemon with SIGTERM, let the current run finish first
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop_event.set())
+
+    def run_slot(slot, locations):
+        logger.info(f"Running slot {slot:%d.%m.%Y %H:%M:%S} for {', '.join(locations)}")
+        # Keep the order of locations.json
+        locations_to_run = {location: config for location, config in locations_config.items() if location in locations}
+        run_once(locations_to_run, stages, args, slot, logger)
+
+    try:
+        run_daemon(scheduler, run_slot, stop_event, logger)
+    except KeyboardInterrupt:
+        logger.info("Daemon interrupted")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+# Health records and circuit breaker for the local sensor APIs ({LOCATION}_url in 001_B, "local_api" in 000_C)
+# The devices are often offline, and every request to an offline device waits for its full timeout.
+# weather_data/endpoint_health.json keeps per endpoint:
+#   "consecutive_failures", "last_success", "last_failure", "last_error", "latency_ewma_s" and the breaker state
+#   "closed":    requests are sent normally
+#   "open":      FAILURE_THRESHOLD failures in a row, requests are skipped until "retry_at"
+#   "half_open": "retry_at" has passed, one probe request is sent. Success closes the breaker, failure opens
+#                it again for twice as long (at most MAX_OPEN_SECONDS), so a dead device is probed less and less.
+
+import os
+import threading
+import time
+from datetime import datetime
+import _json_codec as json_codec
+
+FAILURE_THRESHOLD = 3
+OPEN_SECONDS = 300
+MAX_OPEN_SECONDS = 3600
+LATENCY_EWMA_WEIGHT = 0.3
+
+HEALTH_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_data', 'endpoint_health.json')
+
+_lock = threading.Lock()
+
+
+class EndpointHealth:
+    def __init__(self, logger, health_file_path=HEALTH_FILE_PATH):
+        self.logger = logger
+        self.health_file_path = health_file_path
+        self.records = self.load()
+        self.changed = set()  # Endpoints updated by this process, the others are left as they are on disk
+
+    def load(self):
+        try:
+            with open(self.health_file_path, 'rb') as file:
+                return json_codec.loads(file.read())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable endpoint health file {self.health_file_path}: {e}")
+            return {}
+
+    def save(self):
+        # Other processes may have updated other endpoints since load(), merge with the file on disk
+        with _lock:
+            records = self.load()
+            records.update({endpoint: self.records[endpoint] for endpoint in self.changed})
+            temp_file_path = f"{self.health_file_path}.{os.getpid()}.tmp"
+            try:
+                os.makedirs(os.path.dirname(self.health_file_path), exist_ok=True)
+                with open(temp_file_path, 'wb') as file:
+                    file.write(json_codec.dumps(records, indent=True, sort_keys=True))
+                os.replace(temp_file_path, self.health_file_path)
+            except OSError as e:
+                self.logger.error(f"Error writing endpoint health file {self.health_file_path}: {e}")
+
+    def record(self, endpoint):
+        self.changed.add(endpoint)
+        return self.records.setdefault(endpoint, {
+            "state": "closed", "consecutive_failures": 0, "open_seconds": 0, "retry_at": None,
+            "last_success": None, "last_failure": None, "last_error": None, "latency_ewma_s": None,
+        })
+
+    def allow(self, endpoint):
+        # False while the breaker of the endpoint is open, a request after "retry_at" is the half-open probe
+        with _lock:
+            record = self.records.get(endpoint)
+            if record is None or record["state"] == "closed":
+                return True
+            if time.time() < record["retry_at"]:
+                return False
+            self.record(endpoint)["state"] = "half_open"
+            self.logger.info(f"Probing {endpoint}, failed {record['consecutive_failures']} times in a row")
+            return True
+
+    def success(self, endpoint, seconds):
+        with _lock:
+            record = self.record(endpoint)
+            if record["state"] != "closed":
+                self.logger.info(f"{endpoint} answers again, closing its circuit breaker")
+            ewma = record["latency_ewma_s"]
+            record.update(
+                state="closed", consecutive_failures=0, open_seconds=0, retry_at=None,
+                last_success=datetime.now().isoformat(timespec='seconds'),
+                latency_ewma_s=round(seconds if ewma is None else ewma + LATENCY_EWMA_WEIGHT * (seconds - ewma), 3),
+            )
+
+    def failure(self, endpoint, error):
+        with _lock:
+            record = self.record(endpoint)
+            record["consecutive_failures"] += 1
+            record["last_failure"] = datetime.now().isoformat(timespec='seconds')
+            record["last_error"] = str(error)
+            if record["state"] == "half_open":
+                open_seconds = min(record["open_seconds"] * 2, MAX_OPEN_SECONDS)
+            elif record["consecutive_failures"] >= FAILURE_THRESHOLD:
+                open_seconds = OPEN_SECONDS
+            else:
+                return
+            if record["state"] == "closed":
+                self.logger.warning(f"{endpoint} failed {record['consecutive_failures']} times in a row, "
+                                    f"skipping it for {open_seconds}s")
+            record.update(state="open", open_seconds=open_seconds, retry_at=time.time() + open_seconds)
@@ -0,0 +1,146 @@
+# Response cache for the One Call requests of 000_B_Perform_one_call.py
+# Locations a few hundred meters apart (e.g. the Karlsruhe addresses) get the same forecast, the OpenWeatherMap grid
+# can not tell them apart. The cache key is (lat and lon rounded to COORDINATE_DECIMALS, units, lang, excluded
+# blocks), so such locations share one upstream call:
+#   age <= ttl                     "hit":   the cached payload is used, no request
+#   age >  ttl                     "miss":  the API is called and the cache updated
+#   API fails, age <= max_stale    "stale": the last good payload is used instead of failing the location
+# A stale payload is only served when the API call fails (stale-if-error). Nothing revalidates it in the background:
+# the scripts do not outlive their run, the next request after the ttl simply calls the API again.
+# Concurrent requests for the same key (batch fetch) wait for the first one instead of calling the API again.
+# The payloads are kept in weather_data/fetch_cache/<key>.json, so that the next run, or the next process, sees them.
+# The first payload stored by a FetchCache evicts the files older than max(ttl, max_stale), which can not be used
+# any more, and the oldest ones beyond max_entries, so the directory does not grow with every rounded lat/lon.
+
+import os
+import threading
+import time
+import _json_codec as json_codec
+
+COORDINATE_DECIMALS = 2  # About 1 km
+DEFAULT_TTL_SECONDS = 300
+DEFAULT_MAX_STALE_SECONDS = 3600
+DEFAULT_MAX_ENTRIES = 500
+
+CACHE_DIRECTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_data', 'fetch_cache')
+
+
+def cache_key(lat, lon, units, lang, exclude=()):
+    key = f"{round(float(lat), COORDINATE_DECIMALS)}_{round(float(lon), COORDINATE_DECIMALS)}_{units}_{lang}"
+    if exclude:
+        key += f"_without_{'_'.join(exclude)}"
+    return key
+
+
+class FetchCache:
+    def __init__(self, logger, ttl_seconds=DEFAULT_TTL_SECONDS, max_stale_seconds=DEFAULT_MAX_STALE_SECONDS,
+                 cache_directory_path=CACHE_DIRECTORY_PATH, max_entries=DEFAULT_MAX_ENTRIES):
+        self.logger = logger
+        self.ttl_seconds = ttl_seconds
+        self.max_stale_seconds = max_stale_seconds
+        self.cache_directory_path = cache_directory_path
+        self.max_entries = max_entries
+        self.counts = {"hit": 0, "stale": 0, "miss": 0}
+        self.evicted = None    # Number of files removed by evict(), None until the first payload is stored
+        self._entries = {}     # key: {"fetched_at": epoch seconds, "payload": ...}
+        self._key_locks = {}   # key: lock held while the payload of the key is fetched
+        self._lock = threading.Lock()
+
+    def file_path(self, key):
+        return os.path.join(self.cache_directory_path, f"{key}.json")
+
+    def load(self, key):
+        if key in self._entries:
+            return self._entries[key]
+        try:
+            with open(self.file_path(key), 'rb') as file:
+                entry = json_codec.loads(file.read())
+        except FileNotFoundError:
+            entry = None
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable fetch cache entry {key}: {e}")
+            entry = None
+        self._entries[key] = entry
+        return entry
+
+    def store(self, key, payload):
+        entry = {"fetched_at": time.time(), "payload": payload}
+        self._entries[key] = entry
+        # Write to a temporary file first, a crash must not leave a truncated entry behind
+        temp_file_path = f"{self.file_path(key)}.tmp"
+        try:
+            os.makedirs(self.cache_directory_path, exist_ok=True)
+            with open(temp_file_path, 'wb') as file:
+                file.write(json_codec.dumps(entry))
+            os.replace(temp_file_path, self.file_path(key))
+        except OSError as e:
+            self.logger.warning(f"Could not write fetch cache entry {key}: {e}")
+        with self._lock:
+            first_store = self.evicted is None
+            if first_store:
+                self.evicted = 0
+        if first_store:
+            self.evicted = self.evict()
+
+    def evict(self):
+        # Removes the entries too old to be used even as stale, and the oldest ones beyond max_entries.
+        # The age of an entry is the mtime of its file. Returns the number of files removed.
+        try:
+            names = [name for name in os.listdir(self.cache_directory_path) if name.endswith(".json")]
+        except FileNotFoundError:
+            return 0
+        entries = []
+        for name in names:
+            file_path = os.path.join(self.cache_directory_path, name)
+            try:
+                entries.append((os.path.getmtime(file_path), file_path))
+            except OSError:
+                continue  # Removed by another process
+        entries.sort(reverse=True)  # Newest first
+        max_age = max(self.ttl_seconds, self.max_stale_seconds)
+        now = time.time()
+        removed = 0
+        for index, (mtime, file_path) in enumerate(entries):
+            if index >= self.max_entries or now - mtime > max_age:
+                try:
+                    os.remove(file_path)
+                    removed += 1
+                except OSError:
+                    continue
+        if removed:
+            self.logger.info(f"Fetch cache: {removed} old entry file(s) removed")
+        return removed
+
+    def get_or_fetch(self, key, fetch):
+        # fetch() calls the API and returns the payload, or raises. Returns (payload, "hit" | "stale" | "miss").
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            entry = self.load(key)
+            age = time.time() - entry["fetched_at"] if entry else None
+            if entry and age <= self.ttl_seconds:
+                status = "hit"
+                payload = entry["payload"]
+            else:
+                try:
+                    payload = fetch()
+                except Exception as e:
+                    if not entry or age > self.max_stale_seconds:
+                        raise
+                    self.logger.warning(f"API call failed ({e}), using the cached payload of {key} from {age:.0f}s ago")
+                    status = "stale"
+                    payload = entry["payload"]
+                else:
+                    status = "miss"
+                    self.store(key, payload)
+        with self._lock:
+            self.counts[status] += 1
+        return payload, status
+
+    def summary(self):
+        calls = sum(self.counts.values())
+        saved = self.counts["hit"] + self.counts["stale"]
+        ratio = 100.0 * saved / calls if calls else 0.0
+        return (f"{calls} One Call request(s): {self.counts['miss']} API call(s), {self.counts['hit']} cached, "
+                f"{self.counts['stale']} stale (stale-if-error), hit ratio {ratio:.0f}%, "
+                f"{self.evicted or 0} old entries evicted")
@@ -0,0 +1,394 @@
+# Archive of every fetched forecast, one SQLite database per location: weather_data/<WeinheimerStr_55>_forecast_archive.sqlite
+# 000_B overwrites <LOCATION>.json at every run, 007_B_Archive_forecast.py keeps the minutely, hourly and daily
+# blocks of each response here as a snapshot, in the columnar model of _forecast_columns.py.
+#   - table "snapshots": one row per fetch, the primary key is the fetch time (Unix seconds, the time 000_B wrote
+#     <LOCATION>.json), so a snapshot is found by time through the index
+#   - consecutive hourly snapshots overlap by 47 of 48 hours and most values do not change from one fetch to the
+#     next. A snapshot is stored as the difference to the previous one: every number is XOR-ed with the number of
+#     the same field and the same dt in the previous snapshot (0 where nothing changed), dt itself as the difference
+#     to the dt before it (always 60 or 3600). The bytes of each column are shuffled (all first bytes, then all second
+#     bytes, ...) and the snapshot is compressed with zlib, with the previous snapshot as preset dictionary, so the
+#     layout and the weather descriptions repeated from it cost next to nothing.
+#   - every KEYFRAME_INTERVAL snapshots one is stored without the previous one ("keyframe"), so reading a snapshot
+#     decodes at most KEYFRAME_INTERVAL snapshots, and a damaged row loses at most the rest of its group
+#   - a response equal to the previous snapshot (e.g. from the fetch cache of 000_B) is not stored again
+# The decoded values are exactly the ones of the response, nothing is rounded.
+#
+#   python3 _forecast_archive.py info WeinheimerStr_55
+#   python3 _forecast_archive.py show WeinheimerStr_55 --at "2026-10-18 12:00" --block hourly --fields temp pop
+#   python3 _forecast_archive.py --benchmark          size per location-year and read time, for synthetic forecasts
+
+import argparse
+import csv
+import os
+import sqlite3
+import struct
+import sys
+import tempfile
+import time
+import zlib
+from datetime import datetime
+
+import numpy as np
+
+import _json_codec as json_codec
+from _forecast_columns import ForecastColumns
+from _time_format import time_zone as zone_info
+
+WEATHER_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_data')
+
+ARCHIVE_BLOCKS = ["minutely", "hourly", "daily"]
+KEYFRAME_INTERVAL = 24
+COMPRESSION_LEVEL = 9
+BUSY_TIMEOUT_SECONDS = 30
+TEXT_SEPARATOR = "\x1f"
+
+
+def archive_file_path(weather_data_path, location_name):
+    return os.path.join(weather_data_path, f"{location_name}_forecast_archive.sqlite")
+
+
+class Snapshot:
+    def __init__(self, fetched_at, issued_at, time_zone, blocks, encoded=None):
+        self.fetched_at = fetched_at  # Unix seconds
+        self.issued_at = issued_at    # current.dt of the response, None without the current block
+        self.time_zone = time_zone
+        self.blocks = blocks          # block name: ForecastColumns
+        self.encoded = encoded        # The uncompressed bytes stored for it, the zlib dictionary of the next one
+
+    def same_forecast(self, other):
+        if other is None or self.time_zone != other.time_zone or self.blocks.keys() != other.blocks.keys():
+            return False
+        for name, columns in self.blocks.items():
+            reference = other.blocks[name]
+            if columns.columns.keys() != reference.columns.keys() or columns.masks.keys() != reference.masks.keys():
+                return False
+            if not all(np.array_equal(values, reference[field]) for field, values in columns.columns.items()):
+                return False
+            if not all(np.array_equal(mask, reference.masks[field]) for field, mask in columns.masks.items()):
+                return False
+        return True
+
+
+def shuffle(bits):
+    # uint64 values -> bytes, all lowest bytes first, then all second bytes, ...
+    return bits.astype('<u8').view(np.uint8).reshape(-1, 8).T.tobytes()
+
+
+def unshuffle(data, rows):
+    return np.frombuffer(data, dtype=np.uint8).reshape(8, rows).T.copy().view('<u8').reshape(rows)
+
+
+def align(dt, reference):
+    # (index in the reference block, True where the reference block has the same dt), None without reference
+    if reference is None or not len(reference):
+        return None
+    reference_dt = reference["dt"]
+    index = np.searchsorted(reference_dt, dt)
+    np.minimum(index, len(reference_dt) - 1, out=index)
+    matched = reference_dt[index] == dt
+    return index[matched], matched
+
+
+def reference_bits(dtype, rows, alignment, reference, field):
+    # The bits of the same field at the same dt in the reference block, 0 where there is none
+    bits = np.zeros(rows, dtype=np.uint64)
+    if alignment is None or field not in reference or reference[field].dtype != dtype:
+        return bits
+    index, matched = alignment
+    bits[matched] = reference[field].view(np.uint64)[index]
+    return bits
+
+
+def encode_snapshot(snapshot, reference=None):
+    # reference: the previous Snapshot, None for a keyframe
+    header = {"time_zone": snapshot.time_zone, "blocks": []}
+    parts = []
+    for name, columns in snapshot.blocks.items():
+        reference_block = reference.blocks.get(name) if reference else None
+        alignment = align(columns["dt"], reference_block)
+        entry = {"block": name, "rows": len(columns), "columns": [], "masks": list(columns.masks)}
+        for field in sorted(columns.columns, key=lambda field: field != "dt"):  # dt first, the decoder needs it
+            values = columns[field]
+            if values.dtype.kind == "U":
+                data = TEXT_SEPARATOR.join(values.tolist()).encode('utf-8')
+                entry["columns"].append([field, "str", len(data)])
+            else:
+                bits = values.view(np.uint64)
+                if field == "dt":
+                    bits = np.diff(bits, prepend=np.uint64(0))
+                else:
+                    bits = bits ^ reference_bits(values.dtype, len(values), alignment, reference_block, field)
+                data = shuffle(bits)
+                entry["columns"].append([field, values.dtype.str, len(data)])
+            parts.append(data)
+        for field in entry["masks"]:
+            parts.append(np.packbits(columns.masks[field]).tobytes())
+        header["blocks"].append(entry)
+    header_bytes = json_codec.dumps(header)
+    snapshot.encoded = struct.pack('<I', len(header_bytes)) + header_bytes + b"".join(parts)
+    if reference is None:
+        return zlib.compress(snapshot.encoded, COMPRESSION_LEVEL)
+    compressor = zlib.compressobj(COMPRESSION_LEVEL, zdict=reference.encoded)
+    return compressor.compress(snapshot.encoded) + compressor.flush()
+
+
+def decode_snapshot(payload, fetched_at, issued_at, reference=None):
+    if reference is None:
+        data = zlib.decompress(payload)
+    else:
+        decompressor = zlib.decompressobj(zdict=reference.encoded)
+        data = decompressor.decompress(payload) + decompressor.flush()
+    header_length = struct.unpack_from('<I', data)[0]
+    header = json_codec.loads(data[4:4 + header_length])
+    position = 4 + header_length
+    time_zone = header["time_zone"]
+    blocks = {}
+    for entry in header["blocks"]:
+        name, rows = entry["block"], entry["rows"]
+        reference_block = reference.blocks.get(name) if reference else None
+        alignment = None
+        columns, masks = {}, {}
+        for field, dtype, length in entry["columns"]:
+            part = data[position:position + length]
+            position += length
+            if dtype == "str":
+                texts = part.decode('utf-8').split(TEXT_SEPARATOR) if rows else []
+                columns[field] = np.array(texts, dtype=str) if rows else np.zeros(0, dtype=str)
+                continue
+            bits = unshuffle(part, rows)
+            if field == "dt":
+                columns[field] = np.cumsum(bits, dtype=np.uint64).view(np.dtype(dtype))
+                alignment = align(columns[field], reference_block)
+            else:
+                bits = bits ^ reference_bits(np.dtype(dtype), rows, alignment, reference_block, field)
+                columns[field] = bits.view(np.dtype(dtype))
+        mask_length = (rows + 7) // 8
+        for field in entry["masks"]:
+            masks[field] = np.unpackbits(np.frombuffer(data[position:position + mask_length], dtype=np.uint8),
+                                         count=rows).astype(bool)
+            position += mask_length
+        blocks[name] = ForecastColumns(name, columns, masks, time_zone)
+    return Snapshot(fetched_at, issued_at, time_zone, blocks, data)
+
+
+class ForecastArchive:
+    # with ForecastArchive(file_path) as archive: ...   the connection is closed at the end of the block
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path, timeout=BUSY_TIMEOUT_SECONDS)
+        with self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS snapshots (fetched_at INTEGER PRIMARY KEY, issued_at INTEGER, "
+                "keyframe_at INTEGER NOT NULL, raw_bytes INTEGER NOT NULL, payload BLOB NOT NULL)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def last_row(self):
+        return self.connection.execute(
+            "SELECT fetched_at, keyframe_at FROM snapshots ORDER BY fetched_at DESC LIMIT 1").fetchone()
+
+    def append(self, snapshot):
+        # Returns "stored", "unchanged" (same forecast as the last snapshot) or "old" (not after the last snapshot)
+        last = self.last_row()
+        if last and snapshot.fetched_at <= last[0]:
+            return "old"
+        previous = self.snapshot(last[0]) if last else None
+        if snapshot.same_forecast(previous):
+            return "unchanged"
+        # A group is the keyframe and the snapshots after it, a range of the primary key
+        keyframe = previous is None or self.connection.execute(
+            "SELECT COUNT(*) FROM snapshots WHERE fetched_at BETWEEN ? AND ?", last[::-1]).fetchone()[0] \
+            >= KEYFRAME_INTERVAL
+        payload = encode_snapshot(snapshot, None if keyframe else previous)
+        raw_bytes = sum(values.nbytes for columns in snapshot.blocks.values() for values in columns.columns.values())
+        with self.connection:
+            self.connection.execute(
+                "INSERT INTO snapshots (fetched_at, issued_at, keyframe_at, raw_bytes, payload) VALUES (?, ?, ?, ?, ?)",
+                (snapshot.fetched_at, snapshot.issued_at, snapshot.fetched_at if keyframe else last[1], raw_bytes,
+                 payload))
+        return "stored"
+
+    def fetch_times(self, start=None, end=None):
+        # Fetch times with start <= fetched_at < end
+        return [row[0] for row in self.connection.execute(
+            "SELECT fetched_at FROM snapshots WHERE fetched_at >= ? AND fetched_at < ? ORDER BY fetched_at",
+            (start if start is not None else 0, end if end is not None else 2 ** 62))]
+
+    def iter_snapshots(self, start=None, end=None):
+        # The snapshots with start <= fetched_at < end, by fetch time. Each group is decoded once, from its keyframe.
+        first = self.connection.execute(
+            "SELECT keyframe_at FROM snapshots WHERE fetched_at >= ? ORDER BY fetched_at LIMIT 1",
+            (start if start is not None else 0,)).fetchone()
+        if not first:
+            return
+        cursor = self.connection.execute(
+            "SELECT fetched_at, issued_at, keyframe_at, payload FROM snapshots WHERE fetched_at >= ? AND fetched_at < ? "
+            "ORDER BY fetched_at", (first[0], end if end is not None else 2 ** 62))
+        previous = None
+        for fetched_at, issued_at, keyframe_at, payload in cursor:
+            reference = None if keyframe_at == fetched_at else previous
+            if keyframe_at != fetched_at and (previous is None or previous.fetched_at < keyframe_at):
+                raise ValueError(f"{self.file_path}: snapshot {fetched_at} without its keyframe {keyframe_at}")
+            previous = decode_snapshot(payload, fetched_at, issued_at, reference)
+            if start is None or fetched_at >= start:
+                yield previous
+
+    def snapshot(self, fetched_at):
+        # The snapshot of exactly this fetch time, None if there is none. Decoded from the keyframe of its group, the
+        # rows from the keyframe up to it are read through the primary key.
+        rows = self.connection.execute(
+            "SELECT fetched_at, issued_at, keyframe_at, payload FROM snapshots WHERE fetched_at BETWEEN "
+            "(SELECT keyframe_at FROM snapshots WHERE fetched_at = ?) AND ? ORDER BY fetched_at",
+            (fetched_at, fetched_at)).fetchall()
+        snapshot = None
+        for row_fetched_at, issued_at, keyframe_at, payload in rows:
+            snapshot = decode_snapshot(payload, row_fetched_at, issued_at,
+                                       None if keyframe_at == row_fetched_at else snapshot)
+        return snapshot
+
+    def snapshot_at(self, moment):
+        # The last snapshot fetched at or before the Unix time moment, the forecast known at that time
+        row = self.connection.execute(
+            "SELECT fetched_at FROM snapshots WHERE fetched_at <= ? ORDER BY fetched_at DESC LIMIT 1",
+            (moment,)).fetchone()
+        return self.snapshot(row[0]) if row else None
+
+    def summary(self):
+        return self.connection.execute(
+            "SELECT COUNT(*), MIN(fetched_at), MAX(fetched_at), SUM(keyframe_at = fetched_at), SUM(raw_bytes), "
+            "SUM(LENGTH(payload)) FROM snapshots").fetchone()
+
+
+def synthetic_snapshots(count, seed=1):
+    # Hourly fetches of a forecast that drifts a little at every fetch, with the fields of a real response
+    rng = np.random.default_rng(seed)
+    start = 1792321200
+    hours = 48 + count
+    truth = {"temp": 12 + 8 * np.sin(np.arange(hours) / 24 * 2 * np.pi), "humidity": rng.integers(40, 100, hours)}
+    for index in range(count):
+        fetched_at = start + index * 3600
+        hour = np.arange(index, index + 48)
+        drift = np.round(rng.normal(0, 0.3, 48), 2) * (rng.random(48) < 0.3)  # About a third of the hours change
+        hourly = {
+            "dt": (start + hour * 3600).astype(np.int64),
+            "temp": np.round(truth["temp"][hour] + drift, 2), "feels_like": np.round(truth["temp"][hour] - 1.5 + drift, 2),
+            "pressure": np.full(48, 1013, dtype=np.int64), "humidity": truth["humidity"][hour].astype(np.int64),
+            "dew_point": np.round(truth["temp"][hour] - 5, 2), "uvi": np.round(np.clip(np.sin(hour / 24 * 2 * np.pi), 0, None) * 3, 2),
+            "clouds": (truth["humidity"][hour] // 2).astype(np.int64), "visibility": np.full(48, 10000, dtype=np.int64),
+            "wind_speed": np.round(3 + drift, 2), "wind_deg": np.full(48, 250, dtype=np.int64),
+            "wind_gust": np.round(5 + drift, 2), "pop": np.round(np.clip(truth["humidity"][hour] / 100 - 0.5, 0, 1), 2),
+            "rain": np.zeros(48), "snow": np.zeros(48),
+            "weather_main": np.array(["Clouds"] * 48), "weather_description": np.array(["überwiegend bewölkt"] * 48),
+        }
+        masks = {field: np.ones(48, dtype=bool) for field in ["visibility", "wind_gust", "weather_main", "weather_description"]}
+        masks.update(rain=np.zeros(48, dtype=bool), snow=np.zeros(48, dtype=bool))
+        minutely = {"dt": np.arange(fetched_at, fetched_at + 61 * 60, 60, dtype=np.int64),
+                    "precipitation": np.round(rng.random(61) * (rng.random() < 0.2), 2)}
+        blocks = {"minutely": ForecastColumns("minutely", minutely, {}, "CET"),
+                  "hourly": ForecastColumns("hourly", hourly, masks, "CET")}
+        yield Snapshot(fetched_at, fetched_at, "CET", blocks)
+
+
+def benchmark(count, repeats):
+    with tempfile.TemporaryDirectory() as directory:
+        file_path = os.path.join(directory, "Benchmark_forecast_archive.sqlite")
+        originals = []
+        begin = time.perf_counter()
+        with ForecastArchive(file_path) as archive:
+            for snapshot in synthetic_snapshots(count):
+                archive.append(snapshot)
+                originals.append(snapshot)
+            append_seconds = (time.perf_counter() - begin) / count
+            snapshots, _, _, keyframes, raw_bytes, payload_bytes = archive.summary()
+            for original, decoded in zip(originals, archive.iter_snapshots()):
+                assert original.same_forecast(decoded), original.fetched_at
+            # The worst case of a read: the last snapshot of a group, KEYFRAME_INTERVAL - 1 deltas
+            worst = max(archive.fetch_times(), key=lambda fetched_at: (fetched_at - originals[0].fetched_at) // 3600
+                        % KEYFRAME_INTERVAL)
+            best_read = float("inf")
+            for _ in range(repeats):
+                begin = time.perf_counter()
+                archive.snapshot_at(worst)
+                best_read = min(best_read, time.perf_counter() - begin)
+            keyframes_only = sum(len(encode_snapshot(snapshot)) for snapshot in originals[:KEYFRAME_INTERVAL]) \
+                / KEYFRAME_INTERVAL
+        file_bytes = os.path.getsize(file_path)
+    print(f"{snapshots} hourly snapshots (minutely + hourly), {keyframes} keyframes, all decoded equal")
+    print(f"  columns in memory:   {raw_bytes / snapshots / 1024:8.1f} kB per snapshot")
+    print(f"  compressed, no delta:{keyframes_only / 1024:8.1f} kB per snapshot")
+    print(f"  archived:            {payload_bytes / snapshots / 1024:8.1f} kB per snapshot, "
+          f"{payload_bytes / snapshots * 8760 / 1024 / 1024:.1f} MB per location-year "
+          f"(database file {file_bytes / 1024 / 1024:.1f} MB)")
+    print(f"  append {append_seconds * 1000:.2f} ms, read the worst case snapshot {best_read * 1000:.2f} ms")
+
+
+def parse_time(text, tz):
+    # Unix timestamp, or a local date and time "2026-10-18 12:00" of the location
+    if text.isdigit():
+        return int(text)
+    return int(datetime.strptime(text, '%Y-%m-%d %H:%M').replace(tzinfo=tz).timestamp())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Archive of the fetched forecasts")
+    parser.add_argument("command", nargs="?", choices=["info", "show"], help="info or show")
+    parser.add_argument("location", nargs="?", help="location name, e.g. WeinheimerStr_55")
+    parser.add_argument("--at", help="show: local 'YYYY-MM-DD HH:MM' or Unix time, the forecast known then (default: last)")
+    parser.add_argument("--block", default="hourly", choices=ARCHIVE_BLOCKS, help="show: block (default hourly)")
+    parser.add_argument("--fields", nargs="+", default=["temp"], help="show: fields of the block (default temp)")
+    parser.add_argument("--weather-data", default=WEATHER_DATA_PATH, help="directory of the weather data")
+    parser.add_argument("--benchmark", action="store_true", help="size and read time for synthetic forecasts")
+    parser.add_argument("--snapshots", type=int, default=8760, help="benchmark: hourly snapshots (default 8760, a location-year)")
+    parser.add_argument("--repeats", type=int, default=20, help="benchmark: repetitions (default 20)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.snapshots, args.repeats)
+        return 0
+    if not args.command or not args.location:
+        parser.error("the command and the location are required")
+    file_path = archive_file_path(args.weather_data, args.location)
+    if not os.path.exists(file_path):
+        print(f"{file_path} does not exist", file=sys.stderr)
+        return 1
+    with ForecastArchive(file_path) as archive:
+        if args.command == "info":
+            snapshots, first, last, keyframes, raw_bytes, payload_bytes = archive.summary()
+            if not snapshots:
+                print(f"{file_path}: no snapshots")
+                return 0
+            print(f"{file_path}: {snapshots} snapshots ({keyframes} keyframes), fetched {first} .. {last}, "
+                  f"{payload_bytes / snapshots / 1024:.1f} kB per snapshot ({raw_bytes / snapshots / 1024:.1f} kB as "
+                  f"columns), file {os.path.getsize(file_path) / 1024:.1f} kB")
+            return 0
+        last = archive.last_row()
+        snapshot = archive.snapshot(last[0]) if last else None
+        if args.at and snapshot:
+            snapshot = archive.snapshot_at(parse_time(args.at, zone_info(snapshot.time_zone)))
+        if snapshot is None or args.block not in snapshot.blocks:
+            print(f"No {args.block} forecast archived for {args.at or 'the last fetch'}", file=sys.stderr)
+            return 1
+        columns = snapshot.blocks[args.block]
+        unknown = [field for field in args.fields if field not in columns]
+        if unknown:
+            parser.error(f"Unknown fields {', '.join(unknown)}, the {args.block} block has {', '.join(columns.columns)}")
+        print(f"# fetched {snapshot.fetched_at}, issued {snapshot.issued_at}, {snapshot.time_zone}")
+        writer = csv.writer(sys.stdout)
+        writer.writerow(["dt", "local_time"] + args.fields)
+        local_times = columns.local_times()
+        for index in range(len(columns)):
+            writer.writerow([columns["dt"][index], str(local_times[index]).replace("T", " ")[:16]] +
+                            [columns.value(field, index) for field in args.fields])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,332 @@
+# Columnar model of the blocks of a One Call response (current, minutely, hourly, daily)
+# A block is a list of entries such as {"dt": ..., "temp": ..., "wind_gust": ...}. ForecastColumns keeps it as one
+# NumPy array per field instead ("struct of arrays"), e.g. columns["temp"] is the temperature of all hours:
+#   hourly = hourly_columns(load_document(json_file_path))
+#   hourly["temp"], hourly["dt"], hourly.present("wind_gust"), hourly.head(48)
+# Fields that OpenWeatherMap leaves out when there is nothing to report (wind_gust, rain, snow, ...) are optional:
+# the array holds 0 there, and present(field) is the mask of the entries that had the field. A missing required
+# field raises KeyError, as the lookup hour['temp'] did.
+# Whole numbers (dt, pressure, humidity, clouds, wind_deg, ...) are int64, the other fields float64, the weather
+# description a string array. text(field) gives the values as str() does for the JSON numbers, for the .txt
+# outputs, except that a whole number is always written without decimals: 12, also where the response had 12.0.
+# row_value(field, index) gives one value the same way for the rows of 005_B, None where the entry lacked the field.
+# Used by 005_B (current), 020_B (minutely) and 030_B (hourly).
+#
+# save_columns and load_columns keep a block in a .npz file, the typed intermediate between the decoders and the
+# plotters: 020_B writes <WeinheimerStr_55>_minutely_forecast.npz for 025_B, 030_B <WeinheimerStr_55>_hourly_forecast.npz
+# for 035_B and 036_B. The timestamps stay Unix timestamps and the values numbers, local_times() gives the local
+# date and time of each entry for the x axis. The .txt files of 020_B and 030_B are for reading only, they are left
+# out for a location with "text_forecasts": "no" in locations.json.
+#
+# Memory and decode time against the list of dicts, for an existing response:
+#   python3 _forecast_columns.py weather_data/WeinheimerStr_55.json
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from operator import itemgetter
+
+import numpy as np
+
+from _time_format import utc_offsets
+
+# (column, path in the entry, dtype, required), a path "rain.1h" is entry["rain"]["1h"]
+CONDITION_FIELDS = [
+    ("dt", "dt", np.int64, True),
+    ("temp", "temp", np.float64, True),
+    ("feels_like", "feels_like", np.float64, True),
+    ("pressure", "pressure", np.int64, True),
+    ("humidity", "humidity", np.int64, True),
+    ("dew_point", "dew_point", np.float64, True),
+    ("uvi", "uvi", np.float64, True),
+    ("clouds", "clouds", np.int64, True),
+    ("visibility", "visibility", np.int64, False),
+    ("wind_speed", "wind_speed", np.float64, True),
+    ("wind_deg", "wind_deg", np.int64, True),
+    ("wind_gust", "wind_gust", np.float64, False),
+    ("weather_main", "weather.0.main", str, False),
+    ("weather_description", "weather.0.description", str, False),
+]
+
+# Optional in the current block only, 005_B logged them with .get() and writes an empty field where they are missing
+CURRENT_OPTIONAL_FIELDS = {"wind_speed", "wind_deg"}
+
+BLOCK_FIELDS = {
+    "current": [(field, path, dtype, required and field not in CURRENT_OPTIONAL_FIELDS)
+                for field, path, dtype, required in CONDITION_FIELDS] + [
+        ("sunrise", "sunrise", np.int64, False),
+        ("sunset", "sunset", np.int64, False),
+        ("rain", "rain.1h", np.float64, False),
+        ("snow", "snow.1h", np.float64, False),
+    ],
+    "minutely": [
+        ("dt", "dt", np.int64, True),
+        ("precipitation", "precipitation", np.float64, True),
+    ],
+    "hourly": CONDITION_FIELDS + [
+        ("pop", "pop", np.float64, True),
+        ("rain", "rain.1h", np.float64, False),
+        ("snow", "snow.1h", np.float64, False),
+    ],
+    "daily": [
+        ("dt", "dt", np.int64, True),
+        ("sunrise", "sunrise", np.int64, False),
+        ("sunset", "sunset", np.int64, False),
+        ("moonrise", "moonrise", np.int64, False),
+        ("moonset", "moonset", np.int64, False),
+        ("moon_phase", "moon_phase", np.float64, False),
+        ("temp_day", "temp.day", np.float64, True),
+        ("temp_min", "temp.min", np.float64, True),
+        ("temp_max", "temp.max", np.float64, True),
+        ("temp_night", "temp.night", np.float64, True),
+        ("temp_eve", "temp.eve", np.float64, True),
+        ("temp_morn", "temp.morn", np.float64, True),
+        ("feels_like_day", "feels_like.day", np.float64, True),
+        ("feels_like_night", "feels_like.night", np.float64, True),
+        ("feels_like_eve", "feels_like.eve", np.float64, True),
+        ("feels_like_morn", "feels_like.morn", np.float64, True),
+        ("pressure", "pressure", np.int64, True),
+        ("humidity", "humidity", np.int64, True),
+        ("dew_point", "dew_point", np.float64, True),
+        ("wind_speed", "wind_speed", np.float64, True),
+        ("wind_deg", "wind_deg", np.int64, True),
+        ("wind_gust", "wind_gust", np.float64, False),
+        ("clouds", "clouds", np.int64, True),
+        ("pop", "pop", np.float64, True),
+        ("uvi", "uvi", np.float64, True),
+        ("rain", "rain", np.float64, False),
+        ("snow", "snow", np.float64, False),
+        ("weather_main", "weather.0.main", str, False),
+        ("weather_description", "weather.0.description", str, False),
+    ],
+}
+
+
+def lookup(entry, path):
+    # None if a part of the path is missing
+    value = entry
+    for part in path.split("."):
+        if value is None:
+            return None
+        if part.isdigit():
+            value = value[int(part)] if len(value) > int(part) else None
+        else:
+            value = value.get(part)
+    return value
+
+
+def lookup_all(entries, path):
+    # lookup() for every entry, with the common paths spelled out, the block is built at every run
+    if "." not in path:
+        return [entry.get(path) for entry in entries]
+    parent, child = path.split(".", 1)
+    if "." not in child and not child.isdigit():
+        return [(entry.get(parent) or {}).get(child) for entry in entries]
+    return [lookup(entry, path) for entry in entries]
+
+
+class ForecastColumns:
+    def __init__(self, block, columns, masks, time_zone=None):
+        self.block = block
+        self.columns = columns  # field: array
+        self.masks = masks      # optional field: bool array, True where the entry had the field
+        self.time_zone = time_zone  # Of the location, set by load_columns
+
+    def __len__(self):
+        return len(self.columns["dt"]) if "dt" in self.columns else 0
+
+    def __getitem__(self, field):
+        return self.columns[field]
+
+    def __contains__(self, field):
+        return field in self.columns
+
+    def present(self, field):
+        return self.masks.get(field, np.ones(len(self), dtype=bool))
+
+    def head(self, count):
+        return ForecastColumns(self.block, {field: values[:count] for field, values in self.columns.items()},
+                               {field: mask[:count] for field, mask in self.masks.items()}, self.time_zone)
+
+    def text(self, field):
+        values = self.columns[field].tolist()
+        if self.columns[field].dtype.kind != "f":
+            return [str(value) for value in values]
+        return [str(int(value)) if value.is_integer() else str(value) for value in values]
+
+    def value(self, field, index):
+        # Python value of one entry, None if the entry did not have the field
+        if field in self.masks and not self.masks[field][index]:
+            return None
+        return self.columns[field][index].item()
+
+    def row_value(self, field, index):
+        # value(), with a whole number as int, as text() writes it: the temperature 12 stays 12, not 12.0
+        value = self.value(field, index)
+        return int(value) if isinstance(value, float) and value.is_integer() else value
+
+    def local_times(self):
+        # Local date and time of every entry in the time zone of the location, as naive datetime64, for plotting
+        return (self.columns["dt"] + utc_offsets(self.columns["dt"], self.time_zone)).astype('datetime64[s]')
+
+    @property
+    def nbytes(self):
+        return sum(values.nbytes for values in self.columns.values()) + sum(mask.nbytes for mask in self.masks.values())
+
+
+def block_columns(block, entries, only=None):
+    # only: names of the columns to build, default all of BLOCK_FIELDS[block]
+    fields = [spec for spec in BLOCK_FIELDS[block] if only is None or spec[0] in only]
+    count = len(entries)
+    columns, masks = {}, {}
+    # The required top level numbers in one pass over the entries
+    flat = [(field, dtype) for field, path, dtype, required in fields if required and path == field]
+    if flat and count:
+        rows = np.array([itemgetter(*[field for field, _ in flat])(entry) for entry in entries], dtype=np.float64)
+        rows = rows.reshape(count, len(flat))
+        for index, (field, dtype) in enumerate(flat):
+            columns[field] = rows[:, index].astype(dtype) if dtype is not np.float64 else rows[:, index].copy()
+    for field, path, dtype, required in fields:
+        if field in columns:
+            continue
+        values = lookup_all(entries, path)
+        if required:
+            if any(value is None for value in values):
+                raise KeyError(path)
+            columns[field] = np.array(values, dtype=dtype) if count else np.zeros(0, dtype=dtype)
+            continue
+        mask = np.fromiter((value is not None for value in values), dtype=bool, count=count)
+        empty = "" if dtype is str else 0
+        columns[field] = np.array([empty if value is None else value for value in values], dtype=dtype) \
+            if count else np.zeros(0, dtype=dtype)
+        masks[field] = mask
+    return ForecastColumns(block, columns, masks)
+
+
+def save_columns(file_path, columns, time_zone):
+    # Written to a temporary file and renamed, as the raw responses, a plotter never reads a half written file
+    arrays = {f"column_{field}": values for field, values in columns.columns.items()}
+    arrays.update({f"mask_{field}": mask for field, mask in columns.masks.items()})
+    arrays["block"] = np.array(columns.block)
+    arrays["time_zone"] = np.array(time_zone)
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file, zipfile.ZipFile(file, 'w') as archive:
+            # As np.savez, but with a fixed date in the zip entries: the same columns give the same bytes, for the
+            # change detection of _manifest.py
+            for name, values in arrays.items():
+                with archive.open(zipfile.ZipInfo(f"{name}.npy", date_time=(1980, 1, 1, 0, 0, 0)), 'w') as entry:
+                    np.lib.format.write_array(entry, np.asanyarray(values), allow_pickle=False)
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+
+
+def load_columns(file_path):
+    # Raises FileNotFoundError, as open()
+    with np.load(file_path) as arrays:
+        columns = {name[len("column_"):]: arrays[name] for name in arrays.files if name.startswith("column_")}
+        masks = {name[len("mask_"):]: arrays[name] for name in arrays.files if name.startswith("mask_")}
+        return ForecastColumns(str(arrays["block"]), columns, masks, str(arrays["time_zone"]))
+
+
+def current_columns(document, only=None):
+    # One entry, raises KeyError without a "current" block
+    return block_columns("current", [document["current"]], only)
+
+
+def minutely_columns(document, only=None):
+    return block_columns("minutely", document.get("minutely", []), only)
+
+
+def hourly_columns(document, only=None):
+    return block_columns("hourly", document.get("hourly", []), only)
+
+
+def daily_columns(document, only=None):
+    return block_columns("daily", document.get("daily", []), only)
+
+
+# The columns written to the _hourly_forecast.txt of 030_B
+HOURLY_TEXT_FIELDS = ["dt", "temp", "feels_like", "humidity", "dew_point", "clouds", "pop", "uvi", "wind_speed",
+                      "wind_gust", "wind_deg"]
+
+
+def hourly_lines_from_dicts(document):
+    # The decode loop of 030_B before the columnar model, without the time formatting, for the benchmark
+    lines = []
+    for hour in document["hourly"][:48]:
+        lines.append(f"{hour['temp']}°C,{hour['feels_like']}°C,{hour['humidity']}%,{hour['dew_point']}°C,"
+                     f"{hour['clouds']}%,{int(hour['pop'] * 100)}%,{hour['uvi']},{hour['wind_speed']}m/s,"
+                     f"{hour.get('wind_gust', 0)}m/s,{hour['wind_deg']}°")
+    return lines
+
+
+def hourly_lines_from_columns(document):
+    hourly = block_columns("hourly", document["hourly"][:48], HOURLY_TEXT_FIELDS)
+    pop = (hourly["pop"] * 100).astype(np.int64).tolist()
+    return [f"{temp}°C,{feels_like}°C,{humidity}%,{dew_point}°C,{clouds}%,{pop}%,{uvi},{wind_speed}m/s,{wind_gust}m/s,{wind_deg}°"
+            for temp, feels_like, humidity, dew_point, clouds, pop, uvi, wind_speed, wind_gust, wind_deg
+            in zip(hourly.text("temp"), hourly.text("feels_like"), hourly.text("humidity"), hourly.text("dew_point"),
+                   hourly.text("clouds"), pop, hourly.text("uvi"), hourly.text("wind_speed"), hourly.text("wind_gust"),
+                   hourly.text("wind_deg"))]
+
+
+def allocated_bytes(build):
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, size
+
+
+def best_seconds(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(file_path, repeats):
+    with open(file_path, 'rb') as file:
+        text = file.read()
+    print(f"{file_path}, best of {repeats}")
+    print(f"{'block':<10}{'entries':>8}{'dicts kB':>10}{'columns kB':>12}{'build ms':>10}")
+    for block in ["minutely", "hourly", "daily"]:
+        # The list of dicts of the block as json.loads leaves it, against the arrays built from it
+        entries, dicts_bytes = allocated_bytes(lambda: json.loads(text).get(block, []))
+        if not entries:
+            continue
+        _, columns_bytes = allocated_bytes(lambda: block_columns(block, entries))
+        build_seconds = best_seconds(lambda: block_columns(block, entries), repeats)
+        print(f"{block:<10}{len(entries):>8}{dicts_bytes / 1024:>10.1f}{columns_bytes / 1024:>12.1f}{build_seconds * 1000:>10.3f}")
+    document = json.loads(text)
+    if document.get("hourly"):
+        # The lines differ only where the JSON has a whole number written as 12.0, see text()
+        dicts_seconds = best_seconds(lambda: hourly_lines_from_dicts(document), repeats)
+        columns_seconds = best_seconds(lambda: hourly_lines_from_columns(document), repeats)
+        print(f"030_B hourly decode, without the time formatting: list of dicts {dicts_seconds * 1000:.3f} ms, "
+              f"columns (build included) {columns_seconds * 1000:.3f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Columnar model of the One Call blocks")
+    parser.add_argument("file", help="a raw response, e.g. weather_data/WeinheimerStr_55.json")
+    parser.add_argument("--repeats", type=int, default=50, help="repetitions (default 50)")
+    args = parser.parse_args()
+    benchmark(args.file, args.repeats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,309 @@
+# Verification of the hourly temperature forecasts against what was observed later, per location and lead time
+# Forecasts: the hourly[].temp of every snapshot of <LOCATION>_forecast_archive.sqlite (007_B, _forecast_archive.py)
+# Observations, the "sources":
+#   "owm_current"    current.temp recorded by 005_B in <LOCATION>_history.sqlite (_history_store.py)
+#   "local_sensor"   temperatureInC of <LOCATION>_urlResponse.json, recorded by 045_B in the table "observations"
+#                    at every run (the time of the observation is the time 001_B wrote the file), in the units of the
+#                    location
+# A forecast for the target hour T made by the fetch at F has the lead time round((T - F) / 3600) hours, 0 to 47.
+# It is joined with the observation nearest to T, if there is one within MATCH_TOLERANCE_SECONDS. The join is done
+# on sorted arrays (the dt of a snapshot and the times of the observations are both sorted): one np.searchsorted per
+# snapshot, no loop over the hours.
+#
+# The scores are kept as sums per source and lead hour in <LOCATION>_verification.sqlite: count, sum of the errors
+# (forecast - observed), of their absolute values and of their squares, so that
+#   bias = sum / count,  MAE = sum of absolute errors / count,  RMSE = sqrt(sum of squares / count)
+# Every source has a watermark "verified_until": the target hours up to it are in the sums. An update only joins the
+# target hours between the watermark and the last observation (minus the tolerance, a later observation could still
+# be nearer), with the snapshots fetched up to 48 hours before them, and moves the watermark. Each pair of forecast
+# and observation is counted once, and nothing of the older history is read again. An observation arriving after its
+# target hour was verified is not counted.
+#
+#   python3 _forecast_verification.py report [--location WeinheimerStr_55] [--all-leads]
+#   python3 _forecast_verification.py update WeinheimerStr_55 [--rebuild]
+#   python3 _forecast_verification.py --benchmark      incremental updates against one computation over all history
+
+import argparse
+import glob
+import math
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from _forecast_archive import ForecastArchive, Snapshot, archive_file_path, synthetic_snapshots
+from _history_store import HistoryStore, history_file_path
+
+WEATHER_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_data')
+
+SOURCES = ["owm_current", "local_sensor"]
+MATCH_TOLERANCE_SECONDS = 600
+MAX_LEAD_HOURS = 47
+REPORT_LEAD_HOURS = [0, 1, 2, 3, 6, 12, 18, 24, 36, 47]
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def verification_file_path(weather_data_path, location_name):
+    return os.path.join(weather_data_path, f"{location_name}_verification.sqlite")
+
+
+def lead_hours(target_dt, fetched_at):
+    return (target_dt - fetched_at + 1800) // 3600
+
+
+def nearest_observations(targets, observed_dt, observed_values, tolerance):
+    # Merge join of the sorted target times with the sorted observation times: for each target the value of the
+    # nearest observation, and True where it is within tolerance seconds
+    if not len(observed_dt):
+        return np.zeros(len(targets)), np.zeros(len(targets), dtype=bool)
+    after = np.searchsorted(observed_dt, targets)
+    before = np.maximum(after - 1, 0)
+    np.minimum(after, len(observed_dt) - 1, out=after)
+    nearest = np.where(np.abs(observed_dt[after] - targets) < np.abs(observed_dt[before] - targets), after, before)
+    return observed_values[nearest], np.abs(observed_dt[nearest] - targets) <= tolerance
+
+
+class ScoreSums:
+    # count, sum, sum of absolute values and sum of squares of the errors, per lead hour
+    def __init__(self):
+        self.count = np.zeros(MAX_LEAD_HOURS + 1, dtype=np.int64)
+        self.error = np.zeros(MAX_LEAD_HOURS + 1)
+        self.absolute_error = np.zeros(MAX_LEAD_HOURS + 1)
+        self.squared_error = np.zeros(MAX_LEAD_HOURS + 1)
+
+    def add(self, leads, errors):
+        length = MAX_LEAD_HOURS + 1
+        self.count += np.bincount(leads, minlength=length)
+        self.error += np.bincount(leads, weights=errors, minlength=length)
+        self.absolute_error += np.bincount(leads, weights=np.abs(errors), minlength=length)
+        self.squared_error += np.bincount(leads, weights=errors * errors, minlength=length)
+
+
+def join_snapshot(snapshot, start, end, observed_dt, observed_values, sums, tolerance=MATCH_TOLERANCE_SECONDS):
+    # Adds the errors of the targets start < dt <= end of one snapshot, returns the number of pairs
+    hourly = snapshot.blocks.get("hourly")
+    if hourly is None or "temp" not in hourly or not len(hourly):
+        return 0
+    dt = hourly["dt"]
+    first, last = np.searchsorted(dt, start, side='right'), np.searchsorted(dt, end, side='right')
+    targets, forecast = dt[first:last], hourly["temp"][first:last]
+    leads = lead_hours(targets, snapshot.fetched_at)
+    observed, matched = nearest_observations(targets, observed_dt, observed_values, tolerance)
+    keep = matched & (leads >= 0) & (leads <= MAX_LEAD_HOURS)
+    sums.add(leads[keep], forecast[keep] - observed[keep])
+    return int(keep.sum())
+
+
+class VerificationStore:
+    # with VerificationStore(file_path) as store: ...   the connection is closed at the end of the block
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path, timeout=BUSY_TIMEOUT_SECONDS)
+        with self.connection:
+            self.connection.execute("CREATE TABLE IF NOT EXISTS observations "
+                                    "(source TEXT NOT NULL, dt INTEGER NOT NULL, value REAL, PRIMARY KEY (source, dt))")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS scores (source TEXT NOT NULL, lead_hour INTEGER NOT NULL, "
+                                    "count INTEGER NOT NULL, error REAL NOT NULL, absolute_error REAL NOT NULL, "
+                                    "squared_error REAL NOT NULL, PRIMARY KEY (source, lead_hour))")
+            self.connection.execute("CREATE TABLE IF NOT EXISTS watermarks "
+                                    "(source TEXT PRIMARY KEY, verified_until INTEGER NOT NULL)")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def record_observation(self, source, dt, value):
+        # An observation already recorded for the same time is kept
+        with self.connection:
+            self.connection.execute("INSERT OR IGNORE INTO observations (source, dt, value) VALUES (?, ?, ?)",
+                                    (source, dt, value))
+
+    def observations(self, source, start):
+        # (dt, values) of the observations with dt > start, sorted
+        rows = self.connection.execute("SELECT dt, value FROM observations WHERE source = ? AND dt > ? ORDER BY dt",
+                                       (source, start)).fetchall()
+        return np.array([row[0] for row in rows], dtype=np.int64), np.array([row[1] for row in rows], dtype=np.float64)
+
+    def watermark(self, source):
+        row = self.connection.execute("SELECT verified_until FROM watermarks WHERE source = ?", (source,)).fetchone()
+        return row[0] if row else None
+
+    def add_scores(self, source, sums, verified_until):
+        # The sums and the new watermark in one transaction, an interrupted update is not counted half
+        with self.connection:
+            for lead in np.flatnonzero(sums.count).tolist():
+                self.connection.execute(
+                    "INSERT OR IGNORE INTO scores (source, lead_hour, count, error, absolute_error, squared_error) "
+                    "VALUES (?, ?, 0, 0, 0, 0)", (source, lead))
+                self.connection.execute(
+                    "UPDATE scores SET count = count + ?, error = error + ?, absolute_error = absolute_error + ?, "
+                    "squared_error = squared_error + ? WHERE source = ? AND lead_hour = ?",
+                    (int(sums.count[lead]), float(sums.error[lead]), float(sums.absolute_error[lead]),
+                     float(sums.squared_error[lead]), source, lead))
+            self.connection.execute("INSERT OR REPLACE INTO watermarks (source, verified_until) VALUES (?, ?)",
+                                    (source, verified_until))
+
+    def reset(self):
+        # Forget the scores, the next update verifies all history again. The observations are kept.
+        with self.connection:
+            self.connection.execute("DELETE FROM scores")
+            self.connection.execute("DELETE FROM watermarks")
+
+    def scores(self, source):
+        # (lead hour, count, bias, MAE, RMSE) per lead hour
+        return [(lead, count, error / count, absolute_error / count, math.sqrt(squared_error / count))
+                for lead, count, error, absolute_error, squared_error in self.connection.execute(
+                    "SELECT lead_hour, count, error, absolute_error, squared_error FROM scores "
+                    "WHERE source = ? AND count > 0 ORDER BY lead_hour", (source,))]
+
+
+def history_observations(weather_data_path, location_name, start):
+    # current.temp recorded by 005_B with dt > start
+    file_path = history_file_path(weather_data_path, location_name)
+    if not os.path.exists(file_path):
+        return np.zeros(0, dtype=np.int64), np.zeros(0)
+    with HistoryStore(file_path) as history:
+        rows = history.connection.execute(
+            "SELECT dt, temperature FROM responses WHERE dt > ? AND temperature IS NOT NULL ORDER BY dt",
+            (start,)).fetchall()
+    return np.array([row[0] for row in rows], dtype=np.int64), np.array([row[1] for row in rows], dtype=np.float64)
+
+
+def verify_source(store, archive, source, observed_dt, observed_values, tolerance=MATCH_TOLERANCE_SECONDS):
+    # Joins the target hours after the watermark of the source, returns the number of new pairs
+    start = store.watermark(source)
+    if start is None:
+        times = archive.fetch_times()
+        if not times:
+            return 0
+        start = times[0] - 3600  # The first hour of the first snapshot
+    if not len(observed_dt):
+        return 0
+    end = int(observed_dt[-1]) - tolerance
+    if end <= start:
+        return 0
+    sums = ScoreSums()
+    pairs = 0
+    for snapshot in archive.iter_snapshots(start - (MAX_LEAD_HOURS + 1) * 3600, end + 1):
+        pairs += join_snapshot(snapshot, start, end, observed_dt, observed_values, sums, tolerance)
+    store.add_scores(source, sums, end)
+    return pairs
+
+
+def update_location(weather_data_path, location_name):
+    # Verifies what is new for both sources, returns {source: new pairs}
+    archive_path = archive_file_path(weather_data_path, location_name)
+    if not os.path.exists(archive_path):
+        return {}
+    added = {}
+    with VerificationStore(verification_file_path(weather_data_path, location_name)) as store, \
+            ForecastArchive(archive_path) as archive:
+        for source in SOURCES:
+            start = (store.watermark(source) or 0) - MATCH_TOLERANCE_SECONDS
+            if source == "owm_current":
+                observed_dt, observed_values = history_observations(weather_data_path, location_name, start)
+            else:
+                observed_dt, observed_values = store.observations(source, start)
+            added[source] = verify_source(store, archive, source, observed_dt, observed_values)
+    return added
+
+
+def report(file_paths, lead_hours_shown):
+    lines = []
+    for file_path in file_paths:
+        location_name = os.path.basename(file_path)[:-len("_verification.sqlite")]
+        with VerificationStore(file_path) as store:
+            for source in SOURCES:
+                scores = store.scores(source)
+                if not scores:
+                    continue
+                lines.append(f"{location_name}, forecast temp against {source}, verified until "
+                             f"{store.watermark(source)}")
+                lines.append(f"  {'lead h':>6}{'pairs':>8}{'bias':>8}{'MAE':>8}{'RMSE':>8}")
+                for lead, count, bias, mae, rmse in scores:
+                    if lead_hours_shown is None or lead in lead_hours_shown:
+                        lines.append(f"  {lead:>6}{count:>8}{bias:>8.2f}{mae:>8.2f}{rmse:>8.2f}")
+                count = sum(score[1] for score in scores)
+                lines.append(f"  {'all':>6}{count:>8}{sum(score[1] * score[2] for score in scores) / count:>8.2f}"
+                             f"{sum(score[1] * score[3] for score in scores) / count:>8.2f}"
+                             f"{math.sqrt(sum(score[1] * score[4] ** 2 for score in scores) / count):>8.2f}")
+    return "\n".join(lines) if lines else "No verified forecasts yet"
+
+
+def benchmark(days):
+    # Hourly fetches and observations over days days: verified hour by hour as in production, and all at once
+    snapshots = list(synthetic_snapshots(days * 24))
+    rng = np.random.default_rng(7)
+    observed_dt = np.array([snapshot.fetched_at + 5 for snapshot in snapshots], dtype=np.int64)
+    observed_values = np.round(12 + 8 * np.sin(np.arange(len(observed_dt)) / 24 * 2 * np.pi)
+                               + rng.normal(0, 0.8, len(observed_dt)), 2)
+    with tempfile.TemporaryDirectory() as directory:
+        incremental_seconds = []
+        with ForecastArchive(os.path.join(directory, "Benchmark_forecast_archive.sqlite")) as archive, \
+                VerificationStore(os.path.join(directory, "Benchmark_verification.sqlite")) as store:
+            for index, snapshot in enumerate(snapshots):
+                archive.append(Snapshot(snapshot.fetched_at, snapshot.issued_at, snapshot.time_zone, snapshot.blocks))
+                begin = time.perf_counter()
+                verify_source(store, archive, "local_sensor", observed_dt[:index + 1], observed_values[:index + 1])
+                incremental_seconds.append(time.perf_counter() - begin)
+            incremental = store.scores("local_sensor")
+            store.reset()
+            begin = time.perf_counter()
+            pairs = verify_source(store, archive, "local_sensor", observed_dt, observed_values)
+            full_seconds = time.perf_counter() - begin
+            full = store.scores("local_sensor")
+    assert [score[:2] for score in incremental] == [score[:2] for score in full]
+    assert np.allclose([score[2:] for score in incremental], [score[2:] for score in full])
+    print(f"{len(snapshots)} hourly snapshots and observations ({days} days), {pairs} forecast/observation pairs")
+    print(f"  all at once:        {full_seconds * 1000:8.1f} ms")
+    print(f"  hourly update:      {np.median(incremental_seconds) * 1000:8.1f} ms median, "
+          f"{max(incremental_seconds) * 1000:.1f} ms max, same scores")
+    lead_0, lead_47 = full[0], full[-1]
+    print(f"  lead {lead_0[0]:>2} h: bias {lead_0[2]:.2f}, MAE {lead_0[3]:.2f}, RMSE {lead_0[4]:.2f}; "
+          f"lead {lead_47[0]} h: bias {lead_47[2]:.2f}, MAE {lead_47[3]:.2f}, RMSE {lead_47[4]:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Verification of the hourly temperature forecasts")
+    parser.add_argument("command", nargs="?", choices=["report", "update"], help="report or update")
+    parser.add_argument("location", nargs="?", help="location name, e.g. WeinheimerStr_55 (report: default all)")
+    parser.add_argument("--all-leads", action="store_true", help="report: every lead hour, not only a few")
+    parser.add_argument("--rebuild", action="store_true", help="update: forget the scores and verify all history")
+    parser.add_argument("--weather-data", default=WEATHER_DATA_PATH, help="directory of the weather data")
+    parser.add_argument("--benchmark", action="store_true", help="incremental against full verification")
+    parser.add_argument("--days", type=int, default=30, help="benchmark: days of hourly fetches (default 30)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.days)
+        return 0
+    if args.command == "report":
+        if args.location:
+            file_paths = [verification_file_path(args.weather_data, args.location)]
+            if not os.path.exists(file_paths[0]):
+                print(f"{file_paths[0]} does not exist", file=sys.stderr)
+                return 1
+        else:
+            file_paths = sorted(glob.glob(os.path.join(args.weather_data, "*_verification.sqlite")))
+        print(report(file_paths, None if args.all_leads else REPORT_LEAD_HOURS))
+        return 0
+    if args.command == "update" and args.location:
+        if args.rebuild:
+            with VerificationStore(verification_file_path(args.weather_data, args.location)) as store:
+                store.reset()
+        added = update_location(args.weather_data, args.location)
+        print(", ".join(f"{source}: {pairs} new pairs" for source, pairs in added.items()) or "No forecast archive")
+        return 0
+    parser.error("report [location], update location or --benchmark")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,204 @@
+# Range queries over the history recorded by 005_B_Log_API_response.py (see _history_store.py)
+#   iter_rows(store, start_dt, end_dt, fields)                  rows (dt, field, ...) with start_dt <= dt < end_dt
+#   iter_resampled(store, start_dt, end_dt, fields, "day")      one row per hour, day or week: count, min, max, mean
+# Both read only the selected time range through the index on dt, so the time of a query grows with the range and
+# not with the whole history, and both yield lists of at most CHUNK_ROWS rows, so a range of years is never held in
+# memory at once. The buckets of iter_resampled are computed by SQLite (GROUP BY), in the local time of the rows
+# (their timezone_offset): a day is a local calendar day, a week starts on Monday.
+#
+#   python3 _history_query.py WeinheimerStr_55 --start 2026-10-01 --end 2026-10-08 --fields temp humidity
+#   python3 _history_query.py WeinheimerStr_55 --start 2025-01-01 --every week --fields temp pressure --output weeks.csv
+#   python3 _history_query.py --benchmark
+# --start and --end are local dates or date and time ("2026-10-01 06:00") of the location, or Unix timestamps.
+# The benchmark queries one week from histories of one and of ten years.
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from zoneinfo import ZoneInfo
+
+from _history_store import WEATHER_DATA_PATH, HistoryStore, history_file_path
+
+# Columns that can be selected, and the short names accepted for them
+FIELDS = ['temperature', 'feels_like', 'pressure', 'humidity', 'uvi', 'clouds', 'wind_speed', 'wind_deg', 'wind_gust']
+FIELD_ALIASES = {'temp': 'temperature', 'wind': 'wind_speed', 'gust': 'wind_gust'}
+
+INTERVALS = {'hour': 3600, 'day': 86400, 'week': 7 * 86400}
+WEEK_SHIFT_SECONDS = 3 * 86400  # 01.01.1970 was a Thursday, weeks start on Monday
+AGGREGATES = ['min', 'max', 'mean']
+
+CHUNK_ROWS = 1000
+
+
+def field_names(names):
+    # Column names for names such as ["temp", "pressure"], ValueError for unknown ones
+    fields = []
+    for name in names:
+        field = FIELD_ALIASES.get(name, name)
+        if field not in FIELDS:
+            raise ValueError(f"Unknown field '{name}', use one of {', '.join(FIELDS)} or {', '.join(FIELD_ALIASES)}")
+        fields.append(field)
+    return fields
+
+
+def iter_chunks(cursor, chunk_rows):
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            return
+        yield rows
+
+
+def iter_rows(store, start_dt, end_dt, fields, chunk_rows=CHUNK_ROWS):
+    # Rows (dt, timezone_offset, field, ...) by dt
+    cursor = store.connection.execute(
+        f"SELECT dt, timezone_offset, {', '.join(fields)} FROM responses WHERE dt >= ? AND dt < ? ORDER BY dt",
+        (start_dt, end_dt))
+    return iter_chunks(cursor, chunk_rows)
+
+
+def iter_resampled(store, start_dt, end_dt, fields, interval, chunk_rows=CHUNK_ROWS):
+    # Rows (local start of the bucket in seconds, count, min, max, mean of the first field, min, max, mean of the
+    # next, ...) by bucket. The local start is a naive time: seconds since 01.01.1970 00:00 local time.
+    width = INTERVALS[interval]
+    shift = WEEK_SHIFT_SECONDS if interval == 'week' else 0
+    bucket = f"((dt + timezone_offset + {shift}) / {width}) * {width} - {shift}"
+    aggregates = ", ".join(f"MIN({field}), MAX({field}), AVG({field})" for field in fields)
+    cursor = store.connection.execute(
+        f"SELECT {bucket} AS bucket, COUNT(*), {aggregates} FROM responses WHERE dt >= ? AND dt < ? "
+        f"GROUP BY bucket ORDER BY bucket",
+        (start_dt, end_dt))
+    return iter_chunks(cursor, chunk_rows)
+
+
+def local_text(local_seconds):
+    return datetime.fromtimestamp(local_seconds, timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def store_time_zone(store):
+    # Time zone of the most recent row, UTC for an empty history
+    row = store.connection.execute("SELECT timezone FROM responses ORDER BY dt DESC LIMIT 1").fetchone()
+    try:
+        return ZoneInfo(row[0]) if row and row[0] else timezone.utc
+    except (ValueError, KeyError):
+        return timezone.utc
+
+
+def parse_time(text, tz):
+    # Unix timestamp, or a local date "2026-10-01" or date and time "2026-10-01 06:00"
+    if text.isdigit():
+        return int(text)
+    for time_format in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            return int(datetime.strptime(text, time_format).replace(tzinfo=tz).timestamp())
+        except ValueError:
+            pass
+    raise ValueError(f"'{text}' is neither a Unix timestamp nor a date like 2026-10-01 or 2026-10-01 06:00")
+
+
+def write_query(store, start_dt, end_dt, fields, interval, file):
+    # Writes the result as CSV chunk by chunk, returns the number of rows
+    writer = csv.writer(file)
+    count = 0
+    if interval:
+        writer.writerow([f"local_{interval}", 'count'] +
+                        [f"{field}_{aggregate}" for field in fields for aggregate in AGGREGATES])
+        for rows in iter_resampled(store, start_dt, end_dt, fields, interval):
+            writer.writerows([local_text(row[0]), *row[1:]] for row in rows)
+            count += len(rows)
+    else:
+        writer.writerow(['dt', 'local_time'] + fields)
+        for rows in iter_rows(store, start_dt, end_dt, fields):
+            writer.writerows([row[0], local_text(row[0] + row[1]), *row[2:]] for row in rows)
+            count += len(rows)
+    return count
+
+
+def synthetic_history(file_path, years, start_dt=1577836800):
+    # Hourly rows for "years" years from 01.01.2020
+    hours = years * 8760
+    with HistoryStore(file_path) as store:
+        for first in range(0, hours, 8760):
+            store.upsert_rows(
+                ['Europe/Berlin', 3600, start_dt + hour * 3600, 10.0 + hour % 24 / 2, 9.0, 1013, 70, 0.5, 40, 3.0,
+                 250, None] for hour in range(first, min(first + 8760, hours)))
+    return start_dt, start_dt + hours * 3600
+
+
+def benchmark(repeats):
+    print(f"One week of a history, cold (new connection) and warm, best of {repeats}")
+    print(f"{'years':>6}{'rows':>9}{'rows ms':>10}{'daily ms':>10}{'cold rows ms':>14}")
+    with tempfile.TemporaryDirectory() as directory:
+        for years in (1, 10):
+            file_path = os.path.join(directory, f"Benchmark_{years}_history.sqlite")
+            start_dt, end_dt = synthetic_history(file_path, years)
+            week_start = end_dt - 30 * 86400
+            week_end = week_start + 7 * 86400
+            fields = ['temperature', 'pressure', 'humidity']
+            best_rows, best_daily, best_cold = float("inf"), float("inf"), float("inf")
+            with HistoryStore(file_path) as store:
+                rows = store.row_count()
+                for _ in range(repeats):
+                    begin = time.perf_counter()
+                    selected = sum(len(chunk) for chunk in iter_rows(store, week_start, week_end, fields))
+                    best_rows = min(best_rows, time.perf_counter() - begin)
+                    begin = time.perf_counter()
+                    days = sum(len(chunk) for chunk in iter_resampled(store, week_start, week_end, fields, 'day'))
+                    best_daily = min(best_daily, time.perf_counter() - begin)
+            assert selected == 7 * 24 and days in (7, 8)
+            for _ in range(repeats):
+                begin = time.perf_counter()
+                with HistoryStore(file_path) as store:
+                    sum(len(chunk) for chunk in iter_rows(store, week_start, week_end, fields))
+                best_cold = min(best_cold, time.perf_counter() - begin)
+            print(f"{years:>6}{rows:>9}{best_rows * 1000:>10.2f}{best_daily * 1000:>10.2f}{best_cold * 1000:>14.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Range queries over the history recorded by 005_B")
+    parser.add_argument("location", nargs="?", help="location name, e.g. WeinheimerStr_55")
+    parser.add_argument("--start", help="first local date or time, or Unix timestamp (default: first row)")
+    parser.add_argument("--end", help="local date or time, or Unix timestamp, not included (default: after last row)")
+    parser.add_argument("--fields", nargs="+", default=['temperature'],
+                        help=f"columns to read (default temperature): {', '.join(FIELDS)}")
+    parser.add_argument("--every", choices=list(INTERVALS), help="resample to hours, days or weeks: min, max, mean")
+    parser.add_argument("--output", help="CSV file to write (default: standard output)")
+    parser.add_argument("--weather-data", default=WEATHER_DATA_PATH, help="directory of the weather data")
+    parser.add_argument("--benchmark", action="store_true", help="time queries on synthetic histories")
+    parser.add_argument("--repeats", type=int, default=10, help="repetitions of the benchmark (default 10)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.repeats)
+        return 0
+    if not args.location:
+        parser.error("the location is required")
+    database_file_path = history_file_path(args.weather_data, args.location)
+    if not os.path.exists(database_file_path):
+        print(f"{database_file_path} does not exist", file=sys.stderr)
+        return 1
+    with HistoryStore(database_file_path) as store:
+        try:
+            fields = field_names(args.fields)
+            tz = store_time_zone(store)
+            start_dt = parse_time(args.start, tz) if args.start else 0
+            end_dt = parse_time(args.end, tz) if args.end else (store.last_dt() or 0) + 1
+        except ValueError as e:
+            parser.error(str(e))
+        if args.output:
+            temp_file_path = f"{args.output}.tmp"
+            with open(temp_file_path, 'w', newline='') as file:
+                count = write_query(store, start_dt, end_dt, fields, args.every, file)
+            os.replace(temp_file_path, args.output)
+            print(f"{count} rows written to {args.output}")
+        else:
+            write_query(store, start_dt, end_dt, fields, args.every, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+# History of the 'current' block recorded by 005_B_Log_API_response.py, one SQLite database per location
+#   weather_data/<WeinheimerStr_55>_history.sqlite, table "responses" with the columns of <LOCATION>_all_responses.csv
+# instead of a CSV file that grows forever and has to be read completely for any analysis:
+#   - rows are written in batches, one transaction per batch (upsert_rows)
+#   - dt is unique: a row for a dt that is already recorded replaces it (INSERT OR REPLACE, also with the old SQLite
+#     of a NAS), so running 005_B twice for the same response, or migrating a CSV twice, adds nothing
+#   - the unique index on dt finds a time range without reading the other rows (rows_between), and the last dt
+#     (last_dt) with one step down the right edge of the index, whatever the size of the history
+#   - compact() gives the space of deleted rows back to the file system and updates the statistics of the index
+#   - the rollback journal of SQLite, not WAL: WAL needs shared memory, which the network shares of a NAS do not have
+# The database of a location is the partition, the stages of one location never run twice at the same time.
+#
+# 005_B moves an existing <LOCATION>_all_responses.csv into the database when it writes into an empty database.
+# "history_storage": "csv" in locations.json keeps appending to the CSV for that location instead. There the last dt
+# is read from the end of the file (last_csv_dt), and a row that is not newer is not appended.
+#   python3 _history_store.py info WeinheimerStr_55
+#   python3 _history_store.py migrate WeinheimerStr_55                                CSV -> database
+#   python3 _history_store.py export WeinheimerStr_55 [--csv WeinheimerStr_55.csv]    database -> CSV
+#   python3 _history_store.py compact WeinheimerStr_55
+# compact gives the free space of the database back, and rewrites the CSV (if there is one) sorted by dt with one
+# row per dt, the last one of the file.
+
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+
+WEATHER_DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'weather_data')
+
+# Columns of the table, in the order of the CSV file, with their SQLite types
+COLUMNS = [
+    ('timezone', 'TEXT'),
+    ('timezone_offset', 'INTEGER'),
+    ('dt', 'INTEGER NOT NULL'),
+    ('temperature', 'REAL'),
+    ('feels_like', 'REAL'),
+    ('pressure', 'INTEGER'),
+    ('humidity', 'INTEGER'),
+    ('uvi', 'REAL'),
+    ('clouds', 'INTEGER'),
+    ('wind_speed', 'REAL'),
+    ('wind_deg', 'INTEGER'),
+    ('wind_gust', 'REAL'),
+]
+HEADER = [name for name, _ in COLUMNS]
+
+SCHEMA_VERSION = 1
+BATCH_ROWS = 5000  # Rows per transaction when migrating a CSV
+BUSY_TIMEOUT_SECONDS = 30
+
+
+def history_file_path(weather_data_path, location_name):
+    return os.path.join(weather_data_path, f"{location_name}_history.sqlite")
+
+
+def csv_file_path(weather_data_path, location_name):
+    return os.path.join(weather_data_path, f"{location_name}_all_responses.csv")
+
+
+def csv_values(row):
+    # An empty field is a missing value, e.g. wind_gust. SQLite converts the other strings by the column type.
+    return [None if value == '' else value for value in row]
+
+
+class HistoryStore:
+    # with HistoryStore(file_path) as store: ...   the connection is closed at the end of the block
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.connection = sqlite3.connect(file_path, timeout=BUSY_TIMEOUT_SECONDS)
+        self.create_schema()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        self.connection.close()
+
+    def create_schema(self):
+        # Nothing is written when the schema is already up to date, e.g. for the queries of _history_query.py
+        version = self.connection.execute("PRAGMA user_version").fetchone()[0]
+        if version == SCHEMA_VERSION:
+            return
+        columns = ", ".join(f"{name} {column_type}" for name, column_type in COLUMNS)
+        with self.connection:
+            self.connection.execute(f"CREATE TABLE IF NOT EXISTS responses ({columns})")
+            self.connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS responses_dt ON responses (dt)")
+            self.connection.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def upsert_rows(self, rows):
+        # rows: lists of values in the order of HEADER, all in one transaction. A row replaces the row of its dt.
+        placeholders = ", ".join("?" for _ in COLUMNS)
+        with self.connection:
+            self.connection.executemany(
+                f"INSERT OR REPLACE INTO responses ({', '.join(HEADER)}) VALUES ({placeholders})", rows)
+
+    def row_count(self):
+        return self.connection.execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+
+    def last_dt(self):
+        # None for an empty history. MAX of an indexed column is read from the index, not by a scan.
+        return self.connection.execute("SELECT MAX(dt) FROM responses").fetchone()[0]
+
+    def dt_range(self):
+        # (first dt, last dt), (None, None) for an empty history
+        return self.connection.execute("SELECT MIN(dt), MAX(dt) FROM responses").fetchone()
+
+    def rows_between(self, start_dt, end_dt):
+        # Rows with start_dt <= dt < end_dt, by dt, read through the index
+        return self.connection.execute(
+            f"SELECT {', '.join(HEADER)} FROM responses WHERE dt >= ? AND dt < ? ORDER BY dt",
+            (start_dt, end_dt))
+
+    def migrate_csv(self, file_path):
+        # Upserts all rows of an _all_responses.csv, in one transaction: a broken file leaves the database unchanged.
+        # Returns the number of rows read, rows of a dt already recorded replace the recorded ones.
+        count = 0
+        with open(file_path, newline='') as file:
+            reader = csv.reader(file)
+            header = next(reader, None)
+            if header is None:
+                return 0
+            if header != HEADER:
+                raise ValueError(f"{file_path}: unexpected header {header}")
+            placeholders = ", ".join("?" for _ in COLUMNS)
+            insert = f"INSERT OR REPLACE INTO responses ({', '.join(HEADER)}) VALUES ({placeholders})"
+            with self.connection:
+                batch = []
+                for row in reader:
+                    if not row:
+                        continue
+                    if len(row) != len(HEADER):
+                        raise ValueError(f"{file_path}, line {reader.line_num}: {len(row)} fields instead of {len(HEADER)}")
+                    batch.append(csv_values(row))
+                    if len(batch) == BATCH_ROWS:
+                        self.connection.executemany(insert, batch)
+                        count += len(batch)
+                        batch = []
+                self.connection.executemany(insert, batch)
+                count += len(batch)
+        return count
+
+    def export_csv(self, file_path):
+        # The whole history as _all_responses.csv, by dt, written to a temporary file first
+        temp_file_path = f"{file_path}.tmp"
+        count = 0
+        with open(temp_file_path, 'w', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(HEADER)
+            cursor = self.connection.execute(f"SELECT {', '.join(HEADER)} FROM responses ORDER BY dt")
+            while True:
+                rows = cursor.fetchmany(BATCH_ROWS)
+                if not rows:
+                    break
+                writer.writerows(rows)
+                count += len(rows)
+        os.replace(temp_file_path, file_path)
+        return count
+
+    def compact(self):
+        # Returns the file size before and after
+        size_before = os.path.getsize(self.file_path)
+        self.connection.execute("VACUUM")
+        self.connection.execute("ANALYZE")
+        return size_before, os.path.getsize(self.file_path)
+
+
+def last_csv_dt(file_path, tail_bytes=4096):
+    # dt of the last row of an _all_responses.csv, read from the end of the file, None for no rows or no file
+    try:
+        with open(file_path, 'rb') as file:
+            file.seek(0, os.SEEK_END)
+            file.seek(max(0, file.tell() - tail_bytes))
+            lines = file.read().decode('utf-8', errors='replace').splitlines()
+    except FileNotFoundError:
+        return None
+    for line in reversed(lines):
+        if line.strip():
+            row = next(csv.reader([line]))
+            if len(row) != len(HEADER) or row[HEADER.index('dt')] == 'dt':
+                return None
+            return int(float(row[HEADER.index('dt')]))
+    return None
+
+
+def compact_csv(file_path):
+    # Rewrites an _all_responses.csv sorted by dt with one row per dt, the last one of the file.
+    # Returns the number of rows before and after.
+    with open(file_path, newline='') as file:
+        reader = csv.reader(file)
+        header = next(reader, None)
+        if header != HEADER:
+            raise ValueError(f"{file_path}: unexpected header {header}")
+        rows = [row for row in reader if row]
+    latest = {int(float(row[HEADER.index('dt')])): row for row in rows}
+    temp_file_path = f"{file_path}.tmp"
+    with open(temp_file_path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(HEADER)
+        writer.writerows(latest[dt] for dt in sorted(latest))
+    os.replace(temp_file_path, file_path)
+    return len(rows), len(latest)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History of the current weather recorded by 005_B")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    for command, help_text in [("info", "number of rows and time range"),
+                               ("migrate", "upsert the rows of <LOCATION>_all_responses.csv into the database"),
+                               ("export", "write the database as <LOCATION>_all_responses.csv"),
+                               ("compact", "give free space back, de-duplicate and sort the CSV")]:
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument("location", help="location name, e.g. WeinheimerStr_55")
+        command_parser.add_argument("--weather-data", default=WEATHER_DATA_PATH, help="directory of the weather data")
+        command_parser.add_argument("--csv", dest="csv_file", help="CSV file (default <LOCATION>_all_responses.csv)")
+    args = parser.parse_args()
+
+    database_file_path = history_file_path(args.weather_data, args.location)
+    csv_file = args.csv_file or csv_file_path(args.weather_data, args.location)
+    if args.command == "compact" and os.path.exists(csv_file):
+        rows_before, rows_after = compact_csv(csv_file)
+        print(f"{csv_file}: {rows_before} rows -> {rows_after} rows")
+    if args.command != "migrate" and not os.path.exists(database_file_path):
+        print(f"{database_file_path} does not exist")
+        return 0 if args.command == "compact" else 1
+    with HistoryStore(database_file_path) as store:
+        if args.command == "info":
+            first_dt, last_dt = store.dt_range()
+            print(f"{database_file_path}: {store.row_count()} rows, dt {first_dt} .. {last_dt}, "
+                  f"{os.path.getsize(database_file_path) / 1024:.1f} kB")
+        elif args.command == "migrate":
+            rows_before = store.row_count()
+            rows_read = store.migrate_csv(csv_file)
+            print(f"{rows_read} rows of {csv_file} read, {store.row_count() - rows_before} new in {database_file_path}")
+        elif args.command == "export":
+            print(f"{store.export_csv(csv_file)} rows written to {csv_file}")
+        elif args.command == "compact":
+            size_before, size_after = store.compact()
+            print(f"{database_file_path}: {size_before / 1024:.1f} kB -> {size_after / 1024:.1f} kB")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
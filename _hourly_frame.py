@@ -0,0 +1,202 @@
+# Hourly forecast of a location as a pandas DataFrame, shared by the plotters 035_B and 036_B
+#   load_hourly_frame(weather_data_path, location_name)
+# reads <LOCATION>_hourly_forecast.npz of 030_B, or <LOCATION>_hourly_forecast.txt if there is no .npz, and returns
+# one row per hour with the columns
+#   Date_Time (local), Temperature, Feels Like, Humidity %, Dew Point, Clouds %, Pop %, UV Index,
+#   Wind Speed (m/s), Wind Gust (m/s), Wind From
+# Date_Time as datetime64[ns], the others as float, the same from both files. The .txt is parsed column by column:
+# Date_Time with one pd.to_datetime, the unit suffixes (°C, °F, %, m/s, °) cut off with one str.rstrip per column,
+# instead of a strptime per row.
+# The frame is kept, keyed by the file and revalidated with its mtime and size, so in the in-process mode of
+# _controller.py 035_B and 036_B (and later plotters) parse the file only once. At most MAX_RESIDENT_FRAMES frames
+# (WEATHER_MAX_RESIDENT_FRAMES) are kept, the least recently used one is dropped first. Every caller gets its own
+# shallow copy: adding a column does not change the frame of the others, the values themselves must not be changed.
+#
+# Benchmark of the parse time, per row (as before), vectorized, from the .npz and cached, for 48 hours and longer
+# histories:
+#   python3 _hourly_frame.py
+#   python3 _hourly_frame.py --hours 48 720 8760
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from _forecast_columns import ForecastColumns, load_columns, save_columns
+
+MAX_RESIDENT_FRAMES = int(os.environ.get("WEATHER_MAX_RESIDENT_FRAMES", "8"))
+
+NUMBER_COLUMNS = {
+    # column of the frame: column of the .txt, field of the .npz
+    'Temperature': ('Temperature', 'temp'),
+    'Feels Like': ('Feels Like', 'feels_like'),
+    'Humidity %': ('Humidity %', 'humidity'),
+    'Dew Point': ('Dew Point', 'dew_point'),
+    'Clouds %': ('Clouds %', 'clouds'),
+    'Pop %': ('Pop %', 'pop'),
+    'UV Index': ('UV Index', 'uvi'),
+    'Wind Speed (m/s)': ('Wind Speed', 'wind_speed'),
+    'Wind Gust (m/s)': ('Wind Gust (m/s)', 'wind_gust'),
+    'Wind From': ('Wind From', 'wind_deg'),
+}
+
+UNIT_SUFFIXES = '°CF%m/s'
+
+_frames = OrderedDict()  # absolute path: ((st_mtime_ns, st_size), frame)
+_lock = threading.Lock()
+_counts = {"hit": 0, "miss": 0}
+
+
+def frame_from_text(file_path):
+    text = pd.read_csv(file_path, delimiter=',', dtype=str)
+    date_times = pd.to_datetime(text['Date'] + ' ' + text['Time'], format='%d.%m.%Y %H:%M')
+    data = pd.DataFrame({'Date_Time': date_times.astype('datetime64[ns]')})
+    for column, (text_column, _) in NUMBER_COLUMNS.items():
+        data[column] = pd.to_numeric(text[text_column].str.rstrip(UNIT_SUFFIXES)).astype(float)
+    return data
+
+
+def frame_from_columns(file_path):
+    hourly = load_columns(file_path)
+    data = pd.DataFrame({'Date_Time': hourly.local_times().astype('datetime64[ns]')})
+    for column, (_, field) in NUMBER_COLUMNS.items():
+        values = hourly[field].astype(float)
+        # Whole percents, as in the .txt
+        data[column] = np.trunc(values * 100) if field == 'pop' else values
+    return data
+
+
+def hourly_file_path(weather_data_path, location_name):
+    # The .npz of 030_B, the .txt if there is none
+    columns_file_path = os.path.join(weather_data_path, f"{location_name}_hourly_forecast.npz")
+    if os.path.exists(columns_file_path):
+        return columns_file_path
+    return os.path.join(weather_data_path, f"{location_name}_hourly_forecast.txt")
+
+
+def load_hourly_frame(weather_data_path, location_name):
+    # Raises FileNotFoundError if 030_B wrote neither file
+    file_path = os.path.abspath(hourly_file_path(weather_data_path, location_name))
+    stat = os.stat(file_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _frames.get(file_path)
+        if cached and cached[0] == version:
+            _frames.move_to_end(file_path)
+            _counts["hit"] += 1
+            return cached[1].copy(deep=False)
+    data = frame_from_columns(file_path) if file_path.endswith(".npz") else frame_from_text(file_path)
+    with _lock:
+        _frames[file_path] = (version, data)
+        _frames.move_to_end(file_path)
+        while len(_frames) > MAX_RESIDENT_FRAMES:
+            _frames.popitem(last=False)
+        _counts["miss"] += 1
+    return data.copy(deep=False)
+
+
+def clear_frames():
+    with _lock:
+        _frames.clear()
+
+
+def frame_counts():
+    with _lock:
+        return dict(_counts, resident=len(_frames))
+
+
+def frame_per_row(file_path):
+    # How 035_B parsed the .txt before, for the benchmark
+    data = pd.read_csv(file_path, delimiter=',')
+    data['Date_Time'] = data.apply(
+        lambda row: datetime.strptime(f"{row['Date']} {row['Time']}", "%d.%m.%Y %H:%M"), axis=1)
+    data['Temperature °C'] = data['Temperature'].str.rstrip('°C').astype(float)
+    data['Feels Like °C'] = data['Feels Like'].str.rstrip('°C').astype(float)
+    data['Dew Point °C'] = data['Dew Point'].str.rstrip('°C').astype(float)
+    data['Wind Speed (m/s)'] = data['Wind Speed'].str.rstrip('m/s').astype(float)
+    data['Humidity %'] = data['Humidity %'].str.replace('%', '').astype(float)
+    data['Clouds %'] = data['Clouds %'].str.replace('%', '').astype(float)
+    data['Pop %'] = data['Pop %'].str.replace('%', '').astype(float)
+    return data
+
+
+def write_synthetic_forecast(directory, location_name, hours):
+    # An hourly forecast of "hours" rows, as .txt and .npz, as 030_B writes them
+    rng = np.random.default_rng(hours)
+    start = 1792321200
+    columns = {
+        "dt": np.arange(start, start + hours * 3600, 3600, dtype=np.int64),
+        "temp": np.round(rng.uniform(-5, 25, hours), 2), "feels_like": np.round(rng.uniform(-8, 25, hours), 2),
+        "humidity": rng.integers(30, 100, hours), "dew_point": np.round(rng.uniform(-5, 15, hours), 2),
+        "clouds": rng.integers(0, 100, hours), "pop": np.round(rng.random(hours), 2),
+        "uvi": np.round(rng.uniform(0, 6, hours), 2), "wind_speed": np.round(rng.uniform(0, 12, hours), 2),
+        "wind_gust": np.round(rng.uniform(0, 18, hours), 2), "wind_deg": rng.integers(0, 359, hours),
+    }
+    hourly = ForecastColumns("hourly", columns, {"wind_gust": np.ones(hours, dtype=bool)}, "Europe/Berlin")
+    save_columns(os.path.join(directory, f"{location_name}_hourly_forecast.npz"), hourly, "Europe/Berlin")
+    text = {field: hourly.text(field) for field in ["temp", "feels_like", "dew_point", "uvi", "wind_speed", "wind_gust"]}
+    moments = pd.Series(hourly.local_times()).dt.strftime('%d.%m.%Y,%H:%M')
+    lines = ["Date,Time,Temperature,Feels Like,Humidity %,Dew Point,Clouds %,Pop %,UV Index,Wind Speed,Wind Gust (m/s),Wind From"]
+    for index, moment in enumerate(moments):
+        lines.append(f"{moment},{text['temp'][index]}°C,{text['feels_like'][index]}°C,{columns['humidity'][index]}%,"
+                     f"{text['dew_point'][index]}°C,{columns['clouds'][index]}%,{int(columns['pop'][index] * 100)}%,"
+                     f"{text['uvi'][index]},{text['wind_speed'][index]}m/s,{text['wind_gust'][index]}m/s,"
+                     f"{columns['wind_deg'][index]}°")
+    text_file_path = os.path.join(directory, f"{location_name}_hourly_forecast.txt")
+    with open(text_file_path, 'w', encoding='utf-8') as file:
+        file.write("\n".join(lines))
+    return text_file_path
+
+
+def best_seconds(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(hour_counts, repeats):
+    print(f"Parse time of the hourly forecast, best of {repeats}")
+    print(f"{'hours':>8}{'per row ms':>12}{'vectorized ms':>15}{'.npz ms':>10}{'cached ms':>11}")
+    with tempfile.TemporaryDirectory() as directory:
+        for hours in hour_counts:
+            location_name = f"Benchmark_{hours}"
+            text_file_path = write_synthetic_forecast(directory, location_name, hours)
+            per_row = frame_per_row(text_file_path)
+            vectorized = frame_from_text(text_file_path)
+            from_columns = frame_from_columns(os.path.join(directory, f"{location_name}_hourly_forecast.npz"))
+            assert (per_row['Date_Time'].values == vectorized['Date_Time'].values).all()
+            assert (vectorized['Date_Time'].values == from_columns['Date_Time'].values).all()
+            for column in ['Temperature', 'Humidity %', 'Pop %', 'Wind Speed (m/s)']:
+                assert np.allclose(vectorized[column], from_columns[column])
+            per_row_seconds = best_seconds(lambda: frame_per_row(text_file_path), repeats)
+            vectorized_seconds = best_seconds(lambda: frame_from_text(text_file_path), repeats)
+            columns_seconds = best_seconds(
+                lambda: frame_from_columns(os.path.join(directory, f"{location_name}_hourly_forecast.npz")), repeats)
+            load_hourly_frame(directory, location_name)
+            cached_seconds = best_seconds(lambda: load_hourly_frame(directory, location_name), repeats)
+            print(f"{hours:>8}{per_row_seconds * 1000:>12.2f}{vectorized_seconds * 1000:>15.2f}"
+                  f"{columns_seconds * 1000:>10.2f}{cached_seconds * 1000:>11.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared hourly forecast frame of the plotters")
+    parser.add_argument("--hours", type=int, nargs="+", default=[48, 720, 8760],
+                        help="rows of the forecasts to parse (default 48 720 8760)")
+    parser.add_argument("--repeats", type=int, default=10, help="repetitions (default 10)")
+    args = parser.parse_args()
+    benchmark(args.hours, args.repeats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
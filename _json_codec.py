@@ -0,0 +1,145 @@
+# JSON encoding and decoding for all scripts: raw responses, locations.json, local sensor responses, fetch cache,
+# manifests, endpoint health and trace records
+#   loads(data)                                  bytes or str -> Python objects
+#   dumps(payload, indent=False, sort_keys=False) -> UTF-8 bytes, compact unless indent
+# The backend is the fastest one installed, in the order of BACKENDS: orjson, msgspec, then the json module of the
+# standard library, which is always there. WEATHER_JSON_BACKEND=json (or orjson, msgspec) selects one.
+# orjson and msgspec are optional dependencies, not part of the repository: install one from PyPI into the
+# environment that runs the scripts (pip install orjson) to use it.
+# All backends behave the same for the scripts:
+#   - a damaged document raises json.JSONDecodeError, as json.loads does
+#   - non-ASCII characters are written as UTF-8, not as \u escapes
+#   - read-only mappings (MappingProxyType of _weather_documents.py) are written like dicts
+#   - with indent, orjson indents by 2 spaces, the others by 4
+#
+# Benchmark of the installed backends, load, dump and round trip equality, for existing responses:
+#   python3 _json_codec.py weather_data/WeinheimerStr_55.json weather_data/EttlingerStr_8.json
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections.abc import Mapping
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+BACKENDS = ["orjson", "msgspec", "json"]
+
+
+def plain(value):
+    # For the types the backends do not know
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonCodec:
+    def __init__(self, name):
+        self.name = name
+        if name == "orjson":
+            if orjson is None:
+                raise ValueError("WEATHER_JSON_BACKEND is 'orjson' but the orjson package is not installed")
+        elif name == "msgspec":
+            if msgspec is None:
+                raise ValueError("WEATHER_JSON_BACKEND is 'msgspec' but the msgspec package is not installed")
+            self._decoder = msgspec.json.Decoder()
+            self._encoder = msgspec.json.Encoder(enc_hook=plain)
+            self._sorted_encoder = msgspec.json.Encoder(enc_hook=plain, order="sorted")
+        elif name != "json":
+            raise ValueError(f"Unknown JSON backend '{name}', use one of {', '.join(BACKENDS)}")
+
+    def loads(self, data):
+        if self.name == "orjson":
+            return orjson.loads(data)  # orjson.JSONDecodeError is a json.JSONDecodeError
+        if self.name == "msgspec":
+            try:
+                return self._decoder.decode(data)
+            except msgspec.DecodeError as e:
+                raise json.JSONDecodeError(str(e), data if isinstance(data, str) else "", 0) from e
+        return json.loads(data)
+
+    def dumps(self, payload, indent=False, sort_keys=False):
+        if self.name == "orjson":
+            option = (orjson.OPT_INDENT_2 if indent else 0) | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+            return orjson.dumps(payload, default=plain, option=option)
+        if self.name == "msgspec":
+            data = (self._sorted_encoder if sort_keys else self._encoder).encode(payload)
+            return msgspec.json.format(data, indent=4) if indent else data
+        if indent:
+            text = json.dumps(payload, indent=4, sort_keys=sort_keys, ensure_ascii=False, default=plain)
+        else:
+            text = json.dumps(payload, separators=(',', ':'), sort_keys=sort_keys, ensure_ascii=False, default=plain)
+        return text.encode('utf-8')
+
+
+def installed_backends():
+    modules = {"orjson": orjson, "msgspec": msgspec, "json": json}
+    return [name for name in BACKENDS if modules[name] is not None]
+
+
+def default_backend():
+    name = os.environ.get("WEATHER_JSON_BACKEND", "")
+    return name if name else installed_backends()[0]
+
+
+CODEC = JsonCodec(default_backend())
+
+
+def loads(data):
+    return CODEC.loads(data)
+
+
+def dumps(payload, indent=False, sort_keys=False):
+    return CODEC.dumps(payload, indent, sort_keys)
+
+
+def best_seconds(function, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchmark(file_paths, repeats):
+    print(f"Installed: {', '.join(installed_backends())}, used: {CODEC.name}, best of {repeats}")
+    print(f"{'file':<36}{'backend':<10}{'bytes':>8}{'load ms':>10}{'dump ms':>10}{'round trip':>12}")
+    for file_path in file_paths:
+        with open(file_path, 'rb') as file:
+            data = file.read()
+        if data[:1] not in (b'{', b'['):
+            print(f"{file_path}: not plain JSON (compressed?), skipped")
+            continue
+        reference = json.loads(data)
+        for name in installed_backends():
+            codec = JsonCodec(name)
+            payload = codec.loads(data)
+            encoded = codec.dumps(payload)
+            equal = payload == reference and codec.loads(encoded) == reference and json.loads(encoded) == reference
+            load_seconds = best_seconds(lambda: codec.loads(data), repeats)
+            dump_seconds = best_seconds(lambda: codec.dumps(payload), repeats)
+            print(f"{os.path.basename(file_path):<36}{name:<10}{len(encoded):>8}{load_seconds * 1000:>10.3f}"
+                  f"{dump_seconds * 1000:>10.3f}{'equal' if equal else 'DIFFERENT':>12}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="JSON backends of the scripts")
+    parser.add_argument("files", nargs="+", help="raw responses, e.g. weather_data/WeinheimerStr_55.json")
+    parser.add_argument("--repeats", type=int, default=200, help="repetitions (default 200)")
+    args = parser.parse_args()
+    benchmark(args.files, args.repeats)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,114 @@
+# Load test of the fetch stage against the stand-in server of _mock_owm_server.py
+# Runs the batch fetch of 000_B (fetch_all) for 10, 100 and 1000 synthetic locations, half of them with a local
+# sensor, and reports per size: requests per second, p50/p99 latency of the One Call responses, and how many
+# locations failed, with their errors. Nothing is sent to OpenWeatherMap, the files go to a temporary directory.
+#
+#   python3 _load_test.py                                    default: 10, 100 and 1000 locations, 8 at a time
+#   python3 _load_test.py --sizes 100 --concurrency 16 --latency-ms 120 --jitter-ms 60 --error-rate 0.05
+#   python3 _load_test.py --sizes 50 --timeout-rate 0.1 --request-timeout 1    client timeouts, 1s instead of 10s
+# The server options are those of _mock_owm_server.py.
+
+import argparse
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+
+from _mock_owm_server import add_behaviour_arguments, behaviour_from_arguments, start_server
+from _stage_graph import import_stage
+
+
+def synthetic_locations(count, sensor_share, sensor_url, rng):
+    # Spread over Baden-Württemberg, far enough apart not to share a fetch cache entry
+    locations = {}
+    for index in range(count):
+        location = f"LoadTest_{index:04d}"
+        locations[location] = {
+            "lat": round(rng.uniform(47.6, 49.8), 5), "lon": round(rng.uniform(7.5, 10.5), 5),
+            "time_zone": "CET", "units": "metric", "lang": "de", "running_period": "each_start",
+            "store_all_responses": "no", "local_api": "yes" if rng.random() < sensor_share else "no",
+        }
+        os.environ[f"{location}_url"] = f"{sensor_url}/{location}"
+    return locations
+
+
+def percentile(sorted_values, share):
+    if not sorted_values:
+        return float("nan")
+    return sorted_values[min(len(sorted_values) - 1, int(share * len(sorted_values)))]
+
+
+def run_size(fetch_module, count, args, sensor_url, logger):
+    locations = synthetic_locations(count, args.sensor_share, sensor_url, random.Random(count))
+    with tempfile.TemporaryDirectory() as weather_data_path:
+        start = time.perf_counter()
+        fetched, _ = fetch_module.fetch_all(
+            locations, logger, args.concurrency, calls_per_minute=0, cache_ttl_seconds=0, cache_max_stale_seconds=0,
+            weather_data_path=weather_data_path,
+        )
+        seconds = time.perf_counter() - start
+    sensors = sum(1 for config in locations.values() if config["local_api"] == "yes")
+    latencies = sorted(metrics["http_latency_s"] for _, metrics in fetched.values() if "http_latency_s" in metrics)
+    failed = [location for location, (ok, _) in fetched.items() if not ok]
+    requests_sent = count + sensors
+    return {
+        "locations": count, "requests": requests_sent, "seconds": seconds, "rps": requests_sent / seconds,
+        "p50_ms": percentile(latencies, 0.50) * 1000, "p99_ms": percentile(latencies, 0.99) * 1000,
+        "failed": len(failed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the 000_B batch fetch against a local stand-in server")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="numbers of locations (default 10 100 1000)")
+    parser.add_argument("--concurrency", type=int, default=8, help="requests in flight at the same time (default 8)")
+    parser.add_argument("--sensor-share", type=float, default=0.5, help="share of locations with a local sensor (default 0.5)")
+    parser.add_argument("--request-timeout", type=float, default=None,
+                        help="client timeout in seconds instead of the 10s of 000_B, to keep --timeout-rate runs short")
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+
+    # The failed requests are counted below, not logged one by one
+    logger = logging.getLogger("load_test")
+    logger.setLevel(logging.ERROR)
+    logger.propagate = False
+    errors = Counter()
+
+    class ErrorCounter(logging.Handler):
+        def emit(self, record):
+            message = record.getMessage()
+            if not message.startswith("xxxx"):
+                errors[message.split(":")[0]] += 1
+
+    logger.addHandler(ErrorCounter(level=logging.ERROR))
+
+    server = start_server(behaviour_from_arguments(args))
+    host, port = server.server_address[:2]
+    os.environ.setdefault("OPENWEATHERMAP_ONE_CALL_API30_KEY", "load-test")
+    os.environ["OPENWEATHERMAP_ONE_CALL_URL"] = f"http://{host}:{port}/data/3.0/onecall"
+    fetch_module = import_stage("000_B_Perform_one_call.py")
+    if args.request_timeout is not None:
+        fetch_module.REQUEST_TIMEOUT_SECONDS = args.request_timeout
+
+    print(f"Stand-in server on port {port}: latency {args.latency_ms}±{args.jitter_ms} ms, "
+          f"errors {args.error_rate:.0%}, timeouts {args.timeout_rate:.0%}, {args.concurrency} requests at a time")
+    print(f"{'locations':>10}{'requests':>10}{'seconds':>10}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'failed':>8}")
+    try:
+        for count in args.sizes:
+            result = run_size(fetch_module, count, args, f"http://{host}:{port}/sensor", logger)
+            print(f"{result['locations']:>10}{result['requests']:>10}{result['seconds']:>10.2f}{result['rps']:>10.1f}"
+                  f"{result['p50_ms']:>10.1f}{result['p99_ms']:>10.1f}{result['failed']:>8}")
+    finally:
+        server.shutdown()
+    if errors:
+        print("Errors handled:")
+        for error, count in errors.most_common():
+            print(f"  {count:>6}  {error}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
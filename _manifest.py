@@ -0,0 +1,152 @@
+# Change detection for _controller.py
+# For every location the manifest <WeinheimerStr_55>_manifest.json in weather_data keeps, per script,
+#   "inputs":  a hash of each input file of the script (see _stage_graph.py), of the script itself,
+#              of the project modules it imports ("modules") and of the location's entry in locations.json
+#   "outputs": a hash of each output file, as written by the last successful run of the script
+# A script with input files is skipped when none of its input hashes changed and its outputs are still the ones
+# it wrote, e.g. when OpenWeatherMap returned the same data as in the previous call.
+# 000_B has no input files and always runs. The _controller option --force runs everything.
+# "modules" covers the _*.py modules of this directory the script imports, directly or through another of them
+# (e.g. 030_B -> _forecast_columns.py -> _time_format.py), found from the import statements. An edit to such a
+# module runs the scripts using it again. Modules imported inside a function are covered as well, modules
+# imported by name at runtime (import_stage, importlib) are not.
+
+import ast
+import hashlib
+import json
+import os
+import threading
+import _json_codec as json_codec
+
+PROJECT_PATH = os.path.dirname(os.path.abspath(__file__))
+
+_module_cache = {}  # file path: ((mtime_ns, size), hash, names of the project modules it imports)
+_module_cache_lock = threading.Lock()
+
+
+def file_hash(file_path):
+    # None for a file that does not exist, e.g. <LOCATION>_urlResponse.json without local API
+    if not os.path.exists(file_path):
+        return None
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for chunk in iter(lambda: file.read(65536), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def imported_project_modules(source):
+    # Names of the _*.py modules of this directory imported by the source, e.g. ["_forecast_columns"]
+    names = set()
+    for node in ast.walk(ast.parse(source)):
+        if isinstance(node, ast.Import):
+            names.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom) and node.module and not node.level:
+            names.add(node.module)
+    return sorted(name for name in names
+                  if name.startswith("_") and os.path.exists(os.path.join(PROJECT_PATH, f"{name}.py")))
+
+
+def module_info(file_path):
+    # (hash, imported project modules) of a script or module, read again only when the file changed
+    stat = os.stat(file_path)
+    key = (stat.st_mtime_ns, stat.st_size)
+    with _module_cache_lock:
+        cached = _module_cache.get(file_path)
+    if cached is not None and cached[0] == key:
+        return cached[1], cached[2]
+    with open(file_path, 'rb') as file:
+        source = file.read()
+    info = (hashlib.sha256(source).hexdigest(), imported_project_modules(source))
+    with _module_cache_lock:
+        _module_cache[file_path] = (key, *info)
+    return info
+
+
+def modules_hash(script_path):
+    # One hash over the project modules the script imports, directly or indirectly
+    hashes = {}
+    pending = list(module_info(script_path)[1])
+    while pending:
+        name = pending.pop()
+        if name in hashes:
+            continue
+        hashes[name], imported = module_info(os.path.join(PROJECT_PATH, f"{name}.py"))
+        pending.extend(imported)
+    return hashlib.sha256(json.dumps(hashes, sort_keys=True).encode('utf-8')).hexdigest()
+
+
+class StageManifest:
+    def __init__(self, location, location_config, weather_data_path, logger):
+        self.location = location
+        self.weather_data_path = weather_data_path
+        self.logger = logger
+        self.manifest_file_path = os.path.join(weather_data_path, f"{location}_manifest.json")
+        # The json module and not _json_codec.py, the hash must not change with the installed JSON backend
+        self.config_hash = hashlib.sha256(json.dumps(location_config, sort_keys=True).encode('utf-8')).hexdigest()
+        self.entries = self.load()
+        self.hits = []    # Scripts skipped because nothing changed
+        self.misses = []  # Scripts with input files that had to run
+        self._lock = threading.Lock()
+
+    def load(self):
+        try:
+            with open(self.manifest_file_path, 'rb') as file:
+                return json_codec.loads(file.read())
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            self.logger.warning(f"Ignoring unreadable manifest {self.manifest_file_path}: {e}")
+            return {}
+
+    def save(self):
+        # Write to a temporary file first, a crash must not leave a truncated manifest behind
+        temp_file_path = f"{self.manifest_file_path}.tmp"
+        try:
+            with self._lock:
+                with open(temp_file_path, 'wb') as file:
+                    file.write(json_codec.dumps(self.entries, indent=True, sort_keys=True))
+            os.replace(temp_file_path, self.manifest_file_path)
+        except OSError as e:
+            self.logger.error(f"Error writing manifest {self.manifest_file_path}: {e}")
+
+    def file_path(self, file_pattern):
+        return os.path.join(self.weather_data_path, file_pattern.format(location=self.location))
+
+    def input_hashes(self, script, stage):
+        hashes = {input_file: file_hash(self.file_path(input_file)) for input_file in stage["inputs"]}
+        script_path = os.path.join(PROJECT_PATH, script)
+        hashes["script"] = file_hash(script_path)
+        hashes["modules"] = modules_hash(script_path)
+        hashes["config"] = self.config_hash
+        return hashes
+
+    def output_hashes(self, stage):
+        return {output_file: file_hash(self.file_path(output_file)) for output_file in stage["outputs"]}
+
+    def is_up_to_date(self, script, stage):
+        # Also counts the hit or miss for the run summary
+        if not stage["inputs"]:
+            return False
+        with self._lock:
+            entry = self.entries.get(script)
+        up_to_date = (
+            entry is not None
+            and entry.get("inputs") == self.input_hashes(script, stage)
+            and entry.get("outputs") == self.output_hashes(stage)
+        )
+        with self._lock:
+            (self.hits if up_to_date else self.misses).append(script)
+        return up_to_date
+
+    def record(self, script, stage, ok):
+        # A failed script is forgotten, so that it runs again next time
+        if not stage["inputs"]:
+            return
+        if ok:
+            entry = {"inputs": self.input_hashes(script, stage), "outputs": self.output_hashes(stage)}
+        with self._lock:
+            if ok:
+                self.entries[script] = entry
+            else:
+                self.entries.pop(script, None)
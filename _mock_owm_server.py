@@ -0,0 +1,195 @@
+# Local stand-in for the OpenWeatherMap One Call 3.0 API and the local temperature sensors
+# For testing and load testing the fetch stage (000_B, 000_C) without using the API quota, see _load_test.py.
+#   GET /data/3.0/onecall?lat=..&lon=..&units=..&lang=..&exclude=..&appid=..   One Call payload
+#   GET /sensor/<name>                                                        {"temperatureInC": ...}
+# The payloads have the structure and the value ranges of real responses (current, minutely 61, hourly 48,
+# daily 8, alerts), the blocks in "exclude" are left out. Every request can be slowed down or made to fail:
+#   --latency-ms, --jitter-ms   delay before the answer
+#   --error-rate                share of requests answered with HTTP 500 (or 429 for the One Call, see --rate-limited)
+#   --timeout-rate              share of requests answered only after --hang-seconds, to trigger client timeouts
+#   --hours, --minutes          number of hourly and minutely entries, for larger or smaller payloads
+#
+# Start it and point 000_B at it:
+#   python3 _mock_owm_server.py --port 8765 --latency-ms 80 --error-rate 0.02
+#   OPENWEATHERMAP_ONE_CALL_URL=http://127.0.0.1:8765/data/3.0/onecall python3 000_B_Perform_one_call.py WeinheimerStr_55
+#   WeinheimerStr_55_url=http://127.0.0.1:8765/sensor/WeinheimerStr_55
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+WEATHER = [
+    {"id": 800, "main": "Clear", "description": "klarer Himmel", "icon": "01d"},
+    {"id": 803, "main": "Clouds", "description": "überwiegend bewölkt", "icon": "04d"},
+    {"id": 500, "main": "Rain", "description": "Leichter Regen", "icon": "10d"},
+]
+
+
+class MockBehaviour:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, error_rate=0.0, rate_limited=0.0, timeout_rate=0.0,
+                 hang_seconds=15.0, hours=48, minutes=61):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limited = rate_limited
+        self.timeout_rate = timeout_rate
+        self.hang_seconds = hang_seconds
+        self.hours = hours
+        self.minutes = minutes
+
+
+def one_call_payload(lat, lon, exclude, behaviour, rng):
+    now = int(time.time())
+    hour = now // 3600 * 3600
+    minute = now // 60 * 60
+
+    def conditions(temperature):
+        return {
+            "temp": round(temperature, 2), "feels_like": round(temperature - rng.uniform(0, 3), 2),
+            "pressure": rng.randint(995, 1035), "humidity": rng.randint(30, 100),
+            "dew_point": round(temperature - rng.uniform(2, 8), 2), "uvi": round(rng.uniform(0, 6), 2),
+            "clouds": rng.randint(0, 100), "visibility": 10000, "wind_speed": round(rng.uniform(0, 12), 2),
+            "wind_deg": rng.randint(0, 359), "wind_gust": round(rng.uniform(0, 18), 2), "weather": [rng.choice(WEATHER)],
+        }
+
+    base = rng.uniform(-5, 25)
+    payload = {"lat": round(lat, 4), "lon": round(lon, 4), "timezone": "Europe/Berlin", "timezone_offset": 7200}
+    if "current" not in exclude:
+        payload["current"] = {"dt": now, "sunrise": hour - 20000, "sunset": hour + 20000, **conditions(base)}
+    if "minutely" not in exclude:
+        payload["minutely"] = [
+            {"dt": minute + 60 * i, "precipitation": round(max(0.0, rng.gauss(0.2, 0.5)), 2)} for i in range(behaviour.minutes)
+        ]
+    if "hourly" not in exclude:
+        payload["hourly"] = []
+        for i in range(behaviour.hours):
+            entry = {"dt": hour + 3600 * i, **conditions(base + 4 * rng.uniform(-1, 1)), "pop": round(rng.random(), 2)}
+            if rng.random() < 0.3:
+                entry["rain"] = {"1h": round(rng.uniform(0.1, 3), 2)}
+            payload["hourly"].append(entry)
+    if "daily" not in exclude:
+        payload["daily"] = [
+            {
+                "dt": hour + 86400 * i, "sunrise": hour - 20000 + 86400 * i, "sunset": hour + 20000 + 86400 * i,
+                "moonrise": hour + 86400 * i, "moonset": hour + 40000 + 86400 * i, "moon_phase": round(rng.random(), 2),
+                "summary": "Expect a day of partly cloudy with rain",
+                "temp": {"day": round(base, 2), "min": round(base - 5, 2), "max": round(base + 5, 2),
+                         "night": round(base - 3, 2), "eve": round(base + 1, 2), "morn": round(base - 2, 2)},
+                "feels_like": {"day": round(base - 1, 2), "night": round(base - 4, 2), "eve": round(base, 2), "morn": round(base - 3, 2)},
+                **{key: value for key, value in conditions(base).items() if key not in ("temp", "feels_like", "visibility")},
+                "pop": round(rng.random(), 2),
+            }
+            for i in range(8)
+        ]
+    if "alerts" not in exclude and rng.random() < 0.1:
+        payload["alerts"] = [{
+            "sender_name": "Deutscher Wetterdienst", "event": "STURMBÖEN", "start": hour, "end": hour + 3 * 3600,
+            "description": "Es treten Sturmböen mit Geschwindigkeiten um 70 km/h auf.", "tags": ["Wind"],
+        }]
+    return payload
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # Keep-alive, as the real API
+    behaviour = MockBehaviour()
+    rng = random.Random(0)
+    rng_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass  # One line per request would drown the load test output
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        try:
+            self.wfile.write(data)
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # The client gave up, e.g. after its timeout
+
+    def do_GET(self):
+        behaviour = self.behaviour
+        with self.rng_lock:
+            roll = self.rng.random()
+            delay = max(0.0, behaviour.latency_ms + self.rng.uniform(-behaviour.jitter_ms, behaviour.jitter_ms)) / 1000
+            seed = self.rng.random()
+        url = urlparse(self.path)
+        if roll < behaviour.timeout_rate:
+            time.sleep(behaviour.hang_seconds)
+        else:
+            time.sleep(delay)
+        failing = behaviour.timeout_rate <= roll < behaviour.timeout_rate + behaviour.error_rate
+
+        if url.path == "/data/3.0/onecall":
+            query = parse_qs(url.query)
+            if "lat" not in query or "lon" not in query or "appid" not in query:
+                self.send_json(400, {"cod": "400", "message": "Nothing to geocode"})
+            elif failing:
+                rate_limited = random.Random(seed).random() < behaviour.rate_limited
+                self.send_json(429 if rate_limited else 500, {"cod": 429 if rate_limited else 500, "message": "mock failure"})
+            else:
+                exclude = set(",".join(query.get("exclude", [])).split(","))
+                payload = one_call_payload(float(query["lat"][0]), float(query["lon"][0]), exclude, behaviour, random.Random(seed))
+                self.send_json(200, payload)
+        elif url.path.startswith("/sensor/"):
+            if failing:
+                self.send_json(500, {"error": "mock failure"})
+            else:
+                self.send_json(200, {"temperatureInC": round(random.Random(seed).uniform(-5, 30), 1)})
+        else:
+            self.send_json(404, {"cod": "404", "message": "Internal error"})
+
+
+def start_server(behaviour, host="127.0.0.1", port=0):
+    # Serves in a background thread, returns the server, server.server_address has the port actually used
+    handler = type("ConfiguredMockHandler", (MockHandler,), {"behaviour": behaviour, "rng": random.Random(0)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def add_behaviour_arguments(parser):
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="delay of every answer (default 0)")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="random variation of the delay (default 0)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of HTTP 500/429 answers (default 0)")
+    parser.add_argument("--rate-limited", type=float, default=0.0,
+                        help="share of the One Call errors answered with 429 instead of 500 (default 0)")
+    parser.add_argument("--timeout-rate", type=float, default=0.0,
+                        help="share of requests answered only after --hang-seconds (default 0)")
+    parser.add_argument("--hang-seconds", type=float, default=15.0, help="delay of the timed out requests (default 15)")
+    parser.add_argument("--hours", type=int, default=48, help="hourly entries per payload (default 48)")
+    parser.add_argument("--minutes", type=int, default=61, help="minutely entries per payload (default 61)")
+
+
+def behaviour_from_arguments(args):
+    return MockBehaviour(
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, error_rate=args.error_rate,
+        rate_limited=args.rate_limited, timeout_rate=args.timeout_rate, hang_seconds=args.hang_seconds,
+        hours=args.hours, minutes=args.minutes,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the One Call 3.0 API and the local sensors")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_behaviour_arguments(parser)
+    args = parser.parse_args()
+    server = start_server(behaviour_from_arguments(args), args.host, args.port)
+    host, port = server.server_address[:2]
+    print(f"One Call stand-in on http://{host}:{port}/data/3.0/onecall, sensors on http://{host}:{port}/sensor/<name>")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
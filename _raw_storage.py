@@ -0,0 +1,119 @@
+# Storage of the raw API responses (<WeinheimerStr_55>.json, <WeinheimerStr_55>_urlResponse.json)
+# write_raw is used by 000_B, 001_B and 000_C, read_raw by _weather_documents.py, through which the stages read the raw responses.
+#   - compact JSON, without the indent=4 of before
+#   - optionally compressed, RAW_COMPRESSION "none" (default), "gzip" or "zstd" (needs the zstandard package),
+#     also set with the environment variable WEATHER_RAW_COMPRESSION
+#   - written to a temporary file and renamed, so a crash never leaves a truncated file behind
+# The file names do not change. read_raw recognises the compression from the first bytes of the file, so files
+# written with another setting, or with indent=4 by an older version, are still read. It returns the same dict
+# as json.load. The JSON itself is encoded and decoded by _json_codec.py.
+#
+# Benchmark of the file size and the read time of each format for an existing response:
+#   python3 _raw_storage.py --benchmark weather_data/WeinheimerStr_55.json
+
+import argparse
+import gzip
+import json
+import os
+import tempfile
+import time
+import _json_codec as json_codec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+RAW_COMPRESSION = os.environ.get("WEATHER_RAW_COMPRESSION", "none")
+
+GZIP_MAGIC = b'\x1f\x8b'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+
+def encode_raw(payload, compression):
+    data = json_codec.dumps(payload)
+    if compression == "gzip":
+        # mtime=0 keeps the bytes identical for identical payloads, see _manifest.py
+        return gzip.compress(data, compresslevel=6, mtime=0)
+    if compression == "zstd":
+        if zstandard is None:
+            raise ValueError("RAW_COMPRESSION is 'zstd' but the zstandard package is not installed")
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if compression != "none":
+        raise ValueError(f"Unknown RAW_COMPRESSION '{compression}', use 'none', 'gzip' or 'zstd'")
+    return data
+
+
+def decode_raw(data):
+    if data.startswith(GZIP_MAGIC):
+        data = gzip.decompress(data)
+    elif data.startswith(ZSTD_MAGIC):
+        if zstandard is None:
+            raise ValueError("The file is zstd compressed but the zstandard package is not installed")
+        data = zstandard.ZstdDecompressor().decompressobj().decompress(data)
+    return json_codec.loads(data)
+
+
+def write_raw(file_path, payload, compression=None):
+    data = encode_raw(payload, compression or RAW_COMPRESSION)
+    directory = os.path.dirname(os.path.abspath(file_path))
+    file_descriptor, temp_file_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(file_path)}.", suffix=".tmp")
+    try:
+        with os.fdopen(file_descriptor, 'wb') as file:
+            file.write(data)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_file_path, file_path)
+    except BaseException:
+        if os.path.exists(temp_file_path):
+            os.remove(temp_file_path)
+        raise
+    return len(data)
+
+
+def read_raw(file_path):
+    # Raises FileNotFoundError, and json.JSONDecodeError (a ValueError) for a damaged file, like json.load
+    with open(file_path, 'rb') as file:
+        return decode_raw(file.read())
+
+
+def benchmark(file_path, repeats):
+    payload = read_raw(file_path)
+    formats = [("indent=4 (before)", None), ("compact", "none"), ("gzip", "gzip")]
+    if zstandard is not None:
+        formats.append(("zstd", "zstd"))
+    else:
+        print("zstandard is not installed, zstd is left out")
+
+    print(f"{file_path}, best of {repeats}")
+    print(f"{'format':<20}{'bytes':>10}{'write ms':>10}{'read ms':>10}")
+    with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(file_path))) as directory:
+        test_file_path = os.path.join(directory, "payload.json")
+        for name, compression in formats:
+            write_seconds, read_seconds = [], []
+            for _ in range(repeats):
+                start = time.perf_counter()
+                if compression is None:
+                    with open(test_file_path, 'w') as file:
+                        json.dump(payload, file, indent=4)
+                else:
+                    write_raw(test_file_path, payload, compression)
+                write_seconds.append(time.perf_counter() - start)
+                start = time.perf_counter()
+                assert read_raw(test_file_path) == payload
+                read_seconds.append(time.perf_counter() - start)
+            size = os.path.getsize(test_file_path)
+            print(f"{name:<20}{size:>10}{min(write_seconds) * 1000:>10.2f}{min(read_seconds) * 1000:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Storage of the raw API responses")
+    parser.add_argument("--benchmark", metavar="FILE", required=True,
+                        help="compare size, write and read time of the formats for the response in FILE")
+    parser.add_argument("--repeats", type=int, default=20, help="repetitions per format (default 20)")
+    args = parser.parse_args()
+    benchmark(args.benchmark, args.repeats)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,197 @@
+# Pool of pre-warmed worker processes for the plotting scripts (010_B, 025_B, 035_B, 036_B)
+# Used by _controller.py --render-workers N in the in-process mode.
+#
+# The workers are started from a forkserver which has already imported matplotlib and pandas, so a new worker
+# does not pay these imports again. Each worker then selects the Agg backend, imports the plotting scripts and
+# renders one small figure to initialise the font cache and the JPEG writer, before the first real job arrives.
+# warm() starts all workers at once: each warm-up job waits at a barrier until every worker runs one, so no worker
+# can take two of them and leave another one unstarted.
+# A worker is replaced after --render-max-jobs jobs to bound its memory (Python 3.11 and newer). The executor has one
+# limit for all workers and only the first workers get a warm-up job of warm(), which counts as one of their jobs:
+# they are replaced after one real job less, the workers replacing them after --render-max-jobs real jobs. No worker
+# runs more. With --render-max-jobs 1 warm() does nothing, a warmed worker would be replaced before its first job.
+# On Windows, which has no forkserver, the workers are spawned instead.
+#
+# Benchmark of the time to the first rendered JPEG, cold (python3 script.py LOCATION) and warm (pool job):
+#   python3 _render_pool.py --benchmark WeinheimerStr_55
+# The JSON, .txt and .npz files of the location must exist in weather_data.
+
+import argparse
+import io
+import logging
+import multiprocessing
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from _stage_graph import import_stage
+from _trace import add_metrics, cpu_seconds, peak_rss_kb
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+# Imported once by the forkserver, every worker inherits them
+HEAVY_MODULES = ["matplotlib", "matplotlib.pyplot", "matplotlib.dates", "pandas"]
+
+PLOTTING_SCRIPTS = [
+    "010_B_Decode_current_weather.py",
+    "025_B_Plot_precipitation.py",
+    "035_B_Plot_temperature.py",
+    "036_B_Plot_HCP.py",
+]
+
+WARM_UP_TIMEOUT_SECONDS = 120
+
+# Scripts imported by this worker process
+_worker_modules = {}
+# Barrier of the warm-up jobs, shared by all workers of the pool
+_warm_up_barrier = None
+
+
+def warm_up_worker(script_names, warm_up_barrier):
+    global _warm_up_barrier
+    _warm_up_barrier = warm_up_barrier
+    os.environ["MPLBACKEND"] = "Agg"
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    import pandas  # noqa: F401  Imported here in the spawn case, already loaded by the forkserver otherwise
+
+    for script_name in script_names:
+        _worker_modules[script_name] = import_stage(script_name)
+
+    # First savefig loads the fonts and the JPEG writer
+    plt.figure(figsize=(1, 1))
+    plt.text(0.5, 0.5, "warm-up")
+    plt.savefig(io.BytesIO(), format='jpeg')
+    plt.close()
+
+
+def render_job(script_name, location):
+    # Runs in a worker, returns (ok, error message, CPU and memory of the worker for the _trace.py record)
+    who = resource.RUSAGE_SELF if resource else None
+    start_cpu = cpu_seconds(who)
+    module = _worker_modules.get(script_name)
+    if module is None:
+        module = _worker_modules[script_name] = import_stage(script_name)
+    stage_logger = logging.getLogger(os.path.splitext(script_name)[0])
+    stage_logger.setLevel(logging.FATAL)
+    ok, error = True, None
+    try:
+        module.run(location, stage_logger)
+    except SystemExit as e:
+        # The scripts report their errors with sys.exit(1)
+        if e.code:
+            ok, error = False, f"exit code {e.code}"
+    except Exception as e:
+        ok, error = False, str(e)
+    metrics = {"cpu_s": round(cpu_seconds(who) - start_cpu, 4), "peak_rss_kb": peak_rss_kb(who), "render_worker": os.getpid(),
+               "cpu_scope": "worker", "rss_scope": "worker"}
+    return ok, error, metrics
+
+
+def wait_for_all_workers():
+    # The warm-up job of warm(): the pool starts a new worker for every job submitted while the others are busy
+    _warm_up_barrier.wait(timeout=WARM_UP_TIMEOUT_SECONDS)
+    return os.getpid()
+
+
+class RenderPool:
+    def __init__(self, workers, max_jobs_per_worker, logger, script_names=PLOTTING_SCRIPTS):
+        self.workers = workers
+        self.logger = logger
+        # Must be set before the forkserver imports pyplot
+        os.environ.setdefault("MPLBACKEND", "Agg")
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(HEAVY_MODULES)
+        else:
+            context = multiprocessing.get_context("spawn")
+        # Synchronisation primitives reach the workers only through the initializer arguments
+        self.warm_up_barrier = context.Barrier(workers)
+        executor_kwargs = {}
+        self.max_jobs_per_worker = max_jobs_per_worker
+        if sys.version_info >= (3, 11):
+            executor_kwargs["max_tasks_per_child"] = max_jobs_per_worker
+        else:
+            logger.warning("Render workers are only recycled with Python 3.11 or newer")
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=warm_up_worker,
+            initargs=(tuple(script_names), self.warm_up_barrier),
+            **executor_kwargs,
+        )
+
+    def warm(self):
+        # Start all workers now rather than on the first job. Call it once, right after creating the pool.
+        if self.max_jobs_per_worker < 2 and sys.version_info >= (3, 11):
+            return
+        start = time.perf_counter()
+        futures = [self.executor.submit(wait_for_all_workers) for _ in range(self.workers)]
+        try:
+            pids = {future.result() for future in futures}
+        except Exception as e:
+            # E.g. a worker did not start within WARM_UP_TIMEOUT_SECONDS, the others start on their first job
+            self.logger.warning(f"Render workers not all warmed up: {e}")
+            return
+        self.logger.info(f"{len(pids)} render worker(s) ready in {time.perf_counter() - start:.2f}s")
+
+    def run(self, script_name, location, logger):
+        try:
+            ok, error, metrics = self.executor.submit(render_job, script_name, location).result()
+            add_metrics(**metrics)
+        except Exception as e:
+            ok, error = False, str(e)
+        if ok:
+            logger.info(f"Successfully ran {script_name} for {location} in a render worker")
+        else:
+            logger.error(f"Error running {script_name} for {location} in a render worker: {error}")
+            logger.error("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
+        return ok
+
+    def shutdown(self):
+        self.executor.shutdown()
+
+
+def benchmark(location, logger):
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    print(f"Time to first render for {location}, seconds")
+    print(f"{'script':<36}{'cold':>8}{'warm':>8}")
+
+    cold = {}
+    for script_name in PLOTTING_SCRIPTS:
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.join(script_dir, script_name), location], check=True)
+        cold[script_name] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    pool = RenderPool(1, 1000, logger)
+    pool.warm()
+    pool_start_seconds = time.perf_counter() - start
+    try:
+        for script_name in PLOTTING_SCRIPTS:
+            start = time.perf_counter()
+            pool.run(script_name, location, logger)
+            warm = time.perf_counter() - start
+            print(f"{script_name:<36}{cold[script_name]:>8.3f}{warm:>8.3f}")
+    finally:
+        pool.shutdown()
+    print(f"One-off pool start and warm-up: {pool_start_seconds:.3f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-warmed render workers for the plotting scripts")
+    parser.add_argument("--benchmark", metavar="LOCATION", required=True,
+                        help="compare the cold and the warm time to the first render for LOCATION")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s %(levelname)s: %(message)s')
+    benchmark(args.benchmark, logging.getLogger())
+
+
+if __name__ == "__main__":
+    main()
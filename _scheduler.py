@@ -0,0 +1,111 @@
+# Internal scheduler for the _controller daemon mode (_controller.py --daemon)
+# Instead of being started by the Synology Task Scheduler, the _controller stays resident and keeps the scripts
+# imported. Every location gets run slots according to its "running_period" in locations.json:
+#   "each_start":     every --interval minutes (aligned to midnight), and once right after the daemon starts
+#   "full_hour_only": at every full hour
+#   "no_run":         never
+# An optional "period_minutes" in the location's entry overrides the period of "each_start" and "full_hour_only".
+#
+# A run is started with time_now set to its slot time, not to the moment it actually starts. So the checks of
+# _controller.py, such as 005_B only at the full hour, see the slot and no longer depend on a 30 second window.
+# Catch-up: if the daemon wakes up late (busy or suspended NAS), all missed slots of a location are combined
+# into one run. That run uses the latest missed full-hour slot if there is one, so that 005_B still logs,
+# otherwise the latest missed slot. Slots more than --catch-up minutes in the past are dropped and logged.
+
+import heapq
+from datetime import datetime, timedelta
+
+
+def location_period(location_config, interval_minutes):
+    # Period in minutes, or None if the location never runs
+    running_period = location_config.get("running_period", "")
+    if running_period == "each_start":
+        period = interval_minutes
+    elif running_period == "full_hour_only":
+        period = 60
+    else:
+        return None
+    return int(location_config.get("period_minutes", period))
+
+
+def next_slot(after, period_minutes):
+    # First slot strictly after "after", slots are multiples of the period counted from midnight
+    midnight = after.replace(hour=0, minute=0, second=0, microsecond=0)
+    elapsed_minutes = (after - midnight) // timedelta(minutes=1)
+    slot = midnight + timedelta(minutes=(elapsed_minutes // period_minutes + 1) * period_minutes)
+    return slot
+
+
+def is_full_hour(slot):
+    return slot.minute == 0 and slot.second == 0
+
+
+class LocationScheduler:
+    def __init__(self, locations_config, interval_minutes, catch_up_minutes, logger, start_time=None):
+        self.locations_config = locations_config
+        self.catch_up = timedelta(minutes=catch_up_minutes)
+        self.logger = logger
+        self.periods = {}
+        self.queue = []  # (slot, location), the earliest slot first
+        start_time = start_time or datetime.now()
+        for location, config in locations_config.items():
+            period = location_period(config, interval_minutes)
+            if period is None:
+                logger.info(f"Skipping {location} as its running_period is '{config.get('running_period', '')}'.")
+                continue
+            self.periods[location] = period
+            if config.get("running_period") == "each_start":
+                first_slot = start_time
+            else:
+                first_slot = next_slot(start_time, period)
+            heapq.heappush(self.queue, (first_slot, location))
+
+    def next_wakeup(self):
+        return self.queue[0][0] if self.queue else None
+
+    def due_runs(self, now):
+        # Pop every location whose slot has come, reschedule it, and return {slot time: [locations]}
+        runs = {}
+        while self.queue and self.queue[0][0] <= now:
+            slot, location = heapq.heappop(self.queue)
+            period = self.periods[location]
+            # All slots of this location up to now, the queued one included, were missed or are due
+            missed = [slot]
+            following = next_slot(slot, period)
+            while following <= now:
+                missed.append(following)
+                following = next_slot(following, period)
+            heapq.heappush(self.queue, (following, location))
+
+            recent = [missed_slot for missed_slot in missed if now - missed_slot <= self.catch_up]
+            if len(recent) < len(missed):
+                self.logger.warning(
+                    f"{location}: dropped {len(missed) - len(recent)} slot(s) older than the catch-up limit, "
+                    f"the oldest at {missed[0]:%d.%m.%Y %H:%M}"
+                )
+            if not recent:
+                continue
+            full_hours = [recent_slot for recent_slot in recent if is_full_hour(recent_slot)]
+            run_slot = full_hours[-1] if full_hours else recent[-1]
+            if len(recent) > 1:
+                self.logger.info(f"{location}: {len(recent)} missed slots combined into one run for {run_slot:%H:%M}")
+            runs.setdefault(run_slot, []).append(location)
+        return dict(sorted(runs.items()))
+
+
+def run_daemon(scheduler, run_slot, stop_event, logger):
+    # run_slot(slot_time, locations) runs the scripts for the locations, stop_event ends the loop
+    logger.info("Daemon started")
+    while not stop_event.is_set():
+        wakeup = scheduler.next_wakeup()
+        if wakeup is None:
+            logger.info("No location to run, daemon stops")
+            break
+        wait_seconds = (wakeup - datetime.now()).total_seconds()
+        if wait_seconds > 0 and stop_event.wait(wait_seconds):
+            break
+        for slot, locations in scheduler.due_runs(datetime.now()).items():
+            if stop_event.is_set():
+                break
+            run_slot(slot, locations)
+    logger.info("Daemon stopped")
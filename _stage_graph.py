@@ -0,0 +1,199 @@
+# Stage graph used by _controller.py
+# Each script lists the files it reads ("inputs") and writes ("outputs"), {location} is replaced by the LOCATION.
+# A script depends on every script that writes one of its inputs. Inputs written by no script (or by a script
+# that is not run this time) are expected to exist already.
+#
+#   000_B --> 005_B
+#         --> 007_B --> 045_B   (also reads the history of 005_B)
+#         --> 010_B
+#         --> 020_B --> 025_B
+#         --> 030_B --> 035_B
+#                   --> 036_B
+#   001_B --> 010_B, 045_B      (the local sensor: an offline sensor does not fail 001_B, they read the last response)
+#
+# run_stage_graph starts a script as soon as all scripts it depends on have finished successfully,
+# so the minutely branch (020 -> 025) runs alongside the hourly branch (030 -> 035/036).
+# If a script fails, the scripts depending on it are not started for that location.
+# import_stage imports a script as a module, for the in-process mode of _controller.py and the _render_pool.py workers.
+#
+# "one_call_blocks" lists the blocks of the One Call response (current, minutely, hourly, daily, alerts) a script
+# reads from {location}.json. 000_B requests only the blocks read by the scripts that run for the location this
+# time, see one_call_exclude.
+# "disabled_by" ({option: value}) leaves a script out for the locations whose entry in locations.json sets the option
+# to that value, see stages_for_location.
+
+import importlib.util
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+STAGES = {
+    "000_B_Perform_one_call.py": {
+        "inputs": [],
+        "outputs": ["{location}.json"],
+    },
+    "001_B_Call_local_API.py": {
+        "inputs": [],
+        "outputs": ["{location}_urlResponse.json"],
+    },
+    "005_B_Log_API_response.py": {
+        "inputs": ["{location}.json"],
+        "outputs": ["{location}_history.sqlite", "{location}_all_responses.csv"],
+        "one_call_blocks": ["current"],
+    },
+    "007_B_Archive_forecast.py": {
+        "inputs": ["{location}.json"],
+        "outputs": ["{location}_forecast_archive.sqlite"],
+        "one_call_blocks": ["minutely", "hourly", "daily"],
+        "disabled_by": {"archive_forecasts": "no"},
+    },
+    "045_B_Verify_forecast.py": {
+        "inputs": ["{location}_forecast_archive.sqlite", "{location}_history.sqlite", "{location}_urlResponse.json"],
+        "outputs": ["{location}_verification.sqlite"],
+    },
+    "010_B_Decode_current_weather.py": {
+        "inputs": ["{location}.json", "{location}_urlResponse.json"],
+        "outputs": ["{location}_current_weather.txt", "{location}_current_weather.jpeg"],
+        "one_call_blocks": ["current"],
+    },
+    "020_B_Decode_minutely_forecast.py": {
+        "inputs": ["{location}.json"],
+        "outputs": ["{location}_minutely_forecast.txt", "{location}_minutely_forecast.npz"],
+        "one_call_blocks": ["minutely"],
+    },
+    "025_B_Plot_precipitation.py": {
+        "inputs": ["{location}_minutely_forecast.npz"],
+        "outputs": ["{location}_minutely_precipitation.jpeg"],
+    },
+    "030_B_Decode_hourly_forecast.py": {
+        "inputs": ["{location}.json"],
+        "outputs": ["{location}_hourly_forecast.txt", "{location}_hourly_forecast.npz"],
+        "one_call_blocks": ["hourly"],
+    },
+    "035_B_Plot_temperature.py": {
+        "inputs": ["{location}_hourly_forecast.npz"],
+        "outputs": ["{location}_hourly_temperature.jpeg"],
+    },
+    "036_B_Plot_HCP.py": {
+        "inputs": ["{location}_hourly_forecast.npz"],
+        "outputs": ["{location}_hourly_HPC.jpeg"],
+    },
+}
+
+
+ONE_CALL_BLOCKS = ["current", "minutely", "hourly", "daily", "alerts"]
+
+
+def stages_for_location(stages, location_config):
+    # The stages of a location, without those its options disable
+    return {
+        script: stage for script, stage in stages.items()
+        if not any(location_config.get(option) == value for option, value in stage.get("disabled_by", {}).items())
+    }
+
+
+def one_call_exclude(stages):
+    # Blocks of the One Call response not read by any of the stages, for the "exclude=" parameter
+    needed = {block for stage in stages.values() for block in stage.get("one_call_blocks", [])}
+    return [block for block in ONE_CALL_BLOCKS if block not in needed]
+
+
+def import_stage(script_name):
+    # A script such as "030_B_Decode_hourly_forecast.py" can not be imported by name, it starts with a digit
+    script_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), script_name)
+    module_name = f"stage_{os.path.splitext(script_name)[0]}"
+    spec = importlib.util.spec_from_file_location(module_name, script_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def stage_dependencies(stages):
+    # {script: set of scripts writing one of its inputs}
+    producers = {}
+    for script, stage in stages.items():
+        for output in stage["outputs"]:
+            producers[output] = script
+    dependencies = {}
+    for script, stage in stages.items():
+        dependencies[script] = {
+            producers[input_file] for input_file in stage["inputs"]
+            if input_file in producers and producers[input_file] != script
+        }
+    return dependencies
+
+
+def stage_levels(stages):
+    # Group the scripts into levels, a script only depends on scripts of the earlier levels.
+    # The number of levels is the length of the critical path of one location.
+    dependencies = stage_dependencies(stages)
+    levels = []
+    placed = set()
+    while len(placed) < len(stages):
+        level = [script for script in stages if script not in placed and dependencies[script] <= placed]
+        if not level:
+            remaining = ", ".join(script for script in stages if script not in placed)
+            raise ValueError(f"Stage graph has a cycle between: {remaining}")
+        levels.append(level)
+        placed.update(level)
+    return levels
+
+
+def run_stage_graph(stages, run_stage, stage_workers, logger):
+    # run_stage(script) runs one script and returns True if it succeeded.
+    # Returns (script, seconds, ok) for each script in the order of stages, ok is None for a script
+    # that was not started because a script it depends on failed.
+    dependencies = stage_dependencies(stages)
+    stage_levels(stages)  # Refuse a graph with a cycle before running anything
+    results = {}
+    running = {}
+
+    def timed_run(script):
+        start = time.perf_counter()
+        ok = run_stage(script)
+        return time.perf_counter() - start, ok
+
+    def next_ready():
+        # Scripts not started yet whose dependencies all succeeded, in the order of stages.
+        # Scripts with a failed or skipped dependency are recorded as skipped, which may skip further scripts.
+        ready = []
+        changed = True
+        while changed:
+            changed = False
+            for script in stages:
+                if script in results or script in ready or script in running.values():
+                    continue
+                if not dependencies[script] <= results.keys():
+                    continue
+                failed = [dependency for dependency in sorted(dependencies[script]) if not results[dependency][1]]
+                if failed:
+                    logger.info(f"Skipping {script} as {', '.join(failed)} did not succeed.")
+                    results[script] = (0.0, None)
+                    changed = True
+                else:
+                    ready.append(script)
+        return ready
+
+    if stage_workers <= 1:
+        # One script after the other
+        ready = next_ready()
+        while ready:
+            results[ready[0]] = timed_run(ready[0])
+            ready = next_ready()
+    else:
+        with ThreadPoolExecutor(max_workers=stage_workers) as executor:
+            while True:
+                for script in next_ready():
+                    running[executor.submit(timed_run, script)] = script
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    script = running.pop(future)
+                    try:
+                        results[script] = future.result()
+                    except Exception as e:
+                        logger.error(f"Error running {script}: {e}")
+                        results[script] = (0.0, False)
+
+    return [(script, *results[script]) for script in stages if script in results]
@@ -0,0 +1,142 @@
+# Local date and time strings for the Unix timestamps of the forecasts, for whole arrays at once
+#   format_timestamps(hourly['dt'], 'Europe/Berlin', '%d.%m.%Y')   ['18.10.2026', '18.10.2026', ...]
+# gives the same strings as datetime.fromtimestamp(dt, ZoneInfo(time_zone)).strftime(...) for every dt, without a
+# datetime object per timestamp:
+#   - one ZoneInfo object per time zone (time_zone)
+#   - the UTC offsets of a time zone are kept as a table of transitions per month (offset_transitions), the offset
+#     of every timestamp is looked up in it with one np.searchsorted, also across the DST changes
+#   - the strings are built once per day and per minute of the day and then picked by index
+# FORMATS lists the formats done this way. Any other format falls back to strftime per timestamp.
+#
+# Benchmark, and check against strftime, for thousands of hourly timestamps over two years (four DST changes):
+#   python3 _time_format.py
+#   python3 _time_format.py --time-zones Europe/Berlin America/New_York Australia/Lord_Howe --hours 20000
+
+import argparse
+import calendar
+import sys
+import time
+from datetime import datetime
+from functools import lru_cache
+from zoneinfo import ZoneInfo
+
+import numpy as np
+
+FORMATS = ['%d.%m.%Y', '%H:%M', '%d.%m.%Y %H:%M']
+
+SECONDS_PER_DAY = 86400
+
+# "HH:MM" of every minute of the day
+MINUTE_STRINGS = np.array([f"{minute // 60:02d}:{minute % 60:02d}" for minute in range(24 * 60)])
+
+
+@lru_cache(maxsize=None)
+def time_zone(name):
+    return ZoneInfo(name)
+
+
+def utc_offset(tz, timestamp):
+    return int(datetime.fromtimestamp(timestamp, tz).utcoffset().total_seconds())
+
+
+@lru_cache(maxsize=1024)
+def offset_transitions(name, month):
+    # (instants, offsets): from instants[i] on the offset is offsets[i] seconds, for the UTC month "month", counted
+    # in months since January 1970. The offset is sampled once a day and the second of each change found by
+    # bisection, time zones do not change their offset more than once a day.
+    tz = time_zone(name)
+    year, month_of_year = divmod(month, 12)
+    start = calendar.timegm((1970 + year, month_of_year + 1, 1, 0, 0, 0))
+    year, month_of_year = divmod(month + 1, 12)
+    end = calendar.timegm((1970 + year, month_of_year + 1, 1, 0, 0, 0))
+    instants, offsets = [start], [utc_offset(tz, start)]
+    previous = start
+    for sample in range(start + SECONDS_PER_DAY, end + SECONDS_PER_DAY, SECONDS_PER_DAY):
+        sample = min(sample, end)
+        offset = utc_offset(tz, sample)
+        if offset != offsets[-1]:
+            low, high = previous, sample  # offset of low is offsets[-1], offset of high is the new one
+            while high - low > 1:
+                middle = (low + high) // 2
+                if utc_offset(tz, middle) == offsets[-1]:
+                    low = middle
+                else:
+                    high = middle
+            instants.append(high)
+            offsets.append(offset)
+        previous = sample
+    return np.array(instants, dtype=np.int64), np.array(offsets, dtype=np.int64)
+
+
+def utc_offsets(timestamps, name):
+    # UTC offset in seconds of every timestamp
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if not timestamps.size:
+        return np.zeros(0, dtype=np.int64)
+    months = timestamps.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    tables = [offset_transitions(name, month) for month in range(int(months.min()), int(months.max()) + 1)]
+    instants = np.concatenate([instants for instants, _ in tables])
+    offsets = np.concatenate([offsets for _, offsets in tables])
+    return offsets[np.searchsorted(instants, timestamps, side='right') - 1]
+
+
+def format_timestamps(timestamps, name, date_format):
+    # List of strings, as datetime.fromtimestamp(timestamp, ZoneInfo(name)).strftime(date_format) for each timestamp
+    timestamps = np.asarray(timestamps, dtype=np.int64)
+    if date_format not in FORMATS:
+        tz = time_zone(name)
+        return [datetime.fromtimestamp(timestamp, tz).strftime(date_format) for timestamp in timestamps.tolist()]
+    local = timestamps + utc_offsets(timestamps, name)
+    days, seconds = np.divmod(local, SECONDS_PER_DAY)
+    times = MINUTE_STRINGS[seconds // 60]
+    if date_format == '%H:%M':
+        return times.tolist()
+    unique_days, day_index = np.unique(days, return_inverse=True)
+    day_strings = np.array([f"{day.day:02d}.{day.month:02d}.{day.year:04d}"
+                            for day in unique_days.astype('datetime64[D]').tolist()])
+    dates = day_strings[day_index.reshape(-1)]
+    if date_format == '%d.%m.%Y':
+        return dates.tolist()
+    return [f"{date} {time}" for date, time in zip(dates.tolist(), times.tolist())]
+
+
+def format_timestamp(timestamp, name, date_format):
+    # A single timestamp, with the cached ZoneInfo
+    return datetime.fromtimestamp(timestamp, time_zone(name)).strftime(date_format)
+
+
+def benchmark(time_zones, hours, repeats):
+    start = calendar.timegm((2025, 1, 1, 0, 0, 0))
+    timestamps = np.arange(start, start + hours * 3600, 3600, dtype=np.int64) + 17  # not on the full hour
+    print(f"{hours} hourly timestamps from 01.01.2025, best of {repeats}")
+    print(f"{'time zone':<24}{'format':<18}{'strftime ms':>12}{'vectorized ms':>15}")
+    for name in time_zones:
+        for date_format in FORMATS:
+            best_strftime, best_vectorized = float("inf"), float("inf")
+            for _ in range(repeats):
+                begin = time.perf_counter()
+                expected = [datetime.fromtimestamp(timestamp, ZoneInfo(name)).strftime(date_format)
+                            for timestamp in timestamps.tolist()]
+                best_strftime = min(best_strftime, time.perf_counter() - begin)
+                begin = time.perf_counter()
+                result = format_timestamps(timestamps, name, date_format)
+                best_vectorized = min(best_vectorized, time.perf_counter() - begin)
+                if result != expected:
+                    print(f"{name} {date_format}: differs from strftime")
+                    return 1
+            print(f"{name:<24}{date_format:<18}{best_strftime * 1000:>12.2f}{best_vectorized * 1000:>15.2f}")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Vectorized local date and time strings for Unix timestamps")
+    parser.add_argument("--time-zones", nargs="+", default=["Europe/Berlin", "America/New_York", "CET"],
+                        help="time zones to compare (default Europe/Berlin America/New_York CET)")
+    parser.add_argument("--hours", type=int, default=2 * 8760, help="number of hourly timestamps (default two years)")
+    parser.add_argument("--repeats", type=int, default=5, help="repetitions (default 5)")
+    args = parser.parse_args()
+    return benchmark(args.time_zones, args.hours, args.repeats)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,289 @@
+# Execution trace of the _controller runs
+# Every run appends JSON lines to log_files/trace.jsonl:
+#   {"type": "stage", "run_id", "time", "location", "script", "mode", "ok", "unchanged",
+#    "wall_s", "cpu_s", "cpu_scope", "peak_rss_kb", "rss_scope", "output_bytes", ...}   one per script and location
+#   {"type": "run", "run_id", "time", "mode", "wall_s", "locations", "failed_locations", "fetch_cache",
+#    "http_calls", "http_bytes", "one_call_full_bytes", "one_call_saved_bytes"}   one per run
+# "cpu_s" is the CPU time during the script of
+#   "cpu_scope": "thread"    the thread that ran the script (in-process mode), not counting the threads the script
+#                            started itself, nor the scripts and locations running alongside in other threads
+#   "cpu_scope": "children"  all finished child processes (subprocess mode), with --stage-workers or --workers
+#                            greater than 1 also those of the scripts that ran alongside
+#   "cpu_scope": "worker"    the render worker that ran the script alone (_render_pool.py)
+# "peak_rss_kb" is the peak resident memory of the whole process ("rss_scope": "process"), of the largest child
+# process ("children") or of the render worker ("worker"), up to the end of the script, not of the script alone.
+# With --pool process each worker buffers its records and returns them with the result of its location, the
+# _controller writes them, so they are in the trace and in the counts of the run record like the others.
+# "output_bytes" is the size of the output files (see _stage_graph.py) written by the script.
+# Scripts add their own values with add_metrics(), e.g. 000_B the latency and size of the HTTP response, the
+# blocks left out of the One Call response ("one_call_exclude"), the size of the full response and the bytes saved
+# by leaving them out ("one_call_full_bytes", "one_call_saved_bytes", when 000_B knows the size of the blocks), and
+# whether the fetch cache answered ("fetch_cache": "hit", "stale" or "miss", counted per run in the run record).
+# These only reach the trace when the script runs in-process or in a render worker.
+#
+# trace.jsonl is rotated when it would grow beyond TRACE_MAX_BYTES: it becomes trace.jsonl.1, replacing the older
+# one, and a new trace.jsonl is started. The summary reads both, so its time does not grow with the age of the trace.
+#
+# Summary of the slowest scripts and locations over the last runs:
+#   python3 _trace.py summary --runs 24 --top 10
+
+import argparse
+import os
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+import _json_codec as json_codec
+
+try:
+    import resource  # Not available on Windows
+except ImportError:
+    resource = None
+
+TRACE_FILE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'log_files', 'trace.jsonl')
+TRACE_MAX_BYTES = 10 * 1024 * 1024  # About 700 runs of 4 locations
+
+_write_lock = threading.Lock()
+_current = threading.local()
+
+
+def add_metrics(**metrics):
+    # Called by the scripts, adds values to the trace record of the running script, if there is one
+    record = getattr(_current, "record", None)
+    if record is not None:
+        record.update(metrics)
+
+
+@contextmanager
+def collect_metrics():
+    # Collects the add_metrics() values of code running outside of Tracer.stage in this thread, e.g. the batch fetch
+    previous = getattr(_current, "record", None)
+    metrics = {}
+    _current.record = metrics
+    try:
+        yield metrics
+    finally:
+        _current.record = previous
+
+
+def peak_rss_kb(who):
+    if who is None:
+        return None
+    return resource.getrusage(who).ru_maxrss  # Kilobytes on Linux
+
+
+def cpu_seconds(who):
+    if who is None:
+        return time.process_time()
+    usage = resource.getrusage(who)
+    return usage.ru_utime + usage.ru_stime
+
+
+def stage_cpu_seconds(mode):
+    # The thread running an in-process script, the child processes of the subprocess mode
+    if mode == "subprocess" and resource is not None:
+        return cpu_seconds(resource.RUSAGE_CHILDREN)
+    return time.thread_time()
+
+
+class Tracer:
+    def __init__(self, run_id, mode, trace_file_path=TRACE_FILE_PATH):
+        self.run_id = run_id
+        self.mode = mode
+        self.trace_file_path = trace_file_path
+        self.fetch_cache_counts = {}
+        self.http_calls = 0
+        self.http_bytes = 0
+        self.one_call_full_bytes = 0
+        self.one_call_saved_bytes = 0
+        # A list while the records are buffered for the _controller (process pool worker), see take_records
+        self.pending = None
+
+    def write(self, record):
+        line = json_codec.dumps(record) + b"\n"
+        with _write_lock:
+            os.makedirs(os.path.dirname(self.trace_file_path), exist_ok=True)
+            try:
+                if os.path.getsize(self.trace_file_path) + len(line) > TRACE_MAX_BYTES:
+                    os.replace(self.trace_file_path, f"{self.trace_file_path}.1")
+            except FileNotFoundError:
+                pass
+            with open(self.trace_file_path, 'ab') as file:
+                file.write(line)
+
+    @contextmanager
+    def stage(self, location, script, output_file_paths):
+        # Measures one script; the caller sets record["ok"] and record["unchanged"]
+        if resource is None:
+            who = None
+        elif self.mode == "subprocess":
+            who = resource.RUSAGE_CHILDREN
+        else:
+            who = resource.RUSAGE_SELF
+        scopes = {"cpu_scope": "children", "rss_scope": "children"} if self.mode == "subprocess" else \
+            {"cpu_scope": "thread", "rss_scope": "process"}
+        record = {
+            "type": "stage", "run_id": self.run_id, "time": datetime.now().isoformat(timespec='seconds'),
+            "location": location, "script": script, "mode": self.mode, "ok": None, "unchanged": False,
+        }
+        start_wall = time.perf_counter()
+        start_cpu = stage_cpu_seconds(self.mode)
+        start_time = time.time()
+        _current.record = record
+        try:
+            yield record
+        finally:
+            _current.record = None
+            measured = {
+                "wall_s": round(time.perf_counter() - start_wall, 4),
+                "cpu_s": round(stage_cpu_seconds(self.mode) - start_cpu, 4),
+                "peak_rss_kb": peak_rss_kb(who),
+                **scopes,
+                "output_bytes": sum(
+                    os.path.getsize(path) for path in output_file_paths
+                    if os.path.exists(path) and os.path.getmtime(path) >= start_time - 1
+                ),
+            }
+            # Values reported by the script itself (e.g. from a render worker) take precedence
+            for key, value in measured.items():
+                record.setdefault(key, value)
+            self.finish(record)
+
+    def finish(self, record):
+        # Writes a stage record and counts it for the run record, or buffers it in a process pool worker
+        if self.pending is not None:
+            self.pending.append(record)
+            return
+        self.write(record)
+        with _write_lock:
+            if "fetch_cache" in record:
+                status = record["fetch_cache"]
+                self.fetch_cache_counts[status] = self.fetch_cache_counts.get(status, 0) + 1
+            if "http_bytes" in record:
+                self.http_calls += 1
+                self.http_bytes += record["http_bytes"]
+            if "one_call_saved_bytes" in record:
+                self.one_call_full_bytes += record["one_call_full_bytes"]
+                self.one_call_saved_bytes += record["one_call_saved_bytes"]
+
+    def buffer_records(self):
+        # Called in a process pool worker, on its own copy of the Tracer
+        self.pending = []
+
+    def take_records(self):
+        records, self.pending = self.pending or [], []
+        return records
+
+    def add_records(self, records):
+        # Records returned by a process pool worker
+        for record in records:
+            self.finish(record)
+
+    def run_finished(self, wall_seconds, locations, failed_locations):
+        self.write({
+            "type": "run", "run_id": self.run_id, "time": datetime.now().isoformat(timespec='seconds'),
+            "mode": self.mode, "wall_s": round(wall_seconds, 4), "locations": locations,
+            "failed_locations": failed_locations, "fetch_cache": self.fetch_cache_counts,
+            "http_calls": self.http_calls, "http_bytes": self.http_bytes,
+            "one_call_full_bytes": self.one_call_full_bytes, "one_call_saved_bytes": self.one_call_saved_bytes,
+        })
+
+
+def read_trace(trace_file_path, runs):
+    # Stage records of the last "runs" runs, from the rotated trace file and the current one
+    records = []
+    for file_path in [f"{trace_file_path}.1", trace_file_path]:
+        if not os.path.exists(file_path):
+            continue
+        with open(file_path, 'rb') as file:
+            for line in file:
+                try:
+                    records.append(json_codec.loads(line))
+                except ValueError:
+                    continue  # A line cut short by a crash
+    run_ids = list(dict.fromkeys(record.get("run_id") for record in records))  # In the order of the trace
+    selected = set(run_ids[-runs:])
+    return [record for record in records if record.get("type") == "stage" and record.get("run_id") in selected], len(selected)
+
+
+def summarize(stage_records, run_count, top):
+    lines = [f"Last {run_count} run(s), {len(stage_records)} script runs"]
+
+    by_script = defaultdict(list)
+    by_location = defaultdict(lambda: defaultdict(float))
+    failures = defaultdict(int)
+    for record in stage_records:
+        if record.get("unchanged"):
+            continue
+        by_script[record["script"]].append(record)
+        by_location[record["location"]][record["run_id"]] += record.get("wall_s", 0.0)
+        if record.get("ok") is False:
+            failures[record["script"]] += 1
+
+    lines.append("")
+    lines.append(f"Slowest scripts (mean wall time){'':<4}{'runs':>6}{'mean s':>9}{'max s':>9}{'cpu s':>9}{'rss MB':>9}{'out kB':>9}{'fail':>6}")
+    script_rows = []
+    for script, records in by_script.items():
+        walls = [record.get("wall_s", 0.0) for record in records]
+        cpus = [record.get("cpu_s") or 0.0 for record in records]
+        rss = [record.get("peak_rss_kb") or 0 for record in records]
+        out = [record.get("output_bytes") or 0 for record in records]
+        script_rows.append((sum(walls) / len(walls), script, len(records), max(walls), sum(cpus) / len(cpus), max(rss), sum(out) / len(out)))
+    for mean_wall, script, count, max_wall, mean_cpu, max_rss, mean_out in sorted(script_rows, reverse=True)[:top]:
+        lines.append(f"  {script:<34}{count:>6}{mean_wall:>9.3f}{max_wall:>9.3f}{mean_cpu:>9.3f}{max_rss / 1024:>9.1f}{mean_out / 1024:>9.1f}{failures[script]:>6}")
+
+    lines.append("")
+    lines.append(f"Slowest locations (sum of script wall times per run){'':<2}{'runs':>6}{'mean s':>9}{'max s':>9}")
+    location_rows = []
+    for location, per_run in by_location.items():
+        totals = list(per_run.values())
+        location_rows.append((sum(totals) / len(totals), location, len(totals), max(totals)))
+    for mean_total, location, count, max_total in sorted(location_rows, reverse=True)[:top]:
+        lines.append(f"  {location:<52}{count:>6}{mean_total:>9.3f}{max_total:>9.3f}")
+
+    http = [record for record in stage_records if "http_latency_s" in record]
+    if http:
+        latencies = sorted(record["http_latency_s"] for record in http)
+        sizes = [record.get("http_bytes", 0) for record in http]
+        lines.append("")
+        lines.append(
+            f"One Call HTTP: {len(http)} calls, median {latencies[len(latencies) // 2]:.3f}s, "
+            f"max {latencies[-1]:.3f}s, mean size {sum(sizes) / len(sizes) / 1024:.1f} kB"
+        )
+        # Bytes saved by exclude=, against the full response measured by 000_B for each call
+        measured = [record for record in http if "one_call_saved_bytes" in record]
+        full_bytes = sum(record.get("one_call_full_bytes") or 0 for record in measured)
+        if full_bytes:  # Also guards against records without the size of the full response
+            saved_bytes = sum(record["one_call_saved_bytes"] for record in measured)
+            lines.append(
+                f"  exclude= saved {saved_bytes / len(measured) / 1024:.1f} kB of {full_bytes / len(measured) / 1024:.1f} kB "
+                f"per call, {100.0 * saved_bytes / full_bytes:.0f}% less"
+            )
+
+    cached = [record["fetch_cache"] for record in stage_records if "fetch_cache" in record]
+    if cached:
+        saved = sum(1 for status in cached if status != "miss")
+        lines.append(
+            f"Fetch cache: {len(cached)} requests, {cached.count('hit')} cached, {cached.count('stale')} stale, "
+            f"{saved} API calls saved, hit ratio {100.0 * saved / len(cached):.0f}%"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summaries of the _controller execution trace")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summary_parser = subparsers.add_parser("summary", help="slowest scripts and locations over the last runs")
+    summary_parser.add_argument("--runs", type=int, default=24, help="number of most recent runs (default 24)")
+    summary_parser.add_argument("--top", type=int, default=10, help="number of rows per table (default 10)")
+    summary_parser.add_argument("--trace-file", default=TRACE_FILE_PATH, help="trace file to read")
+    args = parser.parse_args()
+
+    if args.command == "summary":
+        stage_records, run_count = read_trace(args.trace_file, args.runs)
+        print(summarize(stage_records, run_count, args.top))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+# Shared loader of the JSON documents read by the stages: the raw responses (<WeinheimerStr_55>.json,
+# <WeinheimerStr_55>_urlResponse.json) and locations.json
+# In the in-process mode of _controller.py the stages 005, 010, 020, 030 and 040 run in the same process and each
+# read the same <LOCATION>.json, and every script read locations.json again. load_document parses a file once and
+# hands the same object to every caller, until the file changes:
+#   - memoized on the path, and revalidated with the mtime and the size of the file at every call, so a new response
+#     written by 000_B is read again
+#   - at most MAX_RESIDENT_DOCUMENTS files are kept, the least recently used one is dropped first
+#   - the document is read-only (dicts become MappingProxyType, lists become tuples), a stage can not change what
+#     the next stage sees. A stage that needs to change it works on a copy, e.g. dict(data['current']).
+# The files are read with read_raw of _raw_storage.py, so compressed responses are handled the same way.
+# Run as a script, a file is parsed a number of times with and without the loader:
+#   python3 _weather_documents.py weather_data/WeinheimerStr_55.json
+
+import argparse
+import os
+import threading
+import time
+from collections import OrderedDict
+from types import MappingProxyType
+
+from _raw_storage import read_raw
+
+MAX_RESIDENT_DOCUMENTS = int(os.environ.get("WEATHER_MAX_RESIDENT_DOCUMENTS", "16"))
+
+_documents = OrderedDict()  # absolute path: ((st_mtime_ns, st_size), document)
+_lock = threading.Lock()
+_counts = {"hit": 0, "miss": 0}
+
+
+def freeze(value):
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def load_document(file_path):
+    # Raises FileNotFoundError, and json.JSONDecodeError (a ValueError) for a damaged file, like read_raw
+    file_path = os.path.abspath(file_path)
+    stat = os.stat(file_path)
+    version = (stat.st_mtime_ns, stat.st_size)
+    with _lock:
+        cached = _documents.get(file_path)
+        if cached and cached[0] == version:
+            _documents.move_to_end(file_path)
+            _counts["hit"] += 1
+            return cached[1]
+    # Parsed outside of the lock, two threads reading the same new file at the same time both parse it
+    document = freeze(read_raw(file_path))
+    with _lock:
+        _documents[file_path] = (version, document)
+        _documents.move_to_end(file_path)
+        while len(_documents) > MAX_RESIDENT_DOCUMENTS:
+            _documents.popitem(last=False)
+        _counts["miss"] += 1
+    return document
+
+
+def clear_documents():
+    with _lock:
+        _documents.clear()
+
+
+def document_counts():
+    with _lock:
+        return dict(_counts, resident=len(_documents))
+
+
+def benchmark(file_path, readers, repeats):
+    # One "run" is readers stages reading the same file
+    best_direct, best_shared = float("inf"), float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for _ in range(readers):
+            read_raw(file_path)
+        best_direct = min(best_direct, time.perf_counter() - start)
+        clear_documents()
+        start = time.perf_counter()
+        for _ in range(readers):
+            load_document(file_path)
+        best_shared = min(best_shared, time.perf_counter() - start)
+    print(f"{file_path}, {readers} readers, best of {repeats}")
+    print(f"{'read_raw per reader':<24}{best_direct * 1000:>10.2f} ms")
+    print(f"{'load_document':<24}{best_shared * 1000:>10.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared loader of the JSON documents read by the stages")
+    parser.add_argument("file", help="a raw response, e.g. weather_data/WeinheimerStr_55.json")
+    parser.add_argument("--readers", type=int, default=5, help="stages reading the file in one run (default 5)")
+    parser.add_argument("--repeats", type=int, default=20, help="repetitions (default 20)")
+    args = parser.parse_args()
+    benchmark(args.file, args.readers, args.repeats)
+
+
+if __name__ == "__main__":
+    main()